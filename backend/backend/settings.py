@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 import os
+from importlib.util import find_spec
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,6 +44,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'corsheaders',
     'core.apps.CoreConfig',
@@ -53,10 +55,40 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+        'core.authentication.ClaimsJWTAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
+# MessagePack is optional, clients ask for it with Accept: application/msgpack.
+if find_spec('msgpack'):
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].insert(1, 'core.renderers.MessagePackRenderer')
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'].insert(1, 'core.renderers.MessagePackParser')
+
+# Public product list pagination. Product counts are exact below
+# PRODUCTS_EXACT_COUNT_LIMIT rows, above it the planner estimate is cached.
+# Search results are counted exactly, up to PRODUCTS_SEARCH_COUNT_LIMIT.
+PRODUCTS_PAGE_SIZE = 4
+PRODUCTS_MAX_PAGE_SIZE = 48
+PRODUCTS_EXACT_COUNT_LIMIT = 10000
+PRODUCTS_SEARCH_COUNT_LIMIT = 1000
+PRODUCTS_COUNT_CACHE_TIMEOUT = 60
+
+# Admin order list pagination, NDJSON export batch size and bulk updates.
+ORDERS_PAGE_SIZE = 20
+ORDERS_MAX_PAGE_SIZE = 100
+ORDERS_STREAM_CHUNK_SIZE = 500
+# Orders the admin can mark paid or delivered in one request.
+ORDERS_BULK_MAX_SIZE = 10000
+
 from datetime import timedelta
 
 SIMPLE_JWT = {
@@ -92,6 +124,9 @@ SIMPLE_JWT = {
 }
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.ProfilerMiddleware',
+    'core.middleware.QueryMetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -101,6 +136,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ReplicaPinMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -129,6 +165,8 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
+DB_ENGINE = os.environ.get('DB_ENGINE', 'postgresql')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -136,9 +174,123 @@ DATABASES = {
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        # Workers keep their connection between requests, checked
+        # before reuse in case the server dropped it.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE') or 60),
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+
+# A pool per worker process shared by its threads, for threaded workers
+# and ASGI where per-thread persistent connections would pile up.
+# Connections return to the pool at the end of every request.
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 0)
+if DB_POOL_SIZE:
+    DATABASES['default'].update({
+        'ENGINE': 'core.db.backends.postgresql_pool',
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'MAX_SIZE': DB_POOL_SIZE,
+            'TIMEOUT': int(os.environ.get('DB_POOL_TIMEOUT') or 10),
+        },
+    })
+
+# SQLite fallback for running the test suite without a Postgres server.
+# Full-text and trigram search degrade to case-insensitive lookups.
+if DB_ENGINE == 'sqlite3':
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('DB_NAME') or BASE_DIR / 'db.sqlite3',
+    }
+
+# Read replicas of the primary, one alias per host in DB_REPLICA_HOSTS.
+# Catalog and order history reads go to a replica (core/db/routers.py).
+# Without replicas, 'replica' mirrors the primary for testing the routing.
+DATABASE_REPLICAS = []
+for number, host in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = dict(DATABASES['default'], HOST=host, TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append(f'replica{number}')
+if not DATABASE_REPLICAS:
+    DATABASES['replica'] = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
+
+DATABASE_ROUTERS = ['core.db.routers.ReplicaRouter']
+
+# Seconds a user reads from the primary after writing, longer than the
+# usual replication lag, and seconds an unreachable replica is skipped.
+REPLICA_PIN_SECONDS = 10
+REPLICA_RETRY_SECONDS = 30
+
+# Send the query count and time of each request in the X-DB-Queries and
+# X-DB-Time headers, requests over their view's query budget are logged
+# either way (core/middleware.py).
+QUERY_METRICS_HEADERS = bool(int(os.environ.get('QUERY_METRICS_HEADERS', int(DEBUG))))
+
+# Profile a share of the requests, and those slower than PROFILE_SLOW_MS
+# milliseconds (0 to only sample), into the newest PROFILE_KEEP profiles
+# of PROFILE_DIR, listed for admins at /api/profiles/ (core/profiling.py).
+PROFILE_REQUESTS = bool(int(os.environ.get('PROFILE_REQUESTS', 0)))
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0.01))
+PROFILE_SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', 0))
+PROFILE_MEMORY = True
+PROFILE_TRACEMALLOC_FRAMES = 5
+# Not under /vol/web, the proxy serves that volume.
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '/vol/profiles')
+PROFILE_KEEP = 50
+
+# Prometheus metrics at /api/metrics/ (core/metrics.py), scrapers send
+# METRICS_TOKEN as a bearer token when it is set.
+METRICS_ENABLED = bool(int(os.environ.get('METRICS_ENABLED', 1)))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+# Local memory is per process, set CACHE_BACKEND and CACHE_LOCATION to a
+# shared backend (e.g. Redis) when running several workers. Deploys pass
+# their WEB_WORKERS so that the checks refuse a per process cache.
+
+WEB_WORKERS = int(os.environ.get('WEB_WORKERS', 1))
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
     }
 }
 
+# Seconds the token version of a user stays cached, users being saved
+# or deleted drop it at once, see core.authentication.
+AUTH_CACHE_TIMEOUT = 300
+
+# Seconds a product payload stays cached.
+PRODUCT_CACHE_TIMEOUT = 300
+
+# Top rated products, a board is rebuilt by one worker at a time, for
+# at most LEADERBOARD_LOCK_TIMEOUT seconds.
+TOP_PRODUCTS_COUNT = 5
+TOP_PRODUCTS_MIN_RATING = 4
+LEADERBOARD_TIMEOUT = 60 * 60
+LEADERBOARD_LOCK_TIMEOUT = 10
+
+# Seconds proxies may serve catalog responses without revalidating them,
+# they are revalidated with ETags after that.
+CATALOG_CACHE_MAX_AGE = 0
+
+# Product image variants, created by a worker pool after an upload.
+PRODUCT_IMAGE_ASYNC = True
+PRODUCT_IMAGE_WORKERS = int(os.environ.get('PRODUCT_IMAGE_WORKERS', 2))
+PRODUCT_IMAGE_WIDTHS = [320, 640, 1024]
+PRODUCT_IMAGE_QUALITY = 80
+PRODUCT_THUMBNAIL_SIZE = (300, 300)
+
+# Route the catalog reads and a user's orders to async views, enabled
+# when serving with uvicorn (SERVER=uvicorn in scripts/run.sh).
+ASYNC_VIEWS = bool(int(os.environ.get('ASYNC_VIEWS', 0)))
+if ASYNC_VIEWS:
+    # WhiteNoise is sync only and would send every async view through a
+    # thread, the proxy serves the static files.
+    MIDDLEWARE.remove('whitenoise.middleware.WhiteNoiseMiddleware')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -158,6 +310,23 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Passwords are hashed on a low priority thread, at most
+# PASSWORD_HASH_CONCURRENCY at once across workers, see core/passwords.py.
+# Changing the iterations rehashes passwords as users log in.
+PASSWORD_HASHERS = [
+    'core.passwords.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS', 600000))
+PASSWORD_HASH_CONCURRENCY = int(os.environ.get('PASSWORD_HASH_CONCURRENCY', max(1, (os.cpu_count() or 1) // 2)))
+# Seconds a login waits for a hashing slot before a 503.
+PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 1.0))
+PASSWORD_HASH_NICE = int(os.environ.get('PASSWORD_HASH_NICE', 10))
+PASSWORD_HASH_LOCK_DIR = os.environ.get('PASSWORD_HASH_LOCK_DIR', '/tmp/password-hash')
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.1/topics/i18n/
@@ -13,6 +13,7 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/products/', include('product.urls')),
     path('api/orders/', include('order.urls')),
+    path('api/', include('core.urls')),
 ]
 
 
@@ -0,0 +1,3 @@
+"""
+Performance benchmarks, run with `python manage.py benchmark <name>`.
+"""
@@ -0,0 +1,77 @@
+"""
+Compare authenticated reads with user lookups and with token claims.
+"""
+import time
+
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.authentication import get_token
+from core.models import Order, UserAddress
+
+from .utils import get_bench_user, seed_orders, seed_products, summarize, write_table
+
+ENDPOINTS = [
+    ('profile', '/api/users/details/profile/'),
+    ('address', '/api/users/address/profile/'),
+    ('my orders', '/api/orders/myorders/'),
+    ('order detail', '/api/orders/{order}/'),
+    ('admin users', '/api/users/admin/'),
+]
+
+
+def add_arguments(parser):
+    parser.add_argument('--orders', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=500, help='Requests per endpoint and token.')
+
+
+def measure(client, url, tokens, repeat):
+    """Return the latencies and the queries of a request by token."""
+    headers = {mode: {'HTTP_AUTHORIZATION': f'Bearer {token}'} for mode, token in tokens.items()}
+    samples, queries = {mode: [] for mode in tokens}, {}
+    for mode in tokens:
+        with CaptureQueriesContext(connection) as captured:
+            response = client.get(url, **headers[mode])
+        assert response.status_code == 200, (url, response.status_code)
+        # The claims need the token version, cached by the first request.
+        with CaptureQueriesContext(connection) as captured:
+            client.get(url, **headers[mode])
+        queries[mode] = len(captured)
+
+    # Alternate the tokens, and which goes first, so drift affects both alike.
+    for i in range(repeat):
+        for mode in (tokens if i % 2 else reversed(list(tokens))):
+            start = time.perf_counter()
+            client.get(url, **headers[mode])
+            samples[mode].append((time.perf_counter() - start) * 1000)
+    return samples, queries
+
+
+def run(stdout, orders, repeat, **options):
+    seed_products(100)
+    seed_orders(orders)
+    user = get_bench_user()
+    user.is_staff = True
+    user.save()
+    UserAddress.objects.get_or_create(user=user, defaults={'address': 'Ocean Street', 'city': 'Key West, FL'})
+    order = Order.objects.filter(user=user).values_list('id', flat=True).first()
+
+    tokens = {
+        'user lookup': str(RefreshToken.for_user(user).access_token),
+        'claims': str(get_token(user).access_token),
+    }
+    rows = []
+    with override_settings(ALLOWED_HOSTS=['testserver']):
+        client = Client()
+        for name, url in ENDPOINTS:
+            url = url.format(order=order)
+            samples, queries = measure(client, url, tokens, repeat)
+            lookup, claims = summarize(samples['user lookup']), summarize(samples['claims'])
+            rows.append([
+                name, queries['user lookup'], queries['claims'], lookup['p50'], claims['p50'],
+                f'{claims["p50"] / lookup["p50"] - 1:+.1%}',
+            ])
+
+    write_table(stdout, ['endpoint', 'lookup queries', 'claims queries', 'lookup p50 ms', 'claims p50 ms', 'change'], rows)
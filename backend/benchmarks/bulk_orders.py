@@ -0,0 +1,63 @@
+"""
+Compare marking orders paid and delivered one request at a time and in bulk.
+"""
+import json
+import time
+
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core.authentication import get_token
+from core.models import Order
+
+from .utils import get_bench_user, seed_orders, seed_products, write_table
+
+
+def add_arguments(parser):
+    parser.add_argument('--orders', type=int, default=10000, help='Orders marked in bulk, in one batch by default.')
+    parser.add_argument('--batch', type=int, default=10000, help='Order ids per bulk request.')
+    parser.add_argument('--single', type=int, default=500, help='Orders marked one request at a time.')
+
+
+def send(client, method, path, headers, data=None):
+    """Return the seconds and the queries of a request."""
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        response = getattr(client, method)(path, json.dumps(data or {}), content_type='application/json', **headers)
+        elapsed = time.perf_counter() - start
+    assert response.status_code == 200, (path, response.status_code)
+    return elapsed, len(queries)
+
+
+def run(stdout, orders, batch, single, **options):
+    seed_products(100)
+    seed_orders(orders + single)
+    Order.objects.update(isPaid=False, paidAt=None, isDelivered=False, deliveredAt=None)
+    admin = get_bench_user()
+    admin.is_staff = True
+    admin.save()
+    headers = {'HTTP_AUTHORIZATION': f'Bearer {get_token(admin).access_token}'}
+    ids = list(Order.objects.order_by('id').values_list('id', flat=True))
+    single_ids, bulk_ids = ids[:single], ids[single:]
+
+    rows = []
+    with override_settings(ALLOWED_HOSTS=['testserver']):
+        client = Client()
+        for action in ('pay', 'deliver'):
+            elapsed = queries = 0
+            for pk in single_ids:
+                seconds, count = send(client, 'put', f'/api/orders/{pk}/{action}/', headers)
+                elapsed, queries = elapsed + seconds, queries + count
+            rows.append([action, 'one by one', single, single, elapsed, single / elapsed, queries])
+
+            # Repeated, the second pass finds every order already marked.
+            for label in ('bulk', 'bulk repeated'):
+                elapsed = queries = requests = 0
+                for start in range(0, len(bulk_ids), batch):
+                    seconds, count = send(client, 'put', f'/api/orders/{action}/', headers,
+                                          {'ids': bulk_ids[start:start + batch]})
+                    elapsed, queries, requests = elapsed + seconds, queries + count, requests + 1
+                rows.append([action, label, len(bulk_ids), requests, elapsed, len(bulk_ids) / elapsed, queries])
+
+    write_table(stdout, ['action', 'mode', 'orders', 'requests', 'seconds', 'orders/s', 'queries'], rows)
@@ -0,0 +1,112 @@
+"""
+Measure checkout throughput and overselling under concurrent buyers.
+"""
+import random
+import time
+from threading import Thread
+
+from django.db import connection
+from django.db.models import Sum
+
+from core.models import Order, OrderItem, Product, ShippingAddress
+from order.checkout import CheckoutError, place_order
+
+from .utils import get_bench_user, seed_products, summarize, write_table
+
+
+def add_arguments(parser):
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--orders', type=int, default=50, help='Orders per thread.')
+    parser.add_argument('--products', type=int, default=5, help='Size of the hot catalog.')
+    parser.add_argument('--stock', type=int, default=200, help='Initial stock per product.')
+    parser.add_argument('--items', type=int, default=3, help='Cart lines per order.')
+
+
+def legacy_place_order(user, data):
+    """The checkout before batching: per item get, create and save."""
+    order = Order.objects.create(
+        user=user,
+        paymentMethod=data['paymentMethod'],
+        shippingPrice=data['shippingPrice'],
+        totalPrice=data['totalPrice']
+    )
+    ShippingAddress.objects.create(order=order, **data['shippingAddress'])
+    for item in data['orderItems']:
+        product = Product.objects.get(id=item['product'])
+        orderItem = OrderItem.objects.create(
+            product=product,
+            order=order,
+            name=product.name,
+            qty=item['qty'],
+            price=item['price'],
+            image=product.image.url if product.image else '',
+        )
+        product.countInStock -= orderItem.qty
+        product.save()
+    return order
+
+
+def make_cart(rnd, product_ids, items):
+    return {
+        'orderItems': [
+            {'product': product_id, 'price': '9.99', 'qty': 1}
+            for product_id in rnd.sample(product_ids, items)
+        ],
+        'shippingAddress': {'address': 'Ocean Street', 'city': 'Key West, FL', 'zipCode': '00001'},
+        'paymentMethod': 'PayPal',
+        'shippingPrice': '10.00',
+        'totalPrice': '39.97',
+    }
+
+
+def run_checkouts(func, threads, orders, items, product_ids):
+    """Place orders from several threads, return latencies and rejections."""
+    user = get_bench_user()
+    latencies, rejected = [], []
+
+    def buyer(seed):
+        rnd = random.Random(seed)
+        for _ in range(orders):
+            start = time.perf_counter()
+            try:
+                func(user, make_cart(rnd, product_ids, items))
+            except CheckoutError:
+                rejected.append(1)
+            latencies.append((time.perf_counter() - start) * 1000)
+        connection.close()
+
+    workers = [Thread(target=buyer, args=(seed,)) for seed in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start, latencies, len(rejected)
+
+
+def run(stdout, threads, orders, products, stock, items, **options):
+    rows = []
+    for label, func in (('legacy', legacy_place_order), ('batched', place_order)):
+        OrderItem.objects.all().delete()
+        Order.objects.all().delete()
+        Product.objects.all().delete()
+        seed_products(products)
+        Product.objects.update(countInStock=stock)
+        product_ids = list(Product.objects.values_list('id', flat=True))
+
+        elapsed, latencies, rejected = run_checkouts(func, threads, orders, items, product_ids)
+        sold = OrderItem.objects.aggregate(total=Sum('qty'))['total'] or 0
+        remaining = Product.objects.aggregate(total=Sum('countInStock'))['total']
+        # Sold items the stock counter doesn't account for.
+        lost_updates = sold - (stock * products - remaining)
+        oversold = max(0, sold - stock * products)
+        stats = summarize(latencies)
+        rows.append([
+            label, len(latencies) - rejected, rejected,
+            (len(latencies) - rejected) / elapsed, stats['p50'], stats['p95'],
+            lost_updates, oversold,
+        ])
+
+    write_table(stdout, [
+        'checkout', 'orders', 'rejected', 'orders/s', 'p50 ms', 'p95 ms', 'lost updates', 'oversold',
+    ], rows)
@@ -0,0 +1,77 @@
+"""
+Measure per-request latency with new, persistent and pooled connections.
+"""
+from threading import Thread
+
+from django.db import connection
+from django.db.utils import load_backend
+from django.core.management.base import CommandError
+
+from core.db.backends.postgresql_pool.base import close_pools
+from core.models import Product
+
+from .utils import seed_products, summarize, timeit, write_table
+
+MODES = {
+    'new': ('django.db.backends.postgresql', {'CONN_MAX_AGE': 0}),
+    'persistent': ('django.db.backends.postgresql', {'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': True}),
+    'pool': ('core.db.backends.postgresql_pool', {'CONN_MAX_AGE': 0}),
+}
+
+
+def add_arguments(parser):
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=500, help='Requests per thread.')
+    parser.add_argument('--pool-size', type=int, default=2)
+
+
+def simulate(database, pk):
+    """One request: a primary key lookup between the request signals."""
+    database.close_if_unusable_or_obsolete()
+    with database.cursor() as cursor:
+        cursor.execute('SELECT name FROM core_product WHERE id = %s', [pk])
+        cursor.fetchone()
+    database.close_if_unusable_or_obsolete()
+
+
+def run_mode(mode, threads, requests, pool_size, pk):
+    engine, overrides = MODES[mode]
+    settings_dict = dict(connection.settings_dict, ENGINE=engine, POOL={'MAX_SIZE': pool_size}, **overrides)
+    samples = []
+    databases = []
+
+    def client():
+        # Connections are per thread, like a threaded worker's.
+        database = load_backend(engine).DatabaseWrapper(settings_dict)
+        databases.append(database)
+        samples.extend(timeit(lambda: simulate(database, pk), requests))
+        database.close()
+
+    workers = [Thread(target=client) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    pool = getattr(databases[0], 'pool', None)
+    created = pool.stats()['created'] if pool else '-'
+    close_pools()
+    return samples, created
+
+
+def run(stdout, threads, requests, pool_size, **options):
+    if connection.vendor != 'postgresql':
+        raise CommandError('The connection benchmark needs PostgreSQL.')
+
+    seed_products(100)
+    pk = Product.objects.values_list('id', flat=True).first()
+
+    rows = []
+    baseline = None
+    for mode in MODES:
+        samples, created = run_mode(mode, threads, requests, pool_size, pk)
+        stats = summarize(samples)
+        baseline = baseline or stats['mean']
+        rows.append([mode, stats['mean'], stats['p50'], stats['p99'], baseline - stats['mean'], created])
+
+    write_table(stdout, ['mode', 'mean ms', 'p50 ms', 'p99 ms', 'saved ms', 'pool connections'], rows)
@@ -0,0 +1,211 @@
+"""
+Drive every API route and report throughput, latency and queries.
+"""
+import io
+import json
+import tempfile
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.models import Order, Product, UserAddress
+
+from .renderers import seed_reviews
+from .utils import get_bench_user, seed_orders, seed_products, summarize, write_table
+
+PASSWORD = 'password123'
+
+# `path` and `data` may be functions of the iteration, called before the
+# request is timed, e.g. to create the row a DELETE removes.
+Endpoint = namedtuple('Endpoint', 'name method path data auth multipart', defaults=(None, None, False))
+
+
+def add_arguments(parser):
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--reviews', type=int, default=2, help='Reviews per product.')
+    parser.add_argument('--orders', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=30, help='Requests per endpoint.')
+    parser.add_argument('--only', nargs='+', default=[], help='Run endpoints whose name contains any of these.')
+    parser.add_argument('--output', help='Write the results as JSON, e.g. a new baseline.')
+
+
+def create_user(username, **fields):
+    user, _ = User.objects.get_or_create(username=username, defaults={'email': username, **fields})
+    user.set_password(PASSWORD)
+    user.save()
+    return user
+
+
+def image_file():
+    data = io.BytesIO()
+    Image.new('RGB', (640, 480), 'white').save(data, format='JPEG')
+    data.name = 'bench.jpg'
+    data.seek(0)
+    return data
+
+
+def get_endpoints(customer, admin, product_id, order_id):
+    """Return the endpoints of product/urls.py, order/urls.py and user/urls.py."""
+    new_user = lambda i: User.objects.create(username=f'delete{i}@mail.com', email=f'delete{i}@mail.com').id
+    new_product = lambda i: Product.objects.create(user=admin, name=f'Delete {i}', price=1).id
+    new_reviewer = lambda i: create_token(User.objects.create(username=f'reviewer-bench{i}@mail.com'))
+    cart = {
+        'orderItems': [{'product': product_id, 'price': '9.99', 'qty': 1}],
+        'shippingAddress': {'address': 'Ocean Street', 'city': 'Key West, FL', 'zipCode': '00001'},
+        'paymentMethod': 'PayPal',
+        'shippingPrice': '10.00',
+        'totalPrice': '19.99',
+    }
+    product_fields = {
+        'name': 'Bench product', 'price': '9.99', 'brand': 'Sony', 'countInStock': 10 ** 6,
+        'category': 'Audio', 'description': 'Updated by the benchmark', 'active': True,
+    }
+    order_ids = list(Order.objects.order_by('id').values_list('id', flat=True)[:100])
+
+    return [
+        # product/urls.py
+        Endpoint('products list', 'get', '/api/products/user/'),
+        Endpoint('products list page 50', 'get', '/api/products/user/?page=50'),
+        Endpoint('products keyset', 'get', '/api/products/user/?cursor=&page_size=24'),
+        Endpoint('products search', 'get', '/api/products/user/?keyword=wireless+sony'),
+        Endpoint('products top', 'get', '/api/products/user/top/'),
+        Endpoint('product detail', 'get', f'/api/products/user/{product_id}/'),
+        Endpoint('product review', 'patch', lambda i: f'/api/products/user/reviews/{product_id}/',
+                 {'rating': 4, 'comment': 'Good'}, auth=new_reviewer),
+        Endpoint('admin products list', 'get', '/api/products/admin/?unactive=1', auth=admin),
+        Endpoint('admin product detail', 'get', f'/api/products/admin/{product_id}/', auth=admin),
+        Endpoint('admin product create', 'post', '/api/products/admin/', {}, auth=admin),
+        Endpoint('admin product update', 'put', f'/api/products/admin/{product_id}/', product_fields, auth=admin),
+        Endpoint('admin product image', 'post', '/api/products/admin/image/',
+                 lambda i: {'product_id': product_id, 'image': image_file()}, auth=admin, multipart=True),
+        Endpoint('admin product delete', 'delete', lambda i: f'/api/products/admin/{new_product(i)}/', auth=admin),
+        Endpoint('admin cache stats', 'get', '/api/products/admin/cache/', auth=admin),
+        # order/urls.py
+        Endpoint('orders add', 'post', '/api/orders/add/', cart, auth=customer),
+        Endpoint('my orders', 'get', '/api/orders/myorders/', auth=customer),
+        Endpoint('order detail', 'get', f'/api/orders/{order_id}/', auth=customer),
+        Endpoint('order pay', 'put', f'/api/orders/{order_id}/pay/', {}, auth=customer),
+        Endpoint('order deliver', 'put', f'/api/orders/{order_id}/deliver/', {}, auth=admin),
+        Endpoint('orders bulk pay', 'put', '/api/orders/pay/', {'ids': order_ids}, auth=admin),
+        Endpoint('orders bulk deliver', 'put', '/api/orders/deliver/', {'ids': order_ids}, auth=admin),
+        Endpoint('admin orders', 'get', '/api/orders/', auth=admin),
+        Endpoint('admin orders page', 'get', '/api/orders/?page=5&isPaid=true', auth=admin),
+        Endpoint('admin orders stream', 'get', '/api/orders/stream/', auth=admin),
+        # user/urls.py
+        Endpoint('login', 'post', '/api/users/login/', {'username': customer.username, 'password': PASSWORD}),
+        Endpoint('register', 'post', '/api/users/register/',
+                 lambda i: {'name': 'Bench', 'email': f'register{i}@mail.com', 'password': PASSWORD}),
+        Endpoint('profile', 'get', f'/api/users/details/{customer.id}/', auth=customer),
+        Endpoint('profile update', 'put', f'/api/users/details/{customer.id}/',
+                 {'name': 'Bench', 'email': customer.email, 'password': ''}, auth=customer),
+        Endpoint('address', 'get', f'/api/users/address/{customer.id}/', auth=customer),
+        Endpoint('address update', 'patch', f'/api/users/address/{customer.id}/',
+                 {'address': 'Ocean Street', 'city': 'Key West, FL', 'zipCode': '00001'}, auth=customer),
+        Endpoint('admin users', 'get', '/api/users/admin/', auth=admin),
+        Endpoint('admin user detail', 'get', f'/api/users/admin/{customer.id}/', auth=admin),
+        Endpoint('admin user update', 'put', f'/api/users/admin/{customer.id}/',
+                 {'name': 'Bench', 'email': customer.email, 'isAdmin': False}, auth=admin),
+        Endpoint('admin user delete', 'delete', lambda i: f'/api/users/admin/{new_user(i)}/', auth=admin),
+    ]
+
+
+def create_token(user):
+    return str(RefreshToken.for_user(user).access_token)
+
+
+def call(value, i):
+    return value(i) if callable(value) else value
+
+
+def request(client, endpoint, i, tokens):
+    """Prepare the request of iteration i, return a function sending it."""
+    path, data = call(endpoint.path, i), call(endpoint.data, i)
+    headers = {}
+    if endpoint.auth is not None:
+        token = tokens[endpoint.auth.id] if isinstance(endpoint.auth, User) else endpoint.auth(i)
+        headers['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+
+    method = getattr(client, endpoint.method)
+    if data is None:
+        return lambda: method(path, **headers)
+    if endpoint.multipart:
+        return lambda: method(path, data, **headers)
+    return lambda: method(path, json.dumps(data), content_type='application/json', **headers)
+
+
+def measure(client, endpoint, repeat, tokens):
+    samples, status = [], None
+    for i in range(repeat):
+        send = request(client, endpoint, i, tokens)
+        start = time.perf_counter()
+        response = send()
+        if response.streaming:
+            b''.join(response.streaming_content)
+        samples.append((time.perf_counter() - start) * 1000)
+        status = response.status_code
+
+    # Queries of a warm request, counted apart from the timed ones.
+    send = request(client, endpoint, repeat, tokens)
+    with CaptureQueriesContext(connection) as queries:
+        response = send()
+        if response.streaming:
+            b''.join(response.streaming_content)
+
+    stats = summarize(samples)
+    return {
+        'method': endpoint.method.upper(),
+        'status': status,
+        'rps': 1000 / stats['mean'],
+        **stats,
+        'queries': len(queries),
+    }
+
+
+def run(stdout, products, reviews, orders, repeat, only, output, **options):
+    stdout.write(f'Seeding {products} products, {reviews} reviews each and {orders} orders...')
+    seed_products(products)
+    seed_reviews(reviews)
+    seed_orders(orders)
+
+    customer = get_bench_user()
+    customer.set_password(PASSWORD)
+    customer.save()
+    UserAddress.objects.get_or_create(user=customer, defaults={'address': 'Ocean Street', 'city': 'Key West, FL', 'zipCode': '00001'})
+    admin = create_user('admin-bench@mail.com', is_staff=True)
+    product_id = Product.objects.filter(active=True).order_by('-rating').values_list('id', flat=True).first()
+    Product.objects.filter(id=product_id).update(countInStock=10 ** 6)
+    order_id = Order.objects.filter(user=customer).values_list('id', flat=True).first()
+    tokens = {user.id: create_token(user) for user in (customer, admin)}
+
+    endpoints = [
+        endpoint for endpoint in get_endpoints(customer, admin, product_id, order_id)
+        if not only or any(name in endpoint.name for name in only)
+    ]
+    results = {}
+    with tempfile.TemporaryDirectory() as media_root, \
+            override_settings(MEDIA_ROOT=media_root, PRODUCT_IMAGE_ASYNC=False, ALLOWED_HOSTS=['testserver']):
+        client = Client()
+        for endpoint in endpoints:
+            results[endpoint.name] = measure(client, endpoint, repeat, tokens)
+
+    write_table(stdout, ['endpoint', 'method', 'status', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'queries'], [
+        [name, r['method'], r['status'], r['rps'], r['p50'], r['p95'], r['p99'], r['queries']]
+        for name, r in results.items()
+    ])
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump({
+                'created': datetime.now(timezone.utc).isoformat(),
+                'database': connection.vendor,
+                'options': {'products': products, 'reviews': reviews, 'orders': orders, 'repeat': repeat},
+                'endpoints': results,
+            }, f, indent=2)
+        stdout.write(f'Results written to {output}')
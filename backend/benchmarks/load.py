@@ -0,0 +1,155 @@
+"""
+Load test the catalog and order reads under uWSGI and uvicorn.
+"""
+import http.client
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import connection
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.models import Order, Product
+
+from .utils import get_bench_user, percentile, seed_orders, seed_products, write_table
+
+# Server command lines and extra environment, uvicorn-sync serves the
+# sync views under ASGI to separate the server from the views.
+SERVERS = {
+    'uwsgi': (
+        ['uwsgi', '--http', '127.0.0.1:{port}', '--workers', '{workers}', '--master',
+         '--enable-threads', '--module', 'backend.wsgi', '--disable-logging'],
+        {},
+    ),
+    'uvicorn': (
+        [sys.executable, '-m', 'uvicorn', 'backend.asgi:application', '--port', '{port}',
+         '--workers', '{workers}', '--no-access-log', '--log-level', 'warning'],
+        {'ASYNC_VIEWS': '1'},
+    ),
+    'uvicorn-sync': (
+        [sys.executable, '-m', 'uvicorn', 'backend.asgi:application', '--port', '{port}',
+         '--workers', '{workers}', '--no-access-log', '--log-level', 'warning'],
+        {'ASYNC_VIEWS': '0'},
+    ),
+}
+
+
+def add_arguments(parser):
+    parser.add_argument('--servers', nargs='+', choices=list(SERVERS), default=['uwsgi', 'uvicorn'])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 16, 64])
+    parser.add_argument('--requests', type=int, default=2000, help='Requests per concurrency level.')
+    parser.add_argument('--workers', type=int, default=4, help='Server worker processes.')
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--orders', type=int, default=20, help='Orders of the requesting user.')
+    parser.add_argument('--port', type=int, default=8765)
+
+
+def start_server(name, workers, port, extra_env=None):
+    """Start a server on the benchmark database and wait until it answers."""
+    command, environ = SERVERS[name]
+    if not shutil.which(command[0]):
+        return None
+
+    env = dict(
+        os.environ,
+        DB_NAME=connection.settings_dict['NAME'],
+        ALLOWED_HOSTS='127.0.0.1',
+        PYTHONPATH=str(settings.BASE_DIR),
+        **environ,
+        **(extra_env or {}),
+    )
+    command = [part.format(port=port, workers=workers) for part in command]
+    process = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            request(http.client.HTTPConnection('127.0.0.1', port), '/api/products/user/top/', {})
+            return process
+        except (OSError, http.client.HTTPException):
+            time.sleep(0.2)
+
+    process.terminate()
+    raise CommandError(f'{name} did not start on port {port}.')
+
+
+def request(conn, path, headers):
+    conn.request('GET', path, headers=headers)
+    response = conn.getresponse()
+    response.read()
+    if response.status != 200:
+        raise http.client.HTTPException(f'{path} answered {response.status}')
+
+
+def client(port, paths, headers, count):
+    """Send `count` requests on one keep-alive connection."""
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    samples, errors = [], 0
+    for i in range(count):
+        start = time.perf_counter()
+        try:
+            request(conn, paths[i % len(paths)], headers)
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port)
+        samples.append((time.perf_counter() - start) * 1000)
+    conn.close()
+    return samples, errors
+
+
+def load(port, paths, headers, concurrency, requests):
+    """Return throughput and latencies of `concurrency` concurrent clients."""
+    per_client = max(1, requests // concurrency)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        results = list(executor.map(
+            lambda _: client(port, paths, headers, per_client), range(concurrency),
+        ))
+    elapsed = time.perf_counter() - start
+
+    samples = [sample for client_samples, _ in results for sample in client_samples]
+    errors = sum(client_errors for _, client_errors in results)
+    return len(samples) / elapsed, percentile(samples, 50), percentile(samples, 99), errors
+
+
+def run(stdout, servers, concurrency, requests, workers, products, orders, port, **options):
+    if connection.vendor == 'sqlite':
+        # The servers run in other processes and can't see an in-memory db.
+        raise CommandError('The load test needs a database server, e.g. Postgres.')
+
+    seed_products(products)
+    seed_orders(orders)
+    user = get_bench_user()
+    product_id = Product.objects.filter(active=True).values_list('id', flat=True).first()
+    order_id = Order.objects.filter(user=user).values_list('id', flat=True).first()
+    paths = [
+        '/api/products/user/',
+        '/api/products/user/?page=3',
+        '/api/products/user/top/',
+        f'/api/products/user/{product_id}/',
+        '/api/orders/myorders/',
+        f'/api/orders/{order_id}/',
+    ]
+    headers = {'Authorization': f'Bearer {RefreshToken.for_user(user).access_token}'}
+
+    rows = []
+    for name in servers:
+        process = start_server(name, workers, port)
+        if process is None:
+            stdout.write(f'{name} is not installed, skipped.')
+            continue
+        try:
+            for level in concurrency:
+                rows.append([name, level, *load(port, paths, headers, level, requests)])
+        finally:
+            process.terminate()
+            process.wait()
+
+    write_table(stdout, ['server', 'concurrency', 'req/s', 'p50 ms', 'p99 ms', 'errors'], rows)
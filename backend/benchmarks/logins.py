@@ -0,0 +1,120 @@
+"""
+Load test catalog latency during a login storm, hashing inline or bounded.
+"""
+import http.client
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.core.management.base import CommandError
+
+from .load import SERVERS, client, start_server
+from .utils import percentile, seed_products, write_table
+
+PASSWORD = 'password123'
+
+# Server environments compared: every worker may hash at full priority,
+# as before, or hashes are bounded, niced and shed with 503s.
+MODES = {
+    'inline': lambda workers: {
+        'PASSWORD_HASH_CONCURRENCY': str(workers), 'PASSWORD_HASH_NICE': '0', 'PASSWORD_HASH_TIMEOUT': '60',
+    },
+    'bounded': lambda workers: {},
+}
+
+
+def add_arguments(parser):
+    parser.add_argument('--servers', nargs='+', choices=list(SERVERS), default=['uwsgi', 'uvicorn-sync'])
+    parser.add_argument('--workers', type=int, default=4, help='Server worker processes.')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent catalog clients.')
+    parser.add_argument('--logins', type=int, default=16, help='Concurrent login clients in the storm.')
+    parser.add_argument('--requests', type=int, default=2000, help='Catalog requests per run.')
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--port', type=int, default=8766)
+
+
+def storm(port, users, stop, results):
+    """Log in until `stop` is set, counting answers by status."""
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    i = 0
+    while not stop.is_set():
+        body = json.dumps({'username': users[i % len(users)], 'password': PASSWORD})
+        try:
+            conn.request('POST', '/api/users/login/', body, {'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            response.read()
+            results.append(response.status)
+            if response.status == 503:
+                # Well behaved clients back off as asked.
+                stop.wait(float(response.getheader('Retry-After', 1)))
+        except (OSError, http.client.HTTPException):
+            results.append(None)
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port)
+        i += 1
+    conn.close()
+
+
+def catalog_load(port, paths, concurrency, requests, logins, users):
+    """Return catalog latencies, with `logins` clients logging in meanwhile."""
+    stop, results = threading.Event(), []
+    threads = [threading.Thread(target=storm, args=(port, users, stop, results)) for _ in range(logins)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.5 if logins else 0)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        runs = list(executor.map(lambda _: client(port, paths, {}, requests // concurrency), range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    samples = [sample for run_samples, _ in runs for sample in run_samples]
+    return {
+        'req/s': len(samples) / elapsed,
+        'p50': percentile(samples, 50),
+        'p99': percentile(samples, 99),
+        'logins/s': results.count(200) / elapsed,
+        '503s': results.count(503),
+    }
+
+
+def run(stdout, servers, workers, concurrency, logins, requests, products, port, **options):
+    if connection.vendor == 'sqlite':
+        # The servers run in other processes and can't see an in-memory db.
+        raise CommandError('The load test needs a database server, e.g. Postgres.')
+
+    seed_products(products)
+    users = []
+    for i in range(logins):
+        user = User.objects.create(username=f'login{i}@mail.com', email=f'login{i}@mail.com')
+        user.set_password(PASSWORD)
+        user.save()
+        users.append(user.username)
+    paths = ['/api/products/user/', '/api/products/user/?page=3', '/api/products/user/top/']
+
+    rows = []
+    for name in servers:
+        for mode, environ in MODES.items():
+            process = start_server(name, workers, port, environ(workers))
+            if process is None:
+                stdout.write(f'{name} is not installed, skipped.')
+                break
+            try:
+                for storm_clients in (0, logins):
+                    result = catalog_load(port, paths, concurrency, requests, storm_clients, users)
+                    rows.append([
+                        name, mode, storm_clients, result['req/s'], result['p50'], result['p99'],
+                        result['logins/s'], result['503s'],
+                    ])
+            finally:
+                process.terminate()
+                process.wait()
+
+    write_table(stdout, ['server', 'hashing', 'login clients', 'req/s', 'p50 ms', 'p99 ms', 'logins/s', '503s'], rows)
@@ -0,0 +1,102 @@
+"""
+Measure the overhead of recording the metrics on requests.
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.test import Client, override_settings
+
+from core.models import Product
+
+from .utils import seed_products, summarize, write_table
+
+# What a request records: the middleware, a serializer and a cache lookup.
+RECORD = '''
+import json, os, sys, time
+from core import metrics
+
+def record():
+    metrics.IN_FLIGHT.inc()
+    start = time.perf_counter()
+    metrics.count_cache('products', True)
+    metrics.observe_serializer('ProductSerializer', start)
+    metrics.IN_FLIGHT.dec()
+    metrics.observe_request('product:user-products-detail', 'GET', 200, 0.004, 0.001, 2, 0)
+
+repeat = int(sys.argv[1])
+record()
+start = time.perf_counter()
+for _ in range(repeat):
+    record()
+print(json.dumps((time.perf_counter() - start) / repeat * 10 ** 6))
+'''
+
+
+def add_arguments(parser):
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=2000, help='Requests per endpoint and mode.')
+    parser.add_argument('--records', type=int, default=100000, help='Recorded requests per storage.')
+
+
+def record_cost(records, multiprocess_dir=None):
+    """Return the microseconds to record one request, in a fresh process."""
+    env = dict(os.environ)
+    env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+    if multiprocess_dir:
+        env['PROMETHEUS_MULTIPROC_DIR'] = multiprocess_dir
+    output = subprocess.run(
+        [sys.executable, '-c', RECORD, str(records)],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output)
+
+
+def get_client(enabled, urls):
+    """Return a client whose middleware was loaded with the metrics on or off."""
+    with override_settings(METRICS_ENABLED=enabled):
+        client = Client()
+        for url in urls:
+            client.get(url)
+    return client
+
+
+def run(stdout, products, requests, records, **options):
+    stdout.write('Recording cost per request:')
+    with tempfile.TemporaryDirectory() as directory:
+        costs = [
+            ['per process', record_cost(records)],
+            ['multiprocess files', record_cost(records, directory)],
+        ]
+    write_table(stdout, ['storage', 'us / request'], costs)
+
+    seed_products(products)
+    pk = Product.objects.filter(active=True).values_list('id', flat=True).first()
+    urls = [f'/api/products/user/{pk}/', '/api/products/user/?page_size=24']
+
+    # Alternate the modes request by request so drift affects both alike.
+    samples = {True: {url: [] for url in urls}, False: {url: [] for url in urls}}
+    with override_settings(ALLOWED_HOSTS=['testserver']):
+        clients = {enabled: get_client(enabled, urls) for enabled in (False, True)}
+        for i in range(requests):
+            for url in urls:
+                # Swap which mode goes first, the second request runs warmer.
+                for enabled in (i % 2 == 0, i % 2 == 1):
+                    client = clients[enabled]
+                    start = time.perf_counter()
+                    client.get(url)
+                    samples[enabled][url].append((time.perf_counter() - start) * 1000)
+
+    stdout.write('\nRequests with and without the metrics middleware:')
+    rows = []
+    for url in urls:
+        off, on = summarize(samples[False][url]), summarize(samples[True][url])
+        rows.append([
+            url, off['p50'], on['p50'], off['p95'], on['p95'],
+            (on['p50'] - off['p50']) * 1000, f'{on["p50"] / off["p50"] - 1:+.1%}',
+        ])
+    write_table(stdout, ['url', 'off p50 ms', 'on p50 ms', 'off p95 ms', 'on p95 ms', 'p50 overhead us', 'change'], rows)
@@ -0,0 +1,62 @@
+"""
+Compare render time and size of the product and order list payloads.
+"""
+from django.contrib.auth.models import User
+from rest_framework.renderers import JSONRenderer
+
+from core import renderers
+from core.models import Order, Product, Review
+from order.serializers import OrderSerializer
+from product.serializers import ProductSerializer
+
+from .utils import seed_orders, seed_products, summarize, timeit, write_table
+
+
+def add_arguments(parser):
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--reviews', type=int, default=3, help='Reviews per product.')
+    parser.add_argument('--orders', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+
+
+def seed_reviews(per_product):
+    """Review every product once by each of `per_product` users."""
+    users = [
+        User.objects.get_or_create(username=f'reviewer{i}@mail.com', defaults={'first_name': f'Reviewer {i}'})[0]
+        for i in range(per_product)
+    ]
+    Review.objects.bulk_create([
+        Review(product_id=pk, user=user, name=user.first_name, rating=i % 5 + 1, comment='Works as expected. ' * 5)
+        for pk in Product.objects.values_list('id', flat=True)
+        for i, user in enumerate(users)
+    ], batch_size=5000)
+
+
+def get_renderers():
+    found = [('json', JSONRenderer()), ('orjson', renderers.ORJSONRenderer())]
+    if renderers.msgpack:
+        found.append(('msgpack', renderers.MessagePackRenderer()))
+    return found
+
+
+def run(stdout, products, reviews, orders, repeat, **options):
+    stdout.write(f'Seeding {products} products and {orders} orders...')
+    seed_products(products)
+    seed_reviews(reviews)
+    seed_orders(orders)
+
+    payloads = {
+        'products': ProductSerializer(Product.objects.with_reviews(), many=True).data,
+        'orders': OrderSerializer(Order.objects.with_details(), many=True).data,
+    }
+
+    rows = []
+    for endpoint, data in payloads.items():
+        baseline = None
+        for label, renderer in get_renderers():
+            size = len(renderer.render(data, renderer.media_type, {}))
+            stats = summarize(timeit(lambda: renderer.render(data, renderer.media_type, {}), repeat))
+            baseline = baseline or stats['p50']
+            rows.append([endpoint, label, stats['p50'], stats['p95'], size, baseline / stats['p50']])
+
+    write_table(stdout, ['payload', 'renderer', 'p50 ms', 'p95 ms', 'bytes', 'speedup'], rows)
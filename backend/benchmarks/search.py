@@ -0,0 +1,48 @@
+"""
+Compare product search with the legacy name__icontains lookup.
+"""
+from django.core.paginator import Paginator
+from django.db import connection
+
+from core.models import Product
+from product.search import search_products
+
+from .utils import seed_products, summarize, timeit, write_table
+
+KEYWORDS = ['sony', 'wireless headphones', 'camra', 'portable speaker 42', 'keyb']
+
+
+def add_arguments(parser):
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=20)
+
+
+def legacy_search(keyword):
+    """First page of the old search, count included."""
+    products = Product.objects.filter(active=True, name__icontains=keyword)
+    page = Paginator(products.order_by('-id'), 4).page(1)
+    return list(page)
+
+
+def full_text_search(keyword):
+    """First page of the new search, count included."""
+    products = search_products(Product.objects.filter(active=True), keyword)
+    page = Paginator(products, 4).page(1)
+    return list(page)
+
+
+def run(stdout, products, repeat, **options):
+    stdout.write(f'Seeding {products} products...')
+    seed_products(products)
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE core_product')
+
+    rows = []
+    for keyword in KEYWORDS:
+        for label, func in (('icontains', legacy_search), ('search', full_text_search)):
+            hits = len(func(keyword))
+            stats = summarize(timeit(lambda: func(keyword), repeat))
+            rows.append([keyword, label, hits, stats['mean'], stats['p50'], stats['p95']])
+
+    write_table(stdout, ['keyword', 'lookup', 'hits', 'mean ms', 'p50 ms', 'p95 ms'], rows)
@@ -0,0 +1,36 @@
+"""
+Compare DRF serializers with the compiled ones on the list payloads.
+"""
+from core.models import Order, Product
+from order.serializers import OrderSerializer, serialize_order
+from product.serializers import ProductSerializer, serialize_product
+
+from .renderers import seed_reviews
+from .utils import seed_orders, seed_products, summarize, timeit, write_table
+
+
+def add_arguments(parser):
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--reviews', type=int, default=2, help='Reviews per product.')
+    parser.add_argument('--repeat', type=int, default=5)
+
+
+def run(stdout, rows, reviews, repeat, **options):
+    stdout.write(f'Seeding {rows} products and orders...')
+    seed_products(rows)
+    seed_reviews(reviews)
+    seed_orders(rows)
+
+    # Rows are loaded once, only serialization is measured.
+    cases = [
+        ('products', list(Product.objects.with_reviews()), ProductSerializer, serialize_product),
+        ('orders', list(Order.objects.with_details()), OrderSerializer, serialize_order),
+    ]
+
+    table = []
+    for label, instances, serializer_class, compiled in cases:
+        drf = summarize(timeit(lambda: serializer_class(instances, many=True).data, repeat))
+        fast = summarize(timeit(lambda: compiled.many(instances), repeat))
+        table.append([label, len(instances), drf['p50'], fast['p50'], drf['p50'] / fast['p50']])
+
+    write_table(stdout, ['payload', 'rows', 'drf ms', 'compiled ms', 'speedup'], table)
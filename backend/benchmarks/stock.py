@@ -0,0 +1,67 @@
+"""
+Compare checkout throughput of hot products with single row and sharded stock.
+"""
+import time
+from functools import partial
+
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from core.models import Order, OrderItem, Product, StockShard
+from order.checkout import place_order
+from product.stock import shard_stock
+
+from .checkout import run_checkouts
+from .utils import seed_products, summarize, write_table
+
+
+def add_arguments(parser):
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--orders', type=int, default=50, help='Orders per thread.')
+    parser.add_argument('--products', type=int, default=1, help='Hot products every cart holds.')
+    parser.add_argument('--shards', nargs='+', type=int, default=[0, 4, 16], help='Shards per product, 0 for one row.')
+    parser.add_argument(
+        '--hold', nargs='+', type=float, default=[0, 5],
+        help='Milliseconds checkouts stay open after placing the order, like slow commits or payment calls.',
+    )
+
+
+def held_place_order(hold, user, data):
+    """Place an order, keeping its transaction open `hold` ms longer."""
+    with transaction.atomic():
+        order = place_order(user, data)
+        time.sleep(hold / 1000)
+    return order
+
+
+def run(stdout, threads, orders, products, shards, hold, **options):
+    if connection.vendor == 'sqlite':
+        # SQLite locks the whole database for each write.
+        raise CommandError('The stock benchmark needs row locks, e.g. Postgres.')
+
+    stock = threads * orders
+    rows = []
+    for hold_ms, count in [(hold_ms, count) for hold_ms in hold for count in shards]:
+        OrderItem.objects.all().delete()
+        Order.objects.all().delete()
+        Product.objects.all().delete()
+        seed_products(products)
+        Product.objects.update(countInStock=stock)
+        product_ids = list(Product.objects.values_list('id', flat=True))
+        for pk in product_ids:
+            shard_stock(pk, count)
+
+        checkout = partial(held_place_order, hold_ms) if hold_ms else place_order
+        elapsed, latencies, rejected = run_checkouts(checkout, threads, orders, products, product_ids)
+        sold = OrderItem.objects.aggregate(total=Sum('qty'))['total'] or 0
+        remaining = sum(product.stock for product in Product.objects.with_stock())
+        stats = summarize(latencies)
+        rows.append([
+            hold_ms, count or 'one row', len(latencies) - rejected, rejected,
+            (len(latencies) - rejected) / elapsed, stats['p50'], stats['p95'],
+            sold - (stock * products - remaining),
+        ])
+    StockShard.objects.all().delete()
+
+    write_table(stdout, ['hold ms', 'shards', 'orders', 'rejected', 'orders/s', 'p50 ms', 'p95 ms', 'lost updates'], rows)
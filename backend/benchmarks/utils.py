@@ -0,0 +1,123 @@
+"""
+Helpers shared by the benchmarks.
+"""
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+
+from core.models import Order, OrderItem, Product, ShippingAddress
+
+BRANDS = ['Apple', 'Sony', 'Logitech', 'Amazon', 'Canon', 'Samsung', 'Bose', 'Dell']
+CATEGORIES = ['Electronics', 'Audio', 'Cameras', 'Gaming', 'Computers', 'Phones']
+ADJECTIVES = ['wireless', 'portable', 'smart', 'compact', 'premium', 'rugged', 'ultra', 'classic']
+NOUNS = ['headphones', 'speaker', 'mouse', 'keyboard', 'camera', 'phone', 'console', 'monitor']
+
+
+def get_bench_user():
+    """Create and return the user owning seeded data."""
+    user, _ = User.objects.get_or_create(
+        username='bench@mail.com',
+        defaults={'email': 'bench@mail.com', 'first_name': 'Bench'},
+    )
+    return user
+
+
+def seed_products(count, batch_size=5000, seed=0):
+    """Bulk insert `count` products with a realistic vocabulary."""
+    rnd = random.Random(seed)
+    user = get_bench_user()
+    batch = []
+    for i in range(count):
+        brand = rnd.choice(BRANDS)
+        name = f'{brand} {rnd.choice(ADJECTIVES)} {rnd.choice(NOUNS)} {i}'
+        batch.append(Product(
+            user=user,
+            name=name,
+            brand=brand,
+            category=rnd.choice(CATEGORIES),
+            description=' '.join(rnd.choice(ADJECTIVES + NOUNS) for _ in range(30)),
+            rating=Decimal(rnd.randint(0, 500)) / 100,
+            price=Decimal(rnd.randint(100, 99900)) / 100,
+            countInStock=rnd.randint(0, 100),
+            active=rnd.random() < 0.9,
+        ))
+        if len(batch) == batch_size:
+            Product.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Product.objects.bulk_create(batch)
+
+
+def seed_orders(count, items=3, batch_size=1000, seed=0):
+    """Bulk insert `count` orders of `items` seeded products each."""
+    rnd = random.Random(seed)
+    user = get_bench_user()
+    products = list(Product.objects.values_list('id', 'name', 'price')[:1000])
+    for start in range(0, count, batch_size):
+        carts = [
+            [(product, rnd.randint(1, 3)) for product in rnd.sample(products, items)]
+            for _ in range(min(batch_size, count - start))
+        ]
+        orders = Order.objects.bulk_create([
+            Order(
+                user=user,
+                paymentMethod='PayPal',
+                shippingPrice=Decimal('10.00'),
+                totalPrice=sum(price * qty for (_, _, price), qty in cart) + 10,
+                isPaid=rnd.random() < 0.5,
+            )
+            for cart in carts
+        ])
+        ShippingAddress.objects.bulk_create([
+            ShippingAddress(order=order, address='Ocean Street', city='Key West, FL', zipCode='00001')
+            for order in orders
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_id=pk, name=name, qty=qty, price=price)
+            for order, cart in zip(orders, carts)
+            for (pk, name, price), qty in cart
+        ])
+
+
+def timeit(func, repeat):
+    """Call func `repeat` times and return the latencies in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def percentile(samples, pct):
+    """Return the pct-th percentile of the samples."""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples):
+    """Return mean and tail latencies for the samples."""
+    return {
+        'mean': statistics.fmean(samples),
+        'p50': percentile(samples, 50),
+        'p95': percentile(samples, 95),
+        'p99': percentile(samples, 99),
+    }
+
+
+def write_table(stdout, header, rows):
+    """Write rows as an aligned text table."""
+    rows = [header] + [[_format(cell) for cell in row] for row in rows]
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    for row in rows:
+        stdout.write('  '.join(cell.ljust(width) for cell, width in zip(row, widths)))
+
+
+def _format(cell):
+    if isinstance(cell, float):
+        return f'{cell:.2f}'
+    return str(cell)
@@ -1,11 +1,16 @@
 from django.contrib import admin
 from .models import *
 
+class StockShardInline(admin.TabularInline):
+    model = StockShard
+    extra = 0
+
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     list_display = ['id', 'name', 'user']
     list_filter = ['createdAt']
     search_fields = ['name']
+    inlines = [StockShardInline]
 
 @admin.register(UserAddress)
 class UserAddressAdmin(admin.ModelAdmin):
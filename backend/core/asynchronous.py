@@ -0,0 +1,72 @@
+"""
+Helpers for the async views served under ASGI.
+
+The async views skip DRF's request wrapping, so authentication and
+content negotiation are done here the same way the DRF views do them.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed, NotAuthenticated
+
+from core.authentication import ClaimsJWTAuthentication
+from core.renderers import MessagePackRenderer, json_dumps, msgpack
+
+_authentication = ClaimsJWTAuthentication()
+
+
+def api_response(request, data, status=status.HTTP_200_OK):
+    """Return data as MessagePack when the client asks for it, else JSON."""
+    if msgpack is not None and MessagePackRenderer.media_type in request.headers.get('Accept', ''):
+        return HttpResponse(MessagePackRenderer().render(data), status=status,
+                            content_type=MessagePackRenderer.media_type)
+    return HttpResponse(json_dumps(data), status=status, content_type='application/json')
+
+
+async def authenticate(request):
+    """
+    Return the user of the request's access token, None without a token.
+    Raise AuthenticationFailed for invalid tokens.
+    """
+    # Token validation is CPU only, checking the user's version may
+    # query the db.
+    result = await sync_to_async(_authentication.authenticate)(request)
+    return result and result[0]
+
+
+def unauthorized(request, detail):
+    """Return a 401 with the body DRF would send for the same error."""
+    data = detail if isinstance(detail, (dict, list)) else {'detail': detail}
+    response = api_response(request, data, status.HTTP_401_UNAUTHORIZED)
+    response.headers['WWW-Authenticate'] = _authentication.authenticate_header(request)
+    return response
+
+
+def async_api_view(methods, authenticated=False):
+    """
+    Decorate an async view answering only `methods`, with `request.user`
+    set from the access token when `authenticated` is true.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                data = {'detail': f'Method "{request.method}" not allowed.'}
+                response = api_response(request, data, status.HTTP_405_METHOD_NOT_ALLOWED)
+                response.headers['Allow'] = ', '.join(methods)
+                return response
+
+            if authenticated:
+                try:
+                    request.user = await authenticate(request)
+                except AuthenticationFailed as exc:
+                    # The frontend logs out on simplejwt's invalid token message.
+                    return unauthorized(request, exc.detail)
+                if request.user is None:
+                    return unauthorized(request, NotAuthenticated.default_detail)
+
+            return await view(request, *args, **kwargs)
+        return wrapper
+    return decorator
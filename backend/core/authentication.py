@@ -0,0 +1,117 @@
+"""
+JWT authentication that answers read requests from the token's claims.
+
+Access tokens carry the user's id, username, email, name and staff flag
+along with `ver`, a keyed digest of those fields, the active flag and the
+password hash. Read requests build the user from the claims after
+checking `ver` against the user's current digest, cached for
+AUTH_CACHE_TIMEOUT seconds and dropped whenever the user is saved or
+deleted. Changing a password, a profile or a role, deactivating or
+deleting a user so revokes their tokens at once.
+
+Fields outside the claims are deferred, the ORM loads them on first
+access. Writes load the whole user, as simplejwt does.
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils.crypto import salted_hmac
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.metrics import count_cache
+
+CLAIM_FIELDS = ['id', 'username', 'email', 'first_name', 'is_staff']
+VERSION_FIELDS = CLAIM_FIELDS + ['is_active', 'password']
+VERSION_CLAIM = 'ver'
+
+
+def _version_key(pk):
+    return f'auth:version:{pk}'
+
+
+def get_version(values):
+    """Return the digest of a user's VERSION_FIELDS values."""
+    value = '\0'.join(str(value) for value in values)
+    return salted_hmac('core.authentication', value).hexdigest()[:16]
+
+
+def get_token(user):
+    """Return a refresh token whose access tokens carry the user's claims."""
+    token = RefreshToken.for_user(user)
+    for field in CLAIM_FIELDS[1:]:
+        token[field] = getattr(user, field)
+    token[VERSION_CLAIM] = get_version(getattr(user, field) for field in VERSION_FIELDS)
+    return token
+
+
+def current_version(pk):
+    """Return the cached digest of a user, '' for missing and inactive ones."""
+    version = cache.get(_version_key(pk))
+    count_cache('auth', version is not None)
+    if version is None:
+        values = User.objects.filter(id=pk).values_list(*VERSION_FIELDS).first()
+        version = get_version(values) if values and values[VERSION_FIELDS.index('is_active')] else ''
+        cache.set(_version_key(pk), version, settings.AUTH_CACHE_TIMEOUT)
+    return version
+
+
+def revoked():
+    # simplejwt's message for invalid tokens, on which clients log out.
+    return InvalidToken({
+        'detail': 'Given token not valid for any token type',
+        'code': 'token_not_valid',
+        'messages': [{'message': 'Token has been revoked.'}],
+    })
+
+
+def user_changed(sender, instance, **kwargs):
+    """Drop the cached digest now and, past concurrent reads, on commit."""
+    key = _version_key(instance.pk)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication without a user query on read requests."""
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        if request.method in SAFE_METHODS and VERSION_CLAIM in validated_token:
+            return self.get_claims_user(validated_token), validated_token
+        return self.get_user(validated_token), validated_token
+
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        version = validated_token.get(VERSION_CLAIM)
+        # Tokens minted before the claims were added have no version.
+        if version is not None and get_version(getattr(user, field) for field in VERSION_FIELDS) != version:
+            raise revoked()
+        return user
+
+    def get_claims_user(self, validated_token):
+        """Return the user of the claims, its other fields deferred."""
+        try:
+            claims = {field: validated_token[field] for field in CLAIM_FIELDS[1:]}
+            claims['id'] = User._meta.pk.to_python(validated_token[api_settings.USER_ID_CLAIM])
+        except KeyError as error:
+            raise InvalidToken('Token contained no recognizable user identification') from error
+
+        if current_version(claims['id']) != validated_token[VERSION_CLAIM]:
+            raise revoked()
+
+        claims['is_active'] = True
+        names = [field.attname for field in User._meta.concrete_fields if field.attname in claims]
+        return User.from_db(DEFAULT_DB_ALIAS, names, [claims[name] for name in names])
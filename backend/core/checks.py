@@ -0,0 +1,27 @@
+"""
+System checks of the deployment settings.
+"""
+from django.conf import settings
+from django.core import checks
+
+LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@checks.register(checks.Tags.caches, deploy=False)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Workers must share the cache. Product invalidations, leaderboards,
+    replica pins and token revocations are kept there, a per process
+    cache leaves the other workers serving stale data.
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    if settings.WEB_WORKERS > 1 and backend in LOCAL_CACHES:
+        return [checks.Error(
+            f'{settings.WEB_WORKERS} workers each use their own {backend.rsplit(".", 1)[-1]}.',
+            hint='Set CACHE_BACKEND and CACHE_LOCATION to a shared cache, e.g. Redis.',
+            id='core.E001',
+        )]
+    return []
@@ -0,0 +1,74 @@
+"""
+Conditional GET for the API views.
+
+Views compute validators from updatedAt columns or version counters
+before serializing anything and only render the payload when the
+client's copy is stale.
+"""
+import hashlib
+from calendar import timegm
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from core.versions import get_versions
+
+
+def make_etag(*parts):
+    """Return an ETag for the given validator parts."""
+    digest = hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+    return quote_etag(digest)
+
+
+def versions_etag(keys, *parts):
+    """
+    Return an ETag for data validated by version counters, see
+    core.versions. Lists use them instead of aggregating their rows.
+    """
+    versions = get_versions(keys)
+    return make_etag(*parts, *[versions[key] for key in keys])
+
+
+def _timestamp(last_modified):
+    return last_modified and timegm(last_modified.utctimetuple())
+
+
+def conditional(request, render, etag=None, last_modified=None, public=False):
+    """
+    Return 304 Not Modified when the validators match, else render().
+
+    Public responses may be stored by proxies but must be revalidated,
+    private ones only by the client.
+    """
+    timestamp = _timestamp(last_modified)
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = render()
+    return _add_headers(response, etag, timestamp, public)
+
+
+async def aconditional(request, render, etag=None, last_modified=None, public=False):
+    """Async version of conditional(), render is a coroutine function."""
+    timestamp = _timestamp(last_modified)
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = await render()
+    return _add_headers(response, etag, timestamp, public)
+
+
+def _add_headers(response, etag, timestamp, public):
+    if etag:
+        response.headers['ETag'] = etag
+    if timestamp:
+        response.headers['Last-Modified'] = http_date(timestamp)
+    if public:
+        patch_cache_control(
+            response, public=True, must_revalidate=True,
+            max_age=settings.CATALOG_CACHE_MAX_AGE,
+        )
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    # The renderer is picked from the Accept header.
+    patch_vary_headers(response, ['Accept'])
+    return response
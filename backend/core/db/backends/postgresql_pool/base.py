@@ -0,0 +1,98 @@
+"""
+PostgreSQL backend handing out connections from a per-process pool.
+
+Each thread still gets its own DatabaseWrapper, but closing it returns
+the connection to the pool instead of closing it, so the worker's
+threads share `POOL['MAX_SIZE']` connections. Use with CONN_MAX_AGE=0,
+connections go back to the pool at the end of every request.
+"""
+import os
+import threading
+
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.creation import DatabaseCreation as BaseDatabaseCreation
+from psycopg2 import extensions
+
+from core.db.pool import ConnectionPool, PoolTimeout
+
+_pools = {}
+_pools_pid = None
+_lock = threading.Lock()
+
+
+def get_pool(alias, settings_dict):
+    """Return the pool of a database in this process."""
+    global _pools_pid
+    key = (alias, settings_dict['NAME'])
+    with _lock:
+        # Connections inherited from a forking master belong to it.
+        if _pools_pid != os.getpid():
+            _pools.clear()
+            _pools_pid = os.getpid()
+        if key not in _pools:
+            options = settings_dict.get('POOL', {})
+            _pools[key] = ConnectionPool(
+                max_size=options.get('MAX_SIZE', 4),
+                timeout=options.get('TIMEOUT', 10),
+                max_lifetime=options.get('MAX_LIFETIME', 3600),
+                check_after=options.get('CHECK_AFTER', 30),
+                check=is_usable,
+            )
+        return _pools[key]
+
+
+def close_pools():
+    """Close the pools of this process."""
+    with _lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+def is_usable(connection):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except Exception:
+        return False
+    return True
+
+
+class DatabaseCreation(BaseDatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Idle pooled connections would block DROP DATABASE.
+        close_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict)
+
+    def get_new_connection(self, conn_params):
+        try:
+            return self.pool.getconn(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
+        except PoolTimeout as error:
+            raise self.Database.OperationalError(str(error)) from error
+
+    def _close(self):
+        if self.connection is None:
+            return
+        connection, self.connection = self.connection, None
+        status = connection.info.transaction_status if not connection.closed else None
+        usable = status == extensions.TRANSACTION_STATUS_IDLE
+        if status in (extensions.TRANSACTION_STATUS_INTRANS, extensions.TRANSACTION_STATUS_INERROR):
+            # Left by a failed request, the next one must start clean.
+            try:
+                connection.rollback()
+                usable = True
+            except self.Database.Error:
+                pass
+        if usable and not connection.autocommit:
+            connection.autocommit = True
+        self.pool.putconn(connection, usable)
@@ -0,0 +1,142 @@
+"""
+A thread-safe pool of database connections for one worker process.
+
+Connections are handed out most recently used first so that a quiet
+worker keeps a few hot connections and lets the others age out.
+"""
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """No connection became available within the pool timeout."""
+
+
+class ConnectionPool:
+    """
+    Keep up to `max_size` open connections.
+
+    Idle connections are checked with `check(connection)` before reuse
+    when they have been idle for `check_after` seconds, and closed once
+    older than `max_lifetime` seconds.
+    """
+
+    def __init__(self, max_size, timeout=10, max_lifetime=3600, check_after=30, check=None):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.check_after = check_after
+        self.check = check
+        self._condition = threading.Condition()
+        self._idle = deque()
+        self._created_at = {}
+        self._size = 0
+        self._closed = False
+        self.checked_out = 0
+        self.waiting = 0
+        self.created = 0
+        self.discarded = 0
+        self.timeouts = 0
+
+    def getconn(self, connect):
+        """Return an idle connection or one made by `connect()`."""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._condition:
+                connection, idle_since = self._reserve(deadline)
+                self.checked_out += 1
+
+            if connection is None:
+                try:
+                    connection = connect()
+                except BaseException:
+                    self._release_slot()
+                    raise
+                with self._condition:
+                    self._created_at[connection] = time.monotonic()
+                    self.created += 1
+                return connection
+
+            if self._usable(connection, idle_since):
+                return connection
+            self._discard(connection)
+
+    def _reserve(self, deadline):
+        # Called with the lock held, returns (idle connection, idle since)
+        # or (None, None) after reserving a slot for a new connection.
+        while not self._idle and self._size >= self.max_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._closed:
+                self.timeouts += 1
+                raise PoolTimeout(f'No connection available within {self.timeout}s.')
+            self.waiting += 1
+            try:
+                self._condition.wait(remaining)
+            finally:
+                self.waiting -= 1
+
+        if self._idle:
+            return self._idle.pop()
+        self._size += 1
+        return None, None
+
+    def _usable(self, connection, idle_since):
+        now = time.monotonic()
+        if getattr(connection, 'closed', False):
+            return False
+        if now - self._created_at.get(connection, now) > self.max_lifetime:
+            return False
+        if self.check is not None and now - idle_since > self.check_after:
+            return self.check(connection)
+        return True
+
+    def putconn(self, connection, usable=True):
+        """Return a connection, closing it unless `usable`."""
+        if not usable or self._closed or not self._usable(connection, time.monotonic()):
+            self._discard(connection)
+            return
+
+        with self._condition:
+            self.checked_out -= 1
+            self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    def _discard(self, connection, checked_out=True):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._condition:
+            self._created_at.pop(connection, None)
+            self.discarded += 1
+        self._release_slot(checked_out)
+
+    def _release_slot(self, checked_out=True):
+        with self._condition:
+            self._size -= 1
+            if checked_out:
+                self.checked_out -= 1
+            self._condition.notify()
+
+    def close(self):
+        """Close the idle connections, checked out ones when returned."""
+        with self._condition:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._condition.notify_all()
+        for connection, _ in idle:
+            self._discard(connection, checked_out=False)
+
+    def stats(self):
+        with self._condition:
+            return {
+                'size': self._size,
+                'max_size': self.max_size,
+                'idle': len(self._idle),
+                'checked_out': self.checked_out,
+                'waiting': self.waiting,
+                'created': self.created,
+                'discarded': self.discarded,
+                'timeouts': self.timeouts,
+            }
@@ -0,0 +1,112 @@
+"""
+Send catalog and order history reads to read replicas.
+
+Views opt in with @replica_reads, every other query and all writes go to
+the primary. Users who just wrote are pinned to the primary for
+REPLICA_PIN_SECONDS so that replication lag doesn't hide their writes,
+and replicas failing to connect are skipped for REPLICA_RETRY_SECONDS.
+"""
+import random
+import time
+from asyncio import iscoroutinefunction
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.utils import OperationalError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.views import APIView
+
+# The replica chosen for the current request, '' until the first read.
+_replica = ContextVar('replica', default=None)
+_down_until = {}
+
+
+def pin(user_id):
+    """Read from the primary for the user's next requests."""
+    if user_id is not None and settings.DATABASE_REPLICAS:
+        cache.set(f'db:pin:{user_id}', True, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user):
+    if not settings.DATABASE_REPLICAS or user is None or not user.is_authenticated:
+        return False
+    return cache.get(f'db:pin:{user.id}', False)
+
+
+@contextmanager
+def use_replica(enabled=True):
+    """Run the reads of the block on a replica when `enabled`."""
+    token = _replica.set('' if enabled else None)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+def use_primary():
+    """Run the reads of the block on the primary."""
+    return use_replica(False)
+
+
+def replica_reads(view):
+    """
+    Serve the reads of a view, a viewset action or an async view from a
+    replica, unless the request writes or its user is pinned.
+    """
+    def enabled(args):
+        request = args[1] if isinstance(args[0], APIView) else args[0]
+        return request.method in SAFE_METHODS and not is_pinned(getattr(request, 'user', None))
+
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(*args, **kwargs):
+            with use_replica(enabled(args)):
+                return await view(*args, **kwargs)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with use_replica(enabled(args)):
+            return view(*args, **kwargs)
+    return wrapper
+
+
+def get_replica():
+    """Return the alias of a connectable replica or None."""
+    now = time.monotonic()
+    replicas = [alias for alias in settings.DATABASE_REPLICAS if _down_until.get(alias, 0) <= now]
+    random.shuffle(replicas)
+    for alias in replicas:
+        try:
+            connections[alias].ensure_connection()
+        except OperationalError:
+            _down_until[alias] = now + settings.REPLICA_RETRY_SECONDS
+            continue
+        return alias
+    return None
+
+
+class ReplicaRouter:
+    """Route reads inside use_replica() to one replica per request."""
+
+    def db_for_read(self, model, **hints):
+        alias = _replica.get()
+        if alias == '':
+            # Stick to one replica so a request sees a single snapshot.
+            alias = get_replica() or DEFAULT_DB_ALIAS
+            _replica.set(alias)
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
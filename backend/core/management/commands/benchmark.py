@@ -0,0 +1,55 @@
+"""
+Django command to run a benchmark against a throwaway test database.
+"""
+from importlib import import_module
+
+from django.core.management.base import BaseCommand
+from django.test.utils import setup_databases, teardown_databases
+
+BENCHMARKS = [
+    'search',
+    'checkout',
+    'renderers',
+    'serializers',
+    'load',
+    'connections',
+    'endpoints',
+    'metrics',
+    'auth',
+    'logins',
+    'stock',
+    'bulk_orders',
+]
+
+
+class Command(BaseCommand):
+    """Django command to run benchmarks."""
+
+    help = 'Seed a test database and run one of the benchmarks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keepdb', action='store_true',
+            help='Reuse the test database between runs.',
+        )
+        subparsers = parser.add_subparsers(dest='benchmark', required=True)
+        for name in BENCHMARKS:
+            module = import_module(f'benchmarks.{name}')
+            module.add_arguments(subparsers.add_parser(name, help=module.__doc__.strip()))
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        module = import_module(f'benchmarks.{options["benchmark"]}')
+        old_config = setup_databases(
+            verbosity=options['verbosity'],
+            interactive=False,
+            keepdb=options['keepdb'],
+        )
+        try:
+            module.run(self.stdout, **options)
+        finally:
+            teardown_databases(
+                old_config,
+                verbosity=options['verbosity'],
+                keepdb=options['keepdb'],
+            )
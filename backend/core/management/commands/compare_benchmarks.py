@@ -0,0 +1,75 @@
+"""
+Django command to compare endpoint benchmark results with a baseline.
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.utils import write_table
+
+
+def find_regressions(baseline, current, threshold, min_ms):
+    """
+    Return (rows, regressions) comparing the endpoints of two results.
+
+    Latency regresses when p50 or p95 grow by more than `threshold` and
+    `min_ms`, queries when their count grows at all.
+    """
+    rows, regressions = [], []
+    for name, base in baseline['endpoints'].items():
+        result = current['endpoints'].get(name)
+        if result is None:
+            continue
+
+        problems = []
+        for stat in ('p50', 'p95'):
+            change = result[stat] - base[stat]
+            if change > min_ms and change > base[stat] * threshold:
+                problems.append(f'{stat} +{change / base[stat]:.0%}')
+        if result['queries'] > base['queries']:
+            problems.append(f'queries {base["queries"]} -> {result["queries"]}')
+        if result['status'] != base['status']:
+            problems.append(f'status {base["status"]} -> {result["status"]}')
+
+        rows.append([
+            name, base['p95'], result['p95'], f'{result["p95"] / base["p95"] - 1:+.0%}',
+            base['queries'], result['queries'], ', '.join(problems) or 'ok',
+        ])
+        if problems:
+            regressions.append(name)
+    return rows, regressions
+
+
+class Command(BaseCommand):
+    """Django command to flag benchmark regressions."""
+
+    help = 'Compare `benchmark endpoints --output` results with a baseline.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('baseline', help='Baseline results, e.g. benchmarks/baselines/endpoints.json.')
+        parser.add_argument('results', help='Results to check.')
+        parser.add_argument(
+            '--threshold', type=float, default=0.25,
+            help='Tolerated latency growth as a fraction of the baseline.',
+        )
+        parser.add_argument(
+            '--min-ms', type=float, default=1.0,
+            help='Tolerated latency growth in milliseconds, for fast endpoints.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        with open(options['baseline']) as f:
+            baseline = json.load(f)
+        with open(options['results']) as f:
+            current = json.load(f)
+
+        rows, regressions = find_regressions(baseline, current, options['threshold'], options['min_ms'])
+        write_table(self.stdout, ['endpoint', 'base p95', 'p95', 'change', 'base queries', 'queries', 'result'], rows)
+
+        missing = set(baseline['endpoints']) - set(current['endpoints'])
+        if missing:
+            self.stderr.write(f'Not measured: {", ".join(sorted(missing))}')
+        if regressions:
+            raise CommandError(f'{len(regressions)} endpoints regressed: {", ".join(regressions)}')
+        self.stdout.write(self.style.SUCCESS('No regressions.'))
@@ -0,0 +1,36 @@
+"""
+Django command to create the resized variants of existing product images.
+"""
+from django.core.management.base import BaseCommand
+
+from core.models import Product
+from product.images import process_product_image
+
+
+class Command(BaseCommand):
+    """Django command to backfill product image variants."""
+
+    help = 'Create thumbnails and responsive sizes of the product images.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Recreate variants of products that already have them.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        products = Product.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['all']:
+            products = products.filter(imageVariants={})
+
+        created = failed = 0
+        for pk in products.order_by('id').values_list('id', flat=True).iterator():
+            try:
+                process_product_image(pk)
+                created += 1
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f'Product {pk}: {error}')
+
+        self.stdout.write(self.style.SUCCESS(f'Created variants of {created} products, {failed} failed.'))
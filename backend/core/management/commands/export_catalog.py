@@ -0,0 +1,37 @@
+"""
+Django command to export products or reviews as JSON Lines or CSV.
+"""
+import sys
+
+from django.core.management.base import BaseCommand
+
+from product import catalog
+
+
+class Command(BaseCommand):
+    """Django command to stream the catalog out."""
+
+    help = 'Stream products or reviews to a file that import_catalog reads back.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=['products', 'reviews'])
+        parser.add_argument('path', nargs='?', default='-', help='File to write, - for stdout.')
+        parser.add_argument(
+            '--format', choices=catalog.FORMATS,
+            help='File format, by default from the extension, jsonl unless .csv.',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows fetched at once.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        path = options['path']
+        format = catalog.get_format(path, options['format'])
+        export = catalog.export_products if options['kind'] == 'products' else catalog.export_reviews
+
+        if path == '-':
+            export(self.stdout, format, options['batch_size'])
+            return
+
+        with open(path, 'w', newline='', encoding='utf-8') as file:
+            written = export(file, format, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Exported {written} {options["kind"]}.'))
@@ -0,0 +1,56 @@
+"""
+Django command to import products or reviews from JSON Lines or CSV.
+"""
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from product import catalog
+
+
+class Command(BaseCommand):
+    """Django command to upsert the catalog in batches."""
+
+    help = 'Stream products or reviews from a file into the database, updating existing ones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=['products', 'reviews'])
+        parser.add_argument('path', help='File to read, - for stdin.')
+        parser.add_argument(
+            '--format', choices=catalog.FORMATS,
+            help='File format, by default from the extension, jsonl unless .csv.',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows validated and written at once.')
+        parser.add_argument('--user', help='Username of the owner of new products.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        path = options['path']
+        format = catalog.get_format(path, options['format'])
+        errors = []
+
+        def on_error(line, message):
+            errors.append(line)
+            self.stderr.write(f'Line {line}: {message}')
+
+        user = None
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f'User {options["user"]} doesn\'t exist.')
+
+        file = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        try:
+            rows = catalog.read_rows(file, format)
+            if options['kind'] == 'products':
+                written = catalog.import_products(rows, options['batch_size'], on_error, user)
+            else:
+                written = catalog.import_reviews(rows, options['batch_size'], on_error)
+        finally:
+            if file is not sys.stdin:
+                file.close()
+
+        self.stdout.write(self.style.SUCCESS(f'Imported {written} {options["kind"]}.'))
+        if errors:
+            raise CommandError(f'Skipped {len(errors)} invalid rows.')
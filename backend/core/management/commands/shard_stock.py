@@ -0,0 +1,32 @@
+"""
+Django command to spread the stock of hot products over several rows.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Product
+from product.stock import shard_stock
+
+
+class Command(BaseCommand):
+    """Django command to shard or unshard product stock."""
+
+    help = 'Keep the stock of products in several rows, so their orders don\'t wait for each other.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('products', nargs='+', type=int, help='Product ids.')
+        parser.add_argument(
+            '--shards', type=int, default=8,
+            help='Rows per product, 0 moves the stock back to the product.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        if not 0 <= options['shards'] <= 1000:
+            raise CommandError('--shards must be between 0 and 1000.')
+
+        for pk in options['products']:
+            try:
+                total = shard_stock(pk, options['shards'])
+            except Product.DoesNotExist:
+                raise CommandError(f'Product {pk} doesn\'t exist.')
+            self.stdout.write(f'Product {pk}: {total} in stock over {options["shards"]} shards.')
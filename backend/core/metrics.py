@@ -0,0 +1,113 @@
+"""
+Prometheus metrics of the API, served at /api/metrics/.
+
+uWSGI and uvicorn run several worker processes, each keeping its own
+values. With PROMETHEUS_MULTIPROC_DIR set (scripts/run.sh) workers write
+them to memory mapped files in that directory, which the endpoint sums.
+Label children are looked up once, recording a value then costs about a
+microsecond.
+"""
+import atexit
+import os
+import time
+from functools import lru_cache
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+MULTIPROCESS = bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+LATENCY_BUCKETS = (.005, .01, .025, .05, .075, .1, .25, .5, .75, 1, 2.5, 5, 10)
+SERIALIZER_BUCKETS = (.0001, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, 1)
+SIZE_BUCKETS = (1 << 10, 10 << 10, 100 << 10, 1 << 20, 5 << 20, 10 << 20)
+
+REQUESTS = Counter(
+    'http_requests', 'Requests answered by view.', ['view', 'method', 'status'],
+)
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Time spent answering requests by view.',
+    ['view', 'method'], buckets=LATENCY_BUCKETS,
+)
+DB_DURATION = Histogram(
+    'http_request_db_seconds', 'Time spent running the queries of a request by view.',
+    ['view'], buckets=LATENCY_BUCKETS,
+)
+DB_QUERIES = Counter('http_request_db_queries', 'Queries run by view.', ['view'])
+REQUEST_SIZE = Histogram(
+    'http_request_body_bytes', 'Size of request bodies by view, e.g. uploads.',
+    ['view'], buckets=SIZE_BUCKETS,
+)
+IN_FLIGHT = Gauge(
+    'http_requests_in_flight', 'Requests being answered.', multiprocess_mode='livesum',
+)
+SERIALIZER_DURATION = Histogram(
+    'serializer_duration_seconds', 'Time spent serializing instances by serializer.',
+    ['serializer'], buckets=SERIALIZER_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    'cache_requests', 'Cache lookups by cache and result, hit or miss.', ['cache', 'result'],
+)
+PASSWORD_HASH_WAIT = Histogram(
+    'password_hash_wait_seconds', 'Time password hashes waited for a hashing slot.',
+    buckets=LATENCY_BUCKETS,
+)
+PASSWORD_HASH_REJECTED = Counter(
+    'password_hash_rejected', 'Password hashes answered 503 as no hashing slot freed up.',
+)
+
+
+@lru_cache(maxsize=None)
+def _child(metric, *labels):
+    return metric.labels(*labels)
+
+
+def observe_request(view, method, status, duration, db_duration=None, db_queries=0, size=0):
+    """Record an answered request."""
+    _child(REQUESTS, view, method, str(status)).inc()
+    _child(REQUEST_DURATION, view, method).observe(duration)
+    if db_duration is not None:
+        _child(DB_DURATION, view).observe(db_duration)
+        _child(DB_QUERIES, view).inc(db_queries)
+    if size:
+        _child(REQUEST_SIZE, view).observe(size)
+
+
+def observe_serializer(name, start):
+    """Record the time spent serializing since `start`, a perf_counter()."""
+    _child(SERIALIZER_DURATION, name).observe(time.perf_counter() - start)
+
+
+def count_cache(cache, hit, count=1):
+    """Record `count` hits or misses of a cache."""
+    if count:
+        _child(CACHE_REQUESTS, cache, 'hit' if hit else 'miss').inc(count)
+
+
+def observe_password_hash(wait, rejected=False):
+    """Record the seconds a password hash waited for a slot."""
+    PASSWORD_HASH_WAIT.observe(wait)
+    if rejected:
+        PASSWORD_HASH_REJECTED.inc()
+
+
+def render():
+    """Return the metrics of all workers and their content type."""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+if MULTIPROCESS:
+    # Drops the in flight requests of a worker that exits.
+    atexit.register(lambda: multiprocess.mark_process_dead(os.getpid()))
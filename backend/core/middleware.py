@@ -0,0 +1,233 @@
+"""
+Middleware of the API.
+"""
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework.permissions import SAFE_METHODS
+
+from core import metrics, profiling
+from core.db.routers import pin
+from core.queries import atrack_stream, get_query_budget, track_queries, track_stream
+
+logger = logging.getLogger(__name__)
+
+
+class HybridMiddleware:
+    """
+    Middleware running in sync and async chains alike, so that under ASGI
+    requests reach the async views without a hop to a thread and back.
+    Subclasses implement call() and acall(). They read the resolved view
+    from request.resolver_match once the response is back, a process_view()
+    hook would run in a thread under ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.acall(request)
+        return self.call(request)
+
+
+class ReplicaPinMiddleware(HybridMiddleware):
+    """Pin users to the primary database after a successful write."""
+
+    def call(self, request):
+        return self.pin(request, self.get_response(request))
+
+    async def acall(self, request):
+        return self.pin(request, await self.get_response(request))
+
+    def pin(self, request, response):
+        # DRF sets the user authenticated from the token on the request.
+        user = getattr(request, 'user', None)
+        if request.method not in SAFE_METHODS and response.status_code < 400 \
+                and user is not None and user.is_authenticated:
+            pin(user.id)
+        return response
+
+
+class QueryMetricsMiddleware(HybridMiddleware):
+    """
+    Count the queries of each request and their time, sent as the
+    X-DB-Queries and X-DB-Time headers when QUERY_METRICS_HEADERS is on,
+    and warn about requests going over the query budget of their view.
+    """
+
+    def call(self, request):
+        with track_queries() as stats:
+            response = self.get_response(request)
+        return self.record(request, response, stats)
+
+    async def acall(self, request):
+        # Queries of sync_to_async threads count too, see core/queries.py.
+        with track_queries() as stats:
+            response = await self.get_response(request)
+        return self.record(request, response, stats)
+
+    def record(self, request, response, stats):
+        match = getattr(request, 'resolver_match', None)
+        # DRF responses carry the request with the data the view parsed.
+        context = getattr(response, 'renderer_context', None) or {}
+        response.query_budget = match and get_query_budget(match.func, request.method, context.get('request', request))
+
+        if response.streaming:
+            # Streamed bodies run their queries after the headers are sent,
+            # the request is checked once its body is.
+            track = atrack_stream if response.is_async else track_stream
+            response.streaming_content = track(
+                stats, response.streaming_content, lambda: self.check(request, response, stats),
+            )
+            return response
+
+        if settings.QUERY_METRICS_HEADERS:
+            response['X-DB-Queries'] = stats.count
+            response['X-DB-Time'] = f'{stats.duration:.2f}'
+        return self.check(request, response, stats)
+
+    def check(self, request, response, stats):
+        # Tests assert the budgets with these (core/testing.py).
+        response.db_queries = stats.count
+        response.db_time = stats.duration
+        budget = response.query_budget
+        if budget is not None and stats.count > budget:
+            logger.warning(
+                '%s %s ran %d queries in %.2f ms, over its budget of %d.',
+                request.method, request.path, stats.count, stats.duration, budget,
+            )
+        return response
+
+
+class ProfilerMiddleware(HybridMiddleware):
+    """
+    Save a CPU and memory profile (core/profiling.py) of a sample of
+    PROFILE_SAMPLE_RATE requests, and of requests slower than
+    PROFILE_SLOW_MS. Catching the slow ones means profiling every request.
+
+    Under ASGI the profile of a request also holds the other requests the
+    event loop ran meanwhile, and not the work of its sync_to_async threads.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILE_REQUESTS:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def call(self, request):
+        sampled = self.sample()
+        if sampled is None:
+            return self.get_response(request)
+
+        try:
+            with profiling.Profile(memory=settings.PROFILE_MEMORY) as profile:
+                response = self.get_response(request)
+            self.save(request, profile, sampled)
+        finally:
+            profiling.release()
+        return response
+
+    async def acall(self, request):
+        sampled = self.sample()
+        if sampled is None:
+            return await self.get_response(request)
+
+        try:
+            with profiling.Profile(memory=settings.PROFILE_MEMORY) as profile:
+                response = await self.get_response(request)
+            self.save(request, profile, sampled)
+        finally:
+            profiling.release()
+        return response
+
+    def sample(self):
+        """Return whether the request is sampled, None when it isn't profiled."""
+        sampled = random.random() < settings.PROFILE_SAMPLE_RATE
+        if not (sampled or settings.PROFILE_SLOW_MS) or not profiling.acquire():
+            return None
+        return sampled
+
+    def save(self, request, profile, sampled):
+        if sampled or profile.duration >= settings.PROFILE_SLOW_MS:
+            name = profile.save(settings.PROFILE_DIR, f'{request.method} {request.path}')
+            logger.info('Profiled %s %s as %s.', request.method, request.path, name)
+
+
+class MetricsMiddleware(HybridMiddleware):
+    """Record the requests of each view for the metrics (core/metrics.py)."""
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def call(self, request):
+        metrics.IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.IN_FLIGHT.dec()
+        return self.observe(request, response, start)
+
+    async def acall(self, request):
+        metrics.IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.IN_FLIGHT.dec()
+        return self.observe(request, response, start)
+
+    def observe(self, request, response, start):
+        if response.streaming:
+            # Streamed bodies are observed once sent, with their queries.
+            then = _athen if response.is_async else _then
+            response.streaming_content = then(
+                response.streaming_content, lambda: self.record(request, response, start),
+            )
+            return response
+        return self.record(request, response, start)
+
+    def record(self, request, response, start):
+        # Route names, not paths, keep the number of label values bounded.
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name or match.route) if match else 'unmatched'
+
+        try:
+            size = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            size = 0
+
+        db_time = getattr(response, 'db_time', None)
+        metrics.observe_request(
+            view,
+            request.method,
+            response.status_code,
+            time.perf_counter() - start,
+            None if db_time is None else db_time / 1000,
+            getattr(response, 'db_queries', 0),
+            size,
+        )
+        return response
+
+
+def _then(content, callback):
+    yield from content
+    callback()
+
+
+async def _athen(content, callback):
+    async for chunk in content:
+        yield chunk
+    callback()
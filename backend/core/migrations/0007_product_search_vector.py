@@ -0,0 +1,84 @@
+import django.contrib.postgres.search
+from django.db import DatabaseError, migrations, transaction
+
+
+SEARCH_VECTOR_SQL = """
+    setweight(to_tsvector('english', coalesce({prefix}name, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce({prefix}brand, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce({prefix}category, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce({prefix}description, '')), 'C')
+"""
+
+CREATE_TRIGGER_SQL = f"""
+CREATE OR REPLACE FUNCTION core_product_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := {SEARCH_VECTOR_SQL.format(prefix='NEW.')};
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_product_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, brand, category, description
+    ON core_product
+    FOR EACH ROW EXECUTE PROCEDURE core_product_search_vector_update();
+
+UPDATE core_product SET search_vector = {SEARCH_VECTOR_SQL.format(prefix='')};
+
+CREATE INDEX core_product_search_vector_idx ON core_product USING gin (search_vector);
+"""
+
+DROP_TRIGGER_SQL = """
+DROP INDEX IF EXISTS core_product_search_vector_idx;
+DROP TRIGGER IF EXISTS core_product_search_vector_trigger ON core_product;
+DROP FUNCTION IF EXISTS core_product_search_vector_update();
+"""
+
+CREATE_TRIGRAM_INDEX_SQL = """
+CREATE INDEX core_product_name_trgm_idx ON core_product USING gin (name gin_trgm_ops);
+"""
+
+DROP_TRIGRAM_INDEX_SQL = """
+DROP INDEX IF EXISTS core_product_name_trgm_idx;
+"""
+
+
+def create_search_objects(apps, schema_editor):
+    """Create the search trigger and indexes on Postgres only."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute(CREATE_TRIGGER_SQL)
+
+    # pg_trgm ships with the official Postgres images but may be missing
+    # on bare installs, typo tolerance is then disabled at query time.
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm;')
+            schema_editor.execute(CREATE_TRIGRAM_INDEX_SQL)
+    except DatabaseError:
+        pass
+
+
+def drop_search_objects(apps, schema_editor):
+    """Drop the search trigger and indexes."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute(DROP_TRIGRAM_INDEX_SQL)
+    schema_editor.execute(DROP_TRIGGER_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_product_active'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_objects, drop_search_objects),
+    ]
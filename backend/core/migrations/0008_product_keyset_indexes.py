@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:02
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.functions.comparison
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_product_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(models.F('active'), models.F('createdAt'), models.F('id'), name='product_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(models.F('active'), django.db.models.functions.comparison.Coalesce('rating', models.Value(Decimal('0')), output_field=models.DecimalField(decimal_places=2, max_digits=7)), models.F('id'), name='product_active_rating_idx'),
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:08
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Q, Sum
+
+
+def remove_duplicate_reviews(apps, schema_editor):
+    """Keep the latest review of every user on a product, for the constraint."""
+    Review = apps.get_model('core', 'Review')
+
+    duplicates = Review.objects.filter(product__isnull=False, user__isnull=False) \
+        .values('product', 'user') \
+        .annotate(latest=Max('id'), count=Count('id')) \
+        .filter(count__gt=1)
+    for row in duplicates.iterator():
+        Review.objects.filter(product=row['product'], user=row['user']).exclude(id=row['latest']).delete()
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    """Compute rating aggregates from the existing reviews."""
+    Product = apps.get_model('core', 'Product')
+    Review = apps.get_model('core', 'Review')
+
+    aggregates = Review.objects.filter(product__isnull=False, rating__range=(1, 5)) \
+        .values('product') \
+        .annotate(
+            total=Sum('rating'),
+            count=Count('id'),
+            **{f'stars{star}': Count('id', filter=Q(rating=star)) for star in range(1, 6)},
+        )
+    for row in aggregates.iterator():
+        Product.objects.filter(id=row['product']).update(
+            ratingSum=row['total'],
+            numReviews=row['count'],
+            rating=row['total'] / row['count'],
+            **{f'numStars{star}': row[f'stars{star}'] for star in range(1, 6)},
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='numStars1',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='numStars2',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='numStars3',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='numStars4',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='numStars5',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='ratingSum',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(remove_duplicate_reviews, migrations.RunPython.noop),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='review',
+            constraint=models.UniqueConstraint(fields=('product', 'user'), name='review_product_user_unique'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_product_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='imageVariants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
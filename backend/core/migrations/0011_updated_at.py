@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:40
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_product_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='updatedAt',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='updatedAt',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='updatedAt',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['updatedAt'], name='product_updated_idx'),
+        ),
+    ]
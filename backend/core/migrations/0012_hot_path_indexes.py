@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'createdAt', 'id'], name='order_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['createdAt', 'id'], name='order_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('active', False)), fields=['updatedAt', 'id'], name='product_inactive_updated_idx'),
+        ),
+    ]
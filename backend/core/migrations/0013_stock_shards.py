@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='stockShards',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='StockShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('count', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.product')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='stockshard',
+            constraint=models.UniqueConstraint(fields=('product', 'shard'), name='stockshard_product_shard_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='stockshard',
+            constraint=models.CheckConstraint(check=models.Q(('count__gte', 0)), name='stockshard_count_not_negative'),
+        ),
+    ]
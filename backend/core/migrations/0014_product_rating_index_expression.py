@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:00
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.functions.comparison
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_stock_shards'),
+    ]
+
+    # The output_field of the Coalesce in 0008 doesn't change the indexed
+    # expression, only the state is updated so the autodetector stops
+    # re-creating the index.
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RemoveIndex(
+                    model_name='product',
+                    name='product_active_rating_idx',
+                ),
+                migrations.AddIndex(
+                    model_name='product',
+                    index=models.Index(models.F('active'), django.db.models.functions.comparison.Coalesce('rating', models.Value(Decimal('0'))), models.F('id'), name='product_active_rating_idx'),
+                ),
+            ],
+        ),
+    ]
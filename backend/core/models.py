@@ -5,8 +5,13 @@ Database models.
 import uuid
 import os
 
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import Case, Count, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Now, NullIf
 from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchVectorField
 
 
 def products_image_file_path(instance, filename):
@@ -17,24 +22,157 @@ def products_image_file_path(instance, filename):
     return os.path.join('products', filename)
 
 
+class ProductQuerySet(models.QuerySet):
+    """Product queries."""
+
+    def with_reviews(self):
+        """Prefetch reviews so serializing many products takes one query."""
+        return self.prefetch_related('review_set')
+
+    def with_stock(self):
+        """Annotate the summed stock of sharded products, read by Product.stock."""
+        shards = StockShard.objects.filter(product=OuterRef('pk')) \
+            .values('product').annotate(total=Sum('count')).values('total')
+        return self.annotate(shardedStock=Case(
+            When(stockShards__gt=0, then=Coalesce(Subquery(shards), 0)),
+            default=Value(None),
+            output_field=models.IntegerField(),
+        ))
+
+    def add_rating(self, rating):
+        """Count a new review rating in the products' aggregates."""
+        return self._update_rating(rating, 1)
+
+    def remove_rating(self, rating):
+        """Remove a deleted review rating from the products' aggregates."""
+        return self._update_rating(rating, -1)
+
+    def _update_rating(self, rating, delta):
+        # A single UPDATE computed from the current row values, so
+        # concurrent reviews can't overwrite each other's counts.
+        count = Coalesce(F('numReviews'), 0) + delta
+        total = F('ratingSum') + delta * rating
+        average = Cast(total, FloatField()) / count
+        if delta < 0:
+            average = Case(When(numReviews__gt=1, then=average), default=Value(None))
+
+        return self.update(**{
+            'updatedAt': Now(),
+            'numReviews': count,
+            'ratingSum': total,
+            'rating': average,
+            f'numStars{rating}': F(f'numStars{rating}') + delta,
+        })
+
+    def recount_ratings(self):
+        """Recompute the products' aggregates from their reviews, e.g. after bulk writes."""
+        def aggregate(function, **filters):
+            reviews = Review.objects.filter(product=OuterRef('pk'), rating__in=REVIEW_STARS, **filters)
+            value = reviews.values('product').annotate(value=function).values('value')
+            return Coalesce(Subquery(value), 0)
+
+        count = aggregate(Count('id'))
+        total = aggregate(Sum('rating'))
+        return self.update(
+            updatedAt=Now(),
+            numReviews=count,
+            ratingSum=total,
+            rating=Cast(total, FloatField()) / NullIf(count, 0),
+            **{f'numStars{star}': aggregate(Count('id'), rating=star) for star in REVIEW_STARS},
+        )
+
+
 class Product(models.Model):
     """Product object."""
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     name = models.CharField(max_length=200, null=True, blank=True)
     image = models.ImageField(null=True, blank=True, upload_to=products_image_file_path)
+    # Storage names of the resized copies of image, see product.images.
+    imageVariants = models.JSONField(default=dict, blank=True, editable=False)
     brand = models.CharField(max_length=200, null=True, blank=True)
     category = models.CharField(max_length=200, null=True, blank=True)
     description = models.TextField(null=True, blank=True)
     rating = models.DecimalField(max_digits=7, decimal_places=2, null=True, blank=True)
     numReviews = models.IntegerField(null=True, blank=True, default=0)
+    # Running aggregates of the review ratings, see ProductQuerySet.add_rating.
+    ratingSum = models.IntegerField(default=0)
+    numStars1 = models.IntegerField(default=0)
+    numStars2 = models.IntegerField(default=0)
+    numStars3 = models.IntegerField(default=0)
+    numStars4 = models.IntegerField(default=0)
+    numStars5 = models.IntegerField(default=0)
     price = models.DecimalField(max_digits=7, decimal_places=2, null=True, blank=True)
     countInStock = models.IntegerField(null=True, blank=True, default=0)
+    # Number of StockShard rows holding the stock of a hot product, their
+    # sum replaces countInStock. 0 keeps the stock in countInStock.
+    stockShards = models.PositiveSmallIntegerField(default=0)
     active = models.BooleanField(default=False)
     createdAt = models.DateTimeField(auto_now_add=True)
+    # Set by save(), queryset updates must set it to Now() themselves.
+    updatedAt = models.DateTimeField(auto_now=True)
+    # Maintained by a database trigger on Postgres, see migration 0007.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of the public product list.
+            models.Index(
+                F('active'), F('createdAt'), F('id'),
+                name='product_active_created_idx',
+            ),
+            models.Index(
+                F('active'),
+                Coalesce('rating', Value(Decimal('0'))),
+                F('id'),
+                name='product_active_rating_idx',
+            ),
+            # Max(updatedAt) validates the cached product lists.
+            models.Index(fields=['updatedAt'], name='product_updated_idx'),
+            # The few inactive products of the admin list, and its ETag.
+            models.Index(
+                fields=['updatedAt', 'id'], condition=Q(active=False),
+                name='product_inactive_updated_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+    @property
+    def ratingHistogram(self):
+        """Number of reviews per star."""
+        return {str(star): getattr(self, f'numStars{star}') for star in REVIEW_STARS}
+
+    @property
+    def stock(self):
+        """Units in stock, summed over the shards of sharded products."""
+        if not self.stockShards:
+            return self.countInStock
+        if hasattr(self, 'shardedStock'):
+            return self.shardedStock
+        return self.stockshard_set.aggregate(total=Coalesce(Sum('count'), 0))['total']
+
+
+class StockShard(models.Model):
+    """Part of the stock of a sharded product, see product.stock."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    shard = models.PositiveSmallIntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'shard'], name='stockshard_product_shard_unique'),
+            models.CheckConstraint(check=Q(count__gte=0), name='stockshard_count_not_negative'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id}/{self.shard}: {self.count}'
+
+
+REVIEW_STARS = range(1, 6)
+
 
 class Review(models.Model):
     """Reveiw for products."""
@@ -44,11 +182,25 @@ class Review(models.Model):
     rating = models.IntegerField(null=True, blank=True, default=0)
     comment = models.TextField(null=True, blank=True)
     createdAt = models.DateTimeField(auto_now_add=True)
+    updatedAt = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'user'], name='review_product_user_unique'),
+        ]
 
     def __str__(self):
         return str(self.rating)
 
 
+class OrderQuerySet(models.QuerySet):
+    """Order queries."""
+
+    def with_details(self):
+        """Load users, shipping addresses and items along with the orders."""
+        return self.select_related('user', 'shippingaddress').prefetch_related('orderitem_set')
+
+
 class Order(models.Model):
     """Order for user."""
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
@@ -60,6 +212,17 @@ class Order(models.Model):
     isDelivered = models.BooleanField(default=False)
     deliveredAt = models.DateTimeField(auto_now_add=False, null=True, blank=True)
     createdAt = models.DateTimeField(auto_now_add=True)
+    # Set by save(), queryset updates must set it to Now() themselves.
+    updatedAt = models.DateTimeField(auto_now=True)
+
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Order history of a user and the admin list, newest first.
+            models.Index(fields=['user', 'createdAt', 'id'], name='order_user_created_idx'),
+            models.Index(fields=['createdAt', 'id'], name='order_created_idx'),
+        ]
 
     def __str__(self):
         return str(f'id: {self.id}, created: {self.createdAt}')
@@ -0,0 +1,116 @@
+"""
+Password hashing off the request threads, with back-pressure.
+
+A PBKDF2 hash takes about 100 ms of CPU, so a burst of logins and
+signups used to keep every worker busy hashing while catalog requests
+queued. Hashes now run on a low priority thread of each worker, so the
+kernel runs catalog requests first, and at most PASSWORD_HASH_CONCURRENCY
+of them run at once across all workers, each holding a file lock. A
+request waiting longer than PASSWORD_HASH_TIMEOUT for a lock is answered
+503 with Retry-After, leaving its worker free for other requests.
+
+PBKDF2PasswordHasher is first in PASSWORD_HASHERS, so make_password(),
+check_password() and logins use it. Django rehashes passwords on login
+once PASSWORD_HASH_ITERATIONS changes.
+"""
+import base64
+import fcntl
+import hashlib
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from core import metrics
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+class PasswordHashingBusy(APIException):
+    """Every hashing slot stayed taken, the client should retry."""
+
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many logins at once, please try again.'
+    default_code = 'password_hashing_busy'
+    # Sent as Retry-After by DRF's exception handler.
+    wait = 1
+
+
+def _lower_priority():
+    try:
+        # Linux schedules threads on their own, a thread id renices one.
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), settings.PASSWORD_HASH_NICE)
+    except (AttributeError, OSError):
+        pass
+
+
+def get_executor():
+    """Return this process's hashing thread, started again after forks."""
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(1, 'password-hash', initializer=_lower_priority)
+            _executor_pid = os.getpid()
+    return _executor
+
+
+@contextmanager
+def hashing_slot():
+    """Hold one of the PASSWORD_HASH_CONCURRENCY slots shared by all workers."""
+    os.makedirs(settings.PASSWORD_HASH_LOCK_DIR, exist_ok=True)
+    slots = list(range(settings.PASSWORD_HASH_CONCURRENCY))
+    start = time.perf_counter()
+    deadline = start + settings.PASSWORD_HASH_TIMEOUT
+    while True:
+        random.shuffle(slots)
+        for slot in slots:
+            file = open(os.path.join(settings.PASSWORD_HASH_LOCK_DIR, f'{slot}.lock'), 'w')
+            try:
+                fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                file.close()
+                continue
+
+            metrics.observe_password_hash(time.perf_counter() - start)
+            try:
+                yield
+            finally:
+                # Closing the file releases the lock, as does a crash.
+                file.close()
+            return
+
+        if time.perf_counter() >= deadline:
+            metrics.observe_password_hash(time.perf_counter() - start, rejected=True)
+            raise PasswordHashingBusy()
+        time.sleep(0.005)
+
+
+def run(func, *args):
+    """Return func(*args) computed on the hashing thread once a slot is free."""
+    with hashing_slot():
+        return get_executor().submit(func, *args).result()
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """Django's PBKDF2 hasher, computed through run()."""
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS
+
+    def encode(self, password, salt, iterations=None):
+        self._check_encode_args(password, salt)
+        iterations = iterations or self.iterations
+        # pbkdf2_hmac releases the GIL while it hashes.
+        hash = run(hashlib.pbkdf2_hmac, self.digest().name, password.encode(), salt.encode(), iterations)
+        hash = base64.b64encode(hash).decode('ascii').strip()
+        return '%s$%d$%s$%s' % (self.algorithm, iterations, salt, hash)
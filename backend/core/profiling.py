@@ -0,0 +1,105 @@
+"""
+Profile sampled and slow requests.
+
+A profile is a cProfile stats file (`.prof`, for pstats, snakeviz or
+flameprof) and a tracemalloc snapshot (`.tracemalloc`, for
+tracemalloc.Snapshot.load) sharing a name that tells the request, e.g.
+`20240101T120000-123456-GET-api-products-user-812ms`. Only the newest
+PROFILE_KEEP profiles are kept.
+"""
+import cProfile
+import os
+import re
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+EXTENSIONS = ('.prof', '.tracemalloc')
+NAME = re.compile(r'^[\w.-]+$')
+
+# cProfile and tracemalloc are process wide, one request at a time.
+_lock = threading.Lock()
+
+
+class Profile:
+    """Profile the CPU time and allocations of a block."""
+
+    def __init__(self, memory=True):
+        self.memory = memory
+        self.profiler = cProfile.Profile()
+        self.snapshot = None
+        self.duration = 0.0
+
+    def __enter__(self):
+        if self.memory:
+            tracemalloc.start(settings.PROFILE_TRACEMALLOC_FRAMES)
+        self.start = time.perf_counter()
+        self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.disable()
+        self.duration = (time.perf_counter() - self.start) * 1000
+        if self.memory:
+            self.snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+
+    def save(self, directory, label):
+        """Write the profile to `directory`, return its name."""
+        os.makedirs(directory, exist_ok=True)
+        now = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S-%f')
+        slug = re.sub(r'[^\w]+', '-', label).strip('-')[:80]
+        name = f'{now}-{slug}-{self.duration:.0f}ms'
+        self.profiler.dump_stats(os.path.join(directory, f'{name}.prof'))
+        if self.snapshot is not None:
+            self.snapshot.dump(os.path.join(directory, f'{name}.tracemalloc'))
+        rotate(directory, settings.PROFILE_KEEP)
+        return name
+
+
+def acquire():
+    """Reserve the profiler, False while another request holds it."""
+    return _lock.acquire(blocking=False)
+
+
+def release():
+    _lock.release()
+
+
+def list_profiles(directory):
+    """Return the profiles in `directory`, newest first."""
+    profiles = {}
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return []
+    for entry in entries:
+        name, extension = os.path.splitext(entry.name)
+        if extension not in EXTENSIONS:
+            continue
+        profile = profiles.setdefault(name, {'name': name, 'files': {}, 'size': 0})
+        profile['files'][extension[1:]] = entry.name
+        profile['size'] += entry.stat().st_size
+    # Names start with the UTC time of the capture.
+    return sorted(profiles.values(), key=lambda profile: profile['name'], reverse=True)
+
+
+def rotate(directory, keep):
+    """Delete all but the `keep` newest profiles."""
+    for profile in list_profiles(directory)[keep:]:
+        for filename in profile['files'].values():
+            try:
+                os.remove(os.path.join(directory, filename))
+            except FileNotFoundError:
+                pass
+
+
+def get_profile_path(directory, filename):
+    """Return the path of a profile file, None for names that aren't one."""
+    if not NAME.match(filename) or os.path.splitext(filename)[1] not in EXTENSIONS:
+        return None
+    path = os.path.join(directory, filename)
+    return path if os.path.isfile(path) else None
@@ -0,0 +1,126 @@
+"""
+Per-request SQL instrumentation.
+
+Every connection runs its queries through record(), which counts them
+and their time in the stats of the current request. The stats live in a
+context variable so queries run by sync_to_async threads are counted
+for the async request that started them, and streaming response bodies
+set it again around every chunk they produce.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_stats = ContextVar('query_stats', default=None)
+_end = object()
+
+
+class QueryStats:
+    """Queries run and their total time in milliseconds."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+
+def record(execute, sql, params, many, context):
+    stats = _stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.count += 1
+        stats.duration += (time.perf_counter() - start) * 1000
+
+
+def instrument(sender, connection, **kwargs):
+    """Install record() on a new connection, connected to connection_created."""
+    if record not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record)
+
+
+@contextmanager
+def track_queries():
+    """Count the queries of the block in the yielded QueryStats."""
+    stats = QueryStats()
+    token = _stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _stats.reset(token)
+
+
+def track_stream(stats, content, done):
+    """
+    Yield the chunks of a streaming response body, counting the queries
+    run to produce them in `stats`, then call done().
+    """
+    iterator = iter(content)
+    while True:
+        token = _stats.set(stats)
+        try:
+            chunk = next(iterator, _end)
+        finally:
+            _stats.reset(token)
+        if chunk is _end:
+            break
+        yield chunk
+    done()
+
+
+async def atrack_stream(stats, content, done):
+    """track_stream() for async streaming response bodies."""
+    iterator = content.__aiter__()
+    while True:
+        token = _stats.set(stats)
+        try:
+            chunk = await iterator.__anext__()
+        except StopAsyncIteration:
+            break
+        finally:
+            _stats.reset(token)
+        yield chunk
+    done()
+
+
+def query_budget(queries):
+    """
+    Declare the most queries a view, viewset action or view class may run.
+
+    Views running a few queries per item of their input, e.g. per cart
+    line, pass a function of the request returning the budget instead.
+    """
+    def decorator(view):
+        view.query_budget = queries
+        return view
+    return decorator
+
+
+def get_query_budget(view, method, request=None):
+    """
+    Return the query budget of a resolved view for an HTTP method, budgets
+    declared as functions are called with the request.
+    """
+    budget = _get_query_budget(view, method)
+    if callable(budget):
+        budget = budget(request)
+    return budget
+
+
+def _get_query_budget(view, method):
+    budget = getattr(view, 'query_budget', None)
+    if budget is not None:
+        return budget
+
+    cls = getattr(view, 'cls', None)
+    # Viewsets map methods to actions, API views have a handler per method.
+    actions = getattr(view, 'actions', None)
+    handler = actions.get(method.lower()) if actions else method.lower()
+    budget = getattr(getattr(cls, handler, None), 'query_budget', None) if handler else None
+    if budget is None and handler == 'partial_update':
+        # ModelViewSet.partial_update() runs update().
+        budget = getattr(getattr(cls, 'update', None), 'query_budget', None)
+    return budget if budget is not None else getattr(cls, 'query_budget', None)
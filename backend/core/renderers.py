@@ -0,0 +1,94 @@
+"""
+Fast renderers and parsers for the API.
+
+ORJSONRenderer is a drop-in replacement for DRF's JSONRenderer,
+MessagePack is offered when the msgpack package is installed and picked
+by clients sending `Accept: application/msgpack`.
+"""
+import decimal
+
+import orjson
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+
+_encoder = JSONEncoder()
+
+
+def default(obj):
+    """Encode what orjson doesn't, the same way DRF's encoder does."""
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    return _encoder.default(obj)
+
+
+def json_dumps(data, indent=False):
+    """Return data as UTF-8 JSON bytes."""
+    options = ORJSON_OPTIONS | orjson.OPT_INDENT_2 if indent else ORJSON_OPTIONS
+    return orjson.dumps(data, default=default, option=options)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """Render JSON with orjson, any requested indent becomes two spaces."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        return json_dumps(data, indent=bool(indent))
+
+
+class ORJSONParser(BaseParser):
+    """Parse JSON request bodies with orjson."""
+
+    media_type = 'application/json'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+
+
+def _msgpack_default(obj):
+    # DRF fields already return strings for dates and decimals, only
+    # raw values from plain dicts end up here.
+    if hasattr(obj, 'isoformat'):
+        return obj.isoformat()
+    return default(obj)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """Render MessagePack, requires the msgpack package."""
+
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_msgpack_default, use_bin_type=True)
+
+
+class MessagePackParser(BaseParser):
+    """Parse MessagePack request bodies, requires the msgpack package."""
+
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, TypeError, msgpack.ExtraData) as exc:
+            # TypeError for unhashable map keys, e.g. a map used as a key.
+            raise ParseError(f'MessagePack parse error - {exc}')
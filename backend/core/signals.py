@@ -1,9 +1,55 @@
-from django.db.models.signals import pre_save
+from django.db.backends.signals import connection_created
+from django.db.models.functions import Now
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
 from django.contrib.auth.models import User
 
+from core.authentication import user_changed
+from core.db.routers import pin
+from core.models import REVIEW_STARS, Order, Product, Review
+from core.queries import instrument
+from order.cache import invalidate_orders
+
 def updateUser(sender, instance, **kwargs):
     user = instance
     if user.email != '':
         user.username = user.email
 
-pre_save.connect(updateUser, sender=User)
\ No newline at end of file
+def removeReviewRating(sender, instance, **kwargs):
+    """Keep the product rating aggregates in sync with deleted reviews."""
+    review = instance
+    if review.product_id and review.rating in REVIEW_STARS:
+        Product.objects.filter(id=review.product_id).remove_rating(review.rating)
+
+def touchUserOrders(sender, instance, update_fields=None, **kwargs):
+    """Orders embed their user, so user edits change their updatedAt."""
+    if kwargs.get('created') or (update_fields and set(update_fields) == {'last_login'}):
+        return
+    if Order.objects.filter(user=instance).update(updatedAt=Now()):
+        invalidate_orders(instance.id)
+
+def touchProductOrders(sender, instance, **kwargs):
+    """Deleting a product clears it from order items, update their orders."""
+    orders = Order.objects.filter(orderitem__product=instance)
+    user_ids = set(orders.values_list('user_id', flat=True))
+    if user_ids:
+        orders.update(updatedAt=Now())
+        invalidate_orders(*user_ids)
+
+def invalidateOrder(sender, instance, **kwargs):
+    invalidate_orders(instance.user_id)
+
+def pinOrderUser(sender, instance, **kwargs):
+    """Owners read their orders from the primary after any change to them."""
+    pin(instance.user_id)
+
+pre_save.connect(updateUser, sender=User)
+post_save.connect(touchUserOrders, sender=User)
+pre_delete.connect(touchUserOrders, sender=User)
+pre_delete.connect(touchProductOrders, sender=Product)
+post_save.connect(invalidateOrder, sender=Order)
+post_delete.connect(invalidateOrder, sender=Order)
+post_save.connect(pinOrderUser, sender=Order)
+post_delete.connect(removeReviewRating, sender=Review)
+post_save.connect(user_changed, sender=User)
+post_delete.connect(user_changed, sender=User)
+connection_created.connect(instrument)
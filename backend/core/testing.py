@@ -0,0 +1,15 @@
+"""
+Test helpers shared by the apps.
+"""
+
+
+class QueryBudgetMixin:
+    """Assert responses stay within the query budget of their view."""
+
+    def assertWithinQueryBudget(self, response):
+        budget = getattr(response, 'query_budget', None)
+        self.assertIsNotNone(budget, 'The view declares no query budget.')
+        self.assertLessEqual(
+            response.db_queries, budget,
+            f'The view ran {response.db_queries} queries, over its budget of {budget}.',
+        )
@@ -0,0 +1,131 @@
+"""
+Tests for the claims based JWT authentication.
+"""
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.authentication import get_token
+
+PROFILE_URL = '/api/users/details/profile/'
+ADMIN_USERS_URL = '/api/users/admin/'
+
+
+def auth(token):
+    return {'HTTP_AUTHORIZATION': f'Bearer {token.access_token}'}
+
+
+class ClaimsAuthenticationTests(TestCase):
+    """Test authenticating requests from the token claims."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='test@mail.com', email='test@mail.com', password='password123', first_name='Test',
+        )
+        self.admin = User.objects.create_user(
+            username='admin@mail.com', email='admin@mail.com', password='password123', is_staff=True,
+        )
+
+    def test_token_claims(self):
+        """Test tokens carry the user's profile and role."""
+        access = get_token(self.admin).access_token
+
+        self.assertEqual(access['email'], 'admin@mail.com')
+        self.assertEqual(access['username'], 'admin@mail.com')
+        self.assertTrue(access['is_staff'])
+        self.assertIn('ver', access)
+
+    def test_reads_without_user_query(self):
+        """Test reads use the claims once the token version is cached."""
+        headers = auth(get_token(self.user))
+        self.client.get(PROFILE_URL, **headers)
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(PROFILE_URL, **headers)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['name'], 'Test')
+        self.assertEqual(res.data['id'], self.user.id)
+        self.assertEqual(len(queries), 0)
+
+    def test_admin_claim(self):
+        """Test the staff flag of the claims authorizes admin views."""
+        res_admin = self.client.get(ADMIN_USERS_URL, **auth(get_token(self.admin)))
+        res_user = self.client.get(ADMIN_USERS_URL, **auth(get_token(self.user)))
+
+        self.assertEqual(res_admin.status_code, status.HTTP_200_OK)
+        self.assertEqual(res_user.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_deferred_fields_loaded(self):
+        """Test fields outside the claims are loaded on first access."""
+        res = self.client.get(PROFILE_URL, **auth(get_token(self.user)))
+        user = res.wsgi_request.user
+
+        self.assertEqual(user.get_deferred_fields(), {'password', 'last_login', 'is_superuser', 'last_name', 'date_joined'})
+        with self.assertNumQueries(1):
+            self.assertEqual(user.date_joined, self.user.date_joined)
+
+    def test_revoked_on_change(self):
+        """Test changing a user's role, profile or password revokes their tokens."""
+        admin_token, user_token = get_token(self.admin), get_token(self.user)
+        self.client.get(ADMIN_USERS_URL, **auth(admin_token))
+        self.client.get(PROFILE_URL, **auth(user_token))
+
+        self.admin.is_staff = False
+        self.admin.save()
+        self.user.set_password('password456')
+        self.user.save()
+
+        res_admin = self.client.get(ADMIN_USERS_URL, **auth(admin_token))
+        res_user = self.client.get(PROFILE_URL, **auth(user_token))
+        res_write = self.client.put(PROFILE_URL, {'name': 'New', 'email': 'test@mail.com', 'password': ''},
+                                    format='json', **auth(user_token))
+        res_new = self.client.get(PROFILE_URL, **auth(get_token(self.user)))
+
+        self.assertEqual(res_admin.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(res_user.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(res_user.data['detail'], 'Given token not valid for any token type')
+        self.assertEqual(res_write.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(res_new.status_code, status.HTTP_200_OK)
+
+    def test_revoked_on_deactivate_and_delete(self):
+        """Test inactive and deleted users can't authenticate."""
+        user_token, admin_token = get_token(self.user), get_token(self.admin)
+        self.client.get(PROFILE_URL, **auth(user_token))
+
+        User.objects.filter(id=self.user.id).update(is_active=False)
+        # Updates skip the signals, the cached version expires instead.
+        cache.clear()
+        self.admin.delete()
+
+        self.assertEqual(self.client.get(PROFILE_URL, **auth(user_token)).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.client.get(PROFILE_URL, **auth(admin_token)).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_token_without_claims(self):
+        """Test tokens minted before the claims load the user."""
+        headers = auth(RefreshToken.for_user(self.user))
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(PROFILE_URL, **headers)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 1)
+
+    def test_login_token_has_claims(self):
+        """Test the login response tokens carry the claims."""
+        res = self.client.post('/api/users/login/', {'username': 'test@mail.com', 'password': 'password123'})
+        self.client.get(PROFILE_URL, HTTP_AUTHORIZATION=f'Bearer {res.data["access"]}')
+
+        with self.assertNumQueries(0):
+            res_token = self.client.get(PROFILE_URL, HTTP_AUTHORIZATION=f'Bearer {res.data["token"]}')
+            res_access = self.client.get(PROFILE_URL, HTTP_AUTHORIZATION=f'Bearer {res.data["access"]}')
+
+        self.assertEqual(res_token.status_code, status.HTTP_200_OK)
+        self.assertEqual(res_access.status_code, status.HTTP_200_OK)
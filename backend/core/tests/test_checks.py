@@ -0,0 +1,29 @@
+"""
+Tests for the deployment checks.
+"""
+from django.test import SimpleTestCase, override_settings
+
+from core.checks import check_shared_cache
+
+REDIS = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache:6379/0'}}
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+    """Test workers are refused a per process cache."""
+
+    @override_settings(WEB_WORKERS=4)
+    def test_local_cache_several_workers(self):
+        """Test several workers with local memory caches fail the check."""
+        errors = check_shared_cache(None)
+
+        self.assertEqual([error.id for error in errors], ['core.E001'])
+
+    @override_settings(WEB_WORKERS=1)
+    def test_local_cache_one_worker(self):
+        """Test a single worker may keep its cache in memory."""
+        self.assertEqual(check_shared_cache(None), [])
+
+    @override_settings(WEB_WORKERS=4, CACHES=REDIS)
+    def test_shared_cache_several_workers(self):
+        """Test several workers sharing a cache pass the check."""
+        self.assertEqual(check_shared_cache(None), [])
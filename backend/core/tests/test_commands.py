@@ -1,13 +1,22 @@
 """
 Test custom Django management commands.
 """
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
 from unittest.mock import patch
 
 from psycopg2 import OperationalError as Psycopg2Error
 
-from django.core.management import call_command
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from core.models import Product, Review, StockShard
 
 
 @patch('core.management.commands.wait_for_db.Command.check')
@@ -30,4 +39,303 @@ class CommandTests(SimpleTestCase):
         call_command('wait_for_db')
 
         self.assertEqual(patched_core.call_count, 6)
-        patched_core.assert_called_with(databases=['default'])
\ No newline at end of file
+        patched_core.assert_called_with(databases=['default'])
+
+
+@patch('core.management.commands.create_image_variants.process_product_image')
+class CreateImageVariantsTests(TestCase):
+    """Test backfilling product image variants."""
+
+    def setUp(self):
+        self.missing = Product.objects.create(name='Missing', image='products/a.jpg')
+        self.done = Product.objects.create(
+            name='Done', image='products/b.jpg', imageVariants={'webp': {'320': 'products/b/320w.webp'}},
+        )
+        Product.objects.create(name='No image')
+
+    def test_creates_missing_variants(self, patched_process):
+        """Test only products without variants are processed."""
+        call_command('create_image_variants', stdout=StringIO())
+
+        patched_process.assert_called_once_with(self.missing.id)
+
+    def test_recreates_all_variants(self, patched_process):
+        """Test --all processes every product with an image."""
+        call_command('create_image_variants', '--all', stdout=StringIO())
+
+        self.assertEqual(
+            [call.args[0] for call in patched_process.call_args_list],
+            [self.missing.id, self.done.id],
+        )
+
+    def test_failure_reported(self, patched_process):
+        """Test a broken image doesn't stop the backfill."""
+        patched_process.side_effect = OSError('cannot identify image file')
+        out, err = StringIO(), StringIO()
+        call_command('create_image_variants', '--all', stdout=out, stderr=err)
+
+        self.assertEqual(patched_process.call_count, 2)
+        self.assertIn('2 failed', out.getvalue())
+        self.assertIn('cannot identify image file', err.getvalue())
+
+
+class CompareBenchmarksTests(SimpleTestCase):
+    """Test flagging regressions against a benchmark baseline."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.baseline = self.write('baseline.json', {
+            'products list': {'status': 200, 'p50': 10.0, 'p95': 20.0, 'queries': 5},
+            'product detail': {'status': 200, 'p50': 0.5, 'p95': 1.0, 'queries': 0},
+        })
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name, endpoints):
+        path = Path(self.directory.name) / name
+        path.write_text(json.dumps({'endpoints': endpoints}))
+        return str(path)
+
+    def compare(self, endpoints):
+        results = self.write('results.json', endpoints)
+        out = StringIO()
+        call_command('compare_benchmarks', self.baseline, results, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_no_regressions(self):
+        """Test noise within the threshold and on fast endpoints passes."""
+        out = self.compare({
+            'products list': {'status': 200, 'p50': 11.0, 'p95': 24.0, 'queries': 5},
+            'product detail': {'status': 200, 'p50': 0.9, 'p95': 1.9, 'queries': 0},
+        })
+
+        self.assertIn('No regressions.', out)
+
+    def test_latency_regression(self):
+        """Test latency growing past the threshold fails."""
+        with self.assertRaisesMessage(CommandError, '1 endpoints regressed: products list'):
+            self.compare({
+                'products list': {'status': 200, 'p50': 10.0, 'p95': 30.0, 'queries': 5},
+                'product detail': {'status': 200, 'p50': 0.5, 'p95': 1.0, 'queries': 0},
+            })
+
+    def test_query_regression(self):
+        """Test any extra query fails."""
+        with self.assertRaisesMessage(CommandError, 'product detail'):
+            self.compare({
+                'products list': {'status': 200, 'p50': 10.0, 'p95': 20.0, 'queries': 5},
+                'product detail': {'status': 200, 'p50': 0.5, 'p95': 1.0, 'queries': 1},
+            })
+
+
+class CatalogCommandsTests(TestCase):
+    """Test importing and exporting the catalog."""
+
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.TemporaryDirectory()
+        self.user = User.objects.create_user(username='admin@mail.com', password='password123')
+        self.reviewer = User.objects.create_user(username='test@mail.com', password='password123')
+        self.product = Product.objects.create(
+            user=self.user, name='Phone', category='Phones', price='5.50', countInStock=10, active=True,
+        )
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name, text):
+        path = Path(self.directory.name) / name
+        path.write_text(text)
+        return str(path)
+
+    def load(self, kind, name, text, *args):
+        out, err = StringIO(), StringIO()
+        call_command('import_catalog', kind, self.write(name, text), *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_import_products_jsonl(self):
+        """Test existing products are updated and new ones created, in batches."""
+        out, _ = self.load('products', 'products.jsonl', '\n'.join([
+            json.dumps({'id': self.product.id, 'name': 'Phone X', 'price': '7.25', 'countInStock': 3}),
+            json.dumps({'name': 'Case', 'price': '1.00', 'active': True}),
+            '',
+            json.dumps({'id': 500, 'name': 'Cable', 'category': 'Cables'}),
+        ]), '--batch-size', '2', '--user', 'admin@mail.com')
+
+        self.assertIn('Imported 3 products.', out)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.name, 'Phone X')
+        self.assertEqual(str(self.product.price), '7.25')
+        self.assertEqual(self.product.countInStock, 3)
+        self.assertEqual(self.product.category, 'Phones')
+        self.assertEqual(self.product.user, self.user)
+        case = Product.objects.get(name='Case')
+        self.assertEqual(case.user, self.user)
+        self.assertTrue(case.active)
+        self.assertTrue(Product.objects.filter(id=500, name='Cable').exists())
+        # The sequence moved past the imported ids.
+        self.assertGreater(Product.objects.create(name='Next').id, 500)
+
+    def test_import_new_products_after_ids(self):
+        """Test products without id don't take the ids imported in their batch."""
+        first = self.product.id + 1
+        out, _ = self.load('products', 'products.jsonl', '\n'.join([
+            json.dumps({'id': first, 'name': 'Cable'}),
+            json.dumps({'id': first + 1, 'name': 'Charger'}),
+            json.dumps({'name': 'Case'}),
+        ]))
+
+        self.assertIn('Imported 3 products.', out)
+        self.assertEqual(Product.objects.get(id=first).name, 'Cable')
+        self.assertEqual(Product.objects.get(id=first + 1).name, 'Charger')
+        self.assertGreater(Product.objects.get(name='Case').id, first + 1)
+
+    def test_import_products_csv(self):
+        """Test CSV rows are imported, empty cells as null."""
+        out, _ = self.load('products', 'products.csv', (
+            'id,name,brand,price,countInStock,active\n'
+            f'{self.product.id},Phone X,,7.25,3,False\n'
+            ',Case,Acme,1.00,4,True\n'
+        ))
+
+        self.assertIn('Imported 2 products.', out)
+        self.product.refresh_from_db()
+        self.assertFalse(self.product.active)
+        self.assertIsNone(self.product.brand)
+        self.assertEqual(Product.objects.get(name='Case').countInStock, 4)
+
+    def test_invalid_rows_reported(self):
+        """Test invalid rows are skipped and reported with their line."""
+        text = '\n'.join([
+            json.dumps({'name': 'Good'}),
+            json.dumps({'name': 'Bad price', 'price': 'free'}),
+            '{not json',
+            json.dumps({'name': 'Unknown', 'color': 'red'}),
+        ])
+        err = StringIO()
+        with self.assertRaisesMessage(CommandError, 'Skipped 3 invalid rows.'):
+            call_command(
+                'import_catalog', 'products', self.write('products.jsonl', text), stdout=StringIO(), stderr=err,
+            )
+
+        self.assertTrue(Product.objects.filter(name='Good').exists())
+        self.assertIn('Line 2: price:', err.getvalue())
+        self.assertIn('Line 3:', err.getvalue())
+        self.assertIn('Line 4: Unknown fields: color.', err.getvalue())
+
+    def test_import_reviews(self):
+        """Test reviews are upserted by product and user and the ratings recounted."""
+        Review.objects.create(product=self.product, user=self.reviewer, rating=1)
+        text = '\n'.join([
+            json.dumps({'product': self.product.id, 'user': 'test@mail.com', 'rating': 4, 'comment': 'Good'}),
+            json.dumps({'product': self.product.id, 'user': 'admin@mail.com', 'rating': 5}),
+            json.dumps({'product': self.product.id, 'user': 'missing@mail.com', 'rating': 5}),
+            json.dumps({'product': 999, 'user': 'admin@mail.com', 'rating': 5}),
+            json.dumps({'product': self.product.id, 'user': 'admin@mail.com', 'rating': 9}),
+        ])
+        err = StringIO()
+        with self.assertRaisesMessage(CommandError, 'Skipped 3 invalid rows.'):
+            call_command('import_catalog', 'reviews', self.write('reviews.jsonl', text), stdout=StringIO(), stderr=err)
+
+        self.assertIn('Line 3: User missing@mail.com doesn\'t exist.', err.getvalue())
+        self.assertIn('Line 4: Product 999 doesn\'t exist.', err.getvalue())
+        self.assertIn('Line 5: rating:', err.getvalue())
+
+        self.assertEqual(Review.objects.get(user=self.reviewer).rating, 4)
+        self.assertEqual(Review.objects.filter(product=self.product).count(), 2)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.numReviews, 2)
+        self.assertEqual(self.product.ratingSum, 9)
+        self.assertEqual(float(self.product.rating), 4.5)
+        self.assertEqual(self.product.ratingHistogram, {'1': 0, '2': 0, '3': 0, '4': 1, '5': 1})
+
+    def test_import_invalidates_caches(self):
+        """Test cached products and top rated boards see imported changes."""
+        client = APIClient()
+        Review.objects.create(product=self.product, user=self.reviewer, rating=5)
+        Product.objects.filter(id=self.product.id).recount_ratings()
+        self.assertEqual(client.get(f'/api/products/user/{self.product.id}/').data['name'], 'Phone')
+        self.assertEqual([p['id'] for p in client.get('/api/products/user/top/').data], [self.product.id])
+
+        self.load('products', 'products.jsonl', json.dumps({'id': self.product.id, 'name': 'Phone X'}))
+        self.assertEqual(client.get(f'/api/products/user/{self.product.id}/').data['name'], 'Phone X')
+
+        self.load('reviews', 'reviews.jsonl', json.dumps(
+            {'product': self.product.id, 'user': 'test@mail.com', 'rating': 1},
+        ))
+        self.assertEqual(client.get('/api/products/user/top/').data, [])
+
+    def test_export_round_trip(self):
+        """Test exported files import back unchanged, in both formats."""
+        Review.objects.create(product=self.product, user=self.reviewer, name='Tester', rating=3, comment='Fine')
+        for format in ('jsonl', 'csv'):
+            products = str(Path(self.directory.name) / f'products.{format}')
+            reviews = str(Path(self.directory.name) / f'reviews.{format}')
+            out = StringIO()
+            call_command('export_catalog', 'products', products, stdout=out)
+            call_command('export_catalog', 'reviews', reviews, stdout=out)
+            self.assertIn('Exported 1 products.', out.getvalue())
+            self.assertIn('Exported 1 reviews.', out.getvalue())
+
+            before = list(Product.objects.values('name', 'price', 'category', 'active'))
+            call_command('import_catalog', 'products', products, stdout=StringIO())
+            call_command('import_catalog', 'reviews', reviews, stdout=StringIO())
+
+            self.assertEqual(list(Product.objects.values('name', 'price', 'category', 'active')), before)
+            self.assertEqual(
+                list(Review.objects.values_list('product', 'user', 'name', 'rating', 'comment')),
+                [(self.product.id, self.reviewer.id, 'Tester', 3, 'Fine')],
+            )
+
+    def test_export_stdout(self):
+        """Test exporting to stdout writes one JSON object per line."""
+        out = StringIO()
+        call_command('export_catalog', 'products', stdout=out)
+
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(rows, [{
+            'id': self.product.id, 'name': 'Phone', 'image': '', 'brand': None, 'category': 'Phones',
+            'description': None, 'price': '5.50', 'countInStock': 10, 'active': True,
+        }])
+
+
+class ShardStockCommandTests(TestCase):
+    """Test sharding the stock of products."""
+
+    def setUp(self):
+        self.product = Product.objects.create(name='Phone', price='5.50', countInStock=10, active=True)
+
+    def test_shard_stock(self):
+        """Test the stock is spread over the shards, export and import read them."""
+        out = StringIO()
+        call_command('shard_stock', str(self.product.id), '--shards', '3', stdout=out)
+        exported = StringIO()
+        call_command('export_catalog', 'products', stdout=exported)
+
+        self.assertIn(f'Product {self.product.id}: 10 in stock over 3 shards.', out.getvalue())
+        self.assertEqual(json.loads(exported.getvalue())['countInStock'], 10)
+
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl') as file:
+            file.write(json.dumps({'id': self.product.id, 'countInStock': 5}))
+            file.flush()
+            call_command('import_catalog', 'products', file.name, stdout=StringIO())
+        counts = StockShard.objects.filter(product=self.product).order_by('shard').values_list('count', flat=True)
+        self.product.refresh_from_db()
+
+        self.assertEqual(list(counts), [2, 2, 1])
+        self.assertEqual(self.product.countInStock, 0)
+
+    def test_unshard_stock(self):
+        """Test zero shards moves the stock back to the product."""
+        call_command('shard_stock', str(self.product.id), stdout=StringIO())
+        call_command('shard_stock', str(self.product.id), '--shards', '0', stdout=StringIO())
+        self.product.refresh_from_db()
+
+        self.assertEqual(self.product.countInStock, 10)
+        self.assertFalse(StockShard.objects.exists())
+
+    def test_unknown_product(self):
+        """Test sharding a product that doesn't exist fails."""
+        with self.assertRaisesMessage(CommandError, 'Product 500 doesn\'t exist.'):
+            call_command('shard_stock', '500', stdout=StringIO())
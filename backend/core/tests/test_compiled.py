@@ -0,0 +1,87 @@
+"""
+Tests for the compiled read-only serializers.
+"""
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from core.models import Order, OrderItem, Product, Review, ShippingAddress
+from core.renderers import ORJSONRenderer
+from order.serializers import OrderSerializer, serialize_order
+from product.serializers import ProductSerializer, serialize_product
+
+
+class CompiledSerializerTests(TestCase):
+    """Test compiled serializers render exactly like the DRF ones."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='test@mail.com', email='test@mail.com', first_name='Ünïcode', password='password123',
+        )
+        self.admin = User.objects.create_superuser(username='admin@mail.com', email='admin@mail.com')
+
+    def assertSameOutput(self, expected, actual):
+        renderer = ORJSONRenderer()
+        self.assertEqual(renderer.render(actual), renderer.render(expected))
+
+    def test_products_identical(self):
+        """Test products with and without reviews, image and nulls."""
+        full = Product.objects.create(
+            user=self.user, name='Phone', image='products/phone.jpg', brand='Sony',
+            category='Phones', description='Smart “phone”', price=Decimal('199.9'),
+            countInStock=3, active=True,
+            imageVariants={'thumbnail': {'webp': 'products/phone/thumbnail.webp'}, 'webp': {'320': 'products/phone/320w.webp'}},
+        )
+        Product.objects.filter(id=full.id).add_rating(4)
+        Review.objects.create(product=full, user=self.user, name='Test', rating=4, comment='Good')
+        Review.objects.create(product=full, user=self.admin, rating=5)
+        Product.objects.create(user=None, name=None, price=None, rating=None)
+
+        products = Product.objects.with_reviews().order_by('id')
+
+        self.assertSameOutput(
+            ProductSerializer(products, many=True).data,
+            serialize_product.many(products),
+        )
+
+    def test_orders_identical(self):
+        """Test orders with items, with a missing address and no user."""
+        product = Product.objects.create(user=self.user, name='Phone', price=Decimal('5.50'))
+        paid = Order.objects.create(
+            user=self.user, paymentMethod='PayPal', shippingPrice=Decimal('10'),
+            totalPrice=Decimal('21.00'), isPaid=True,
+        )
+        ShippingAddress.objects.create(order=paid, address='Ocean Street', city='Key West, FL', zipCode='00001')
+        OrderItem.objects.create(product=product, order=paid, name='Phone', qty=2, price=Decimal('5.50'), image='/img.jpg')
+        OrderItem.objects.create(product=None, order=paid, name='Gone', qty=1, price=None)
+        Order.objects.create(user=self.admin, totalPrice=Decimal('0'))
+        Order.objects.create(user=None)
+
+        orders = Order.objects.with_details().order_by('id')
+
+        self.assertSameOutput(
+            OrderSerializer(orders, many=True).data,
+            serialize_order.many(orders),
+        )
+
+    def test_active_timezone_identical(self):
+        """Test datetimes are converted to the active timezone like DRF does."""
+        Product.objects.create(user=self.user, name='Phone')
+        products = Product.objects.with_reviews()
+
+        with timezone.override('America/New_York'):
+            self.assertSameOutput(
+                ProductSerializer(products, many=True).data,
+                serialize_product.many(products),
+            )
+
+    def test_product_no_extra_queries(self):
+        """Test the compiled product serializer uses the prefetched reviews."""
+        product = Product.objects.create(user=self.user, name='Phone')
+        Review.objects.create(product=product, user=self.user, rating=4)
+        products = list(Product.objects.with_reviews())
+
+        with self.assertNumQueries(0):
+            serialize_product.many(products)
@@ -0,0 +1,165 @@
+"""
+Tests for the Prometheus metrics.
+"""
+import subprocess
+import sys
+import tempfile
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from prometheus_client import CollectorRegistry, REGISTRY, multiprocess
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Product
+
+METRICS_URL = '/api/metrics/'
+PRODUCTS_URL = '/api/products/user/'
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class MetricsTests(TestCase):
+    """Test the metrics recorded for requests."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='test@mail.com', password='password123')
+        self.product = Product.objects.create(
+            user=self.user, name='Phone', price=Decimal('5.50'), countInStock=10, active=True,
+        )
+
+    def test_request_recorded(self):
+        """Test requests are counted and timed by view, not by path."""
+        view = {'view': 'product:user-products-detail'}
+        requests = sample('http_requests_total', method='GET', status='200', **view)
+        durations = sample('http_request_duration_seconds_count', method='GET', **view)
+        db = sample('http_request_db_seconds_count', **view)
+
+        self.client.get(f'{PRODUCTS_URL}{self.product.id}/')
+
+        self.assertEqual(sample('http_requests_total', method='GET', status='200', **view), requests + 1)
+        self.assertEqual(sample('http_request_duration_seconds_count', method='GET', **view), durations + 1)
+        self.assertEqual(sample('http_request_db_seconds_count', **view), db + 1)
+        self.assertEqual(sample('http_requests_in_flight'), 0)
+
+    def test_unmatched_request(self):
+        """Test requests to unknown paths share one label."""
+        requests = sample('http_requests_total', view='unmatched', method='GET', status='404')
+
+        self.client.get('/api/missing/')
+
+        self.assertEqual(sample('http_requests_total', view='unmatched', method='GET', status='404'), requests + 1)
+
+    def test_request_body_size(self):
+        """Test the size of request bodies is recorded."""
+        view = {'view': 'user:user-token'}
+        count = sample('http_request_body_bytes_count', **view)
+        total = sample('http_request_body_bytes_sum', **view)
+
+        body = b'{"username": "test@mail.com", "password": "password123"}'
+        self.client.post('/api/users/login/', body, content_type='application/json')
+
+        self.assertEqual(sample('http_request_body_bytes_count', **view), count + 1)
+        self.assertEqual(sample('http_request_body_bytes_sum', **view), total + len(body))
+
+    def test_malformed_body_size(self):
+        """Test requests with a malformed Content-Length are recorded without a size."""
+        view = {'view': 'product:user-products-detail'}
+        count = sample('http_request_body_bytes_count', **view)
+
+        res = self.client.get(f'{PRODUCTS_URL}{self.product.id}/', CONTENT_LENGTH='abc')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(sample('http_request_body_bytes_count', **view), count)
+
+    def test_streaming_recorded(self):
+        """Test streamed responses are recorded once sent, with the queries of their body."""
+        token = self.get_admin_token()
+        view = {'view': 'order:orders-stream'}
+        queries = sample('http_request_db_queries_total', **view)
+
+        res = self.client.get('/api/orders/stream/', HTTP_AUTHORIZATION=token)
+        self.assertEqual(sample('http_request_db_queries_total', **view), queries)
+        b''.join(res.streaming_content)
+
+        self.assertGreater(sample('http_request_db_queries_total', **view), queries)
+
+    def test_cache_and_serializer_recorded(self):
+        """Test cache lookups and serializer time are recorded."""
+        hits = sample('cache_requests_total', cache='products', result='hit')
+        misses = sample('cache_requests_total', cache='products', result='miss')
+        serialized = sample('serializer_duration_seconds_count', serializer='ProductSerializer')
+
+        self.client.get(f'{PRODUCTS_URL}{self.product.id}/')
+        self.client.get(f'{PRODUCTS_URL}{self.product.id}/')
+
+        self.assertEqual(sample('cache_requests_total', cache='products', result='miss'), misses + 1)
+        self.assertEqual(sample('cache_requests_total', cache='products', result='hit'), hits + 1)
+        self.assertEqual(sample('serializer_duration_seconds_count', serializer='ProductSerializer'), serialized + 1)
+
+    def get_admin_token(self):
+        User.objects.create_superuser(username='admin@mail.com', password='password123')
+        res = self.client.post('/api/users/login/', {'username': 'admin@mail.com', 'password': 'password123'})
+        return f'Bearer {res.data["token"]}'
+
+    def test_metrics_endpoint(self):
+        """Test the metrics are served to admins in the Prometheus text format."""
+        token = self.get_admin_token()
+        self.client.get(f'{PRODUCTS_URL}{self.product.id}/')
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION=token)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res['Content-Type'].startswith('text/plain'))
+        self.assertIn(b'http_requests_total{method="GET",status="200",view="product:user-products-detail"}', res.content)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_metrics_private_without_token(self):
+        """Test the metrics aren't public when no token is set."""
+        res = self.client.get(METRICS_URL)
+        res_invalid = self.client.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer invalid')
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(res_invalid.status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_token(self):
+        """Test the metrics need the token when it is set."""
+        res = self.client.get(METRICS_URL)
+        res_wrong = self.client.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer wrong')
+        res_token = self.client.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer secret')
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(res_wrong.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(res_token.status_code, status.HTTP_200_OK)
+
+
+class MultiprocessMetricsTests(SimpleTestCase):
+    """Test the metrics of worker processes add up."""
+
+    def test_workers_aggregated(self):
+        """Test requests of several processes are summed, in flight ones dropped at exit."""
+        worker = (
+            'from core import metrics\n'
+            'metrics.IN_FLIGHT.inc()\n'
+            "metrics.observe_request('product:user-products-list', 'GET', 200, 0.01, 0.002, 3)\n"
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            for _ in range(2):
+                subprocess.run(
+                    [sys.executable, '-c', worker], cwd=settings.BASE_DIR, check=True,
+                    env={'PROMETHEUS_MULTIPROC_DIR': directory, 'PATH': ''},
+                )
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry, path=directory)
+
+            labels = {'view': 'product:user-products-list', 'method': 'GET', 'status': '200'}
+            self.assertEqual(registry.get_sample_value('http_requests_total', labels), 2)
+            self.assertEqual(registry.get_sample_value('http_request_db_queries_total', {'view': labels['view']}), 6)
+            self.assertIn(registry.get_sample_value('http_requests_in_flight'), (None, 0))
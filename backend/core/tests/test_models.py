@@ -4,6 +4,7 @@ Tests for models.
 from unittest.mock import patch
 from decimal import Decimal
 
+from django.db import IntegrityError
 from django.test import TestCase
 from django.contrib.auth.models import User
 
@@ -125,6 +126,50 @@ class ModelTests(TestCase):
         self.assertTrue(product.review_set.filter(user=user).exists())
 
 
+    def test_create_second_review_unsuccess(self):
+        """Test a user can review a product only once."""
+        user = create_user()
+        product = create_product(user)
+        models.Review.objects.create(user=user, product=product, rating=5)
+
+        with self.assertRaises(IntegrityError):
+            models.Review.objects.create(user=user, product=product, rating=4)
+
+    def test_product_add_rating(self):
+        """Test review ratings update the product aggregates."""
+        user = create_user()
+        product = create_product(user)
+        products = models.Product.objects.filter(id=product.id)
+        products.add_rating(5)
+        products.add_rating(4)
+        products.add_rating(4)
+        product.refresh_from_db()
+
+        self.assertEqual(product.numReviews, 3)
+        self.assertEqual(product.ratingSum, 13)
+        self.assertEqual(product.rating, Decimal('4.33'))
+        self.assertEqual(product.ratingHistogram, {'1': 0, '2': 0, '3': 0, '4': 2, '5': 1})
+
+    def test_product_remove_rating(self):
+        """Test deleting reviews updates the product aggregates."""
+        user = create_user()
+        product = create_product(user)
+        review = models.Review.objects.create(user=user, product=product, rating=2)
+        models.Product.objects.filter(id=product.id).add_rating(2)
+        models.Product.objects.filter(id=product.id).add_rating(5)
+        review.delete()
+        product.refresh_from_db()
+
+        self.assertEqual(product.numReviews, 1)
+        self.assertEqual(product.rating, Decimal('5'))
+        self.assertEqual(product.ratingHistogram['2'], 0)
+
+        models.Product.objects.filter(id=product.id).remove_rating(5)
+        product.refresh_from_db()
+
+        self.assertEqual(product.numReviews, 0)
+        self.assertIsNone(product.rating)
+
     def test_create_order(self):
         """Test creating an order is successful."""
         user = create_user()
@@ -0,0 +1,89 @@
+"""
+Tests for hashing passwords off the request threads.
+"""
+import tempfile
+
+from django.contrib.auth import hashers
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from prometheus_client import REGISTRY
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import passwords
+
+LOGIN_URL = '/api/users/login/'
+REGISTER_URL = '/api/users/register/'
+
+
+def sample(name):
+    return REGISTRY.get_sample_value(name) or 0
+
+
+class PasswordHashingTests(TestCase):
+    """Test the password hasher and its back-pressure."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        settings = override_settings(PASSWORD_HASH_LOCK_DIR=self.directory.name, PASSWORD_HASH_CONCURRENCY=1)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(self.directory.cleanup)
+        self.client = APIClient()
+
+    def test_hashes_compatible(self):
+        """Test hashes match Django's PBKDF2 hasher, both ways."""
+        encoded = hashers.make_password('password123', salt='saltsaltsalt')
+
+        self.assertTrue(encoded.startswith(f'pbkdf2_sha256${passwords.PBKDF2PasswordHasher().iterations}$'))
+        self.assertEqual(
+            encoded,
+            hashers.PBKDF2PasswordHasher().encode('password123', 'saltsaltsalt', iterations=int(encoded.split('$')[1])),
+        )
+        self.assertTrue(hashers.check_password('password123', encoded))
+        self.assertFalse(hashers.check_password('password456', encoded))
+
+    def test_queue_time_recorded(self):
+        """Test the wait for a hashing slot is recorded."""
+        count = sample('password_hash_wait_seconds_count')
+
+        hashers.make_password('password123')
+
+        self.assertEqual(sample('password_hash_wait_seconds_count'), count + 1)
+
+    def test_rehash_on_login(self):
+        """Test passwords are rehashed on login once the iterations change."""
+        with override_settings(PASSWORD_HASH_ITERATIONS=1000):
+            user = User.objects.create_user(username='test@mail.com', email='test@mail.com', password='password123')
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+
+        # Within the budget of the login view.
+        with override_settings(PASSWORD_HASH_ITERATIONS=2000), self.assertNumQueries(3):
+            res = self.client.post(LOGIN_URL, {'username': 'test@mail.com', 'password': 'password123'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$2000$'))
+        self.assertTrue(user.check_password('password123'))
+
+    @override_settings(PASSWORD_HASH_TIMEOUT=0.05)
+    def test_busy_login(self):
+        """Test logins are answered 503 while every slot stays taken."""
+        User.objects.create_user(username='test@mail.com', email='test@mail.com', password='password123')
+        rejected = sample('password_hash_rejected_total')
+
+        with passwords.hashing_slot():
+            res = self.client.post(LOGIN_URL, {'username': 'test@mail.com', 'password': 'password123'})
+            res_register = self.client.post(
+                REGISTER_URL, {'name': 'New', 'email': 'new@mail.com', 'password': 'password123'},
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(res['Retry-After'], '1')
+        self.assertIn('detail', res.data)
+        self.assertEqual(res_register.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertFalse(User.objects.filter(username='new@mail.com').exists())
+        self.assertEqual(sample('password_hash_rejected_total'), rejected + 2)
+
+        res = self.client.post(LOGIN_URL, {'username': 'test@mail.com', 'password': 'password123'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
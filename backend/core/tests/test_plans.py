@@ -0,0 +1,157 @@
+"""
+Tests for the query plans of the hot views.
+
+The tables are filled to production like sizes and vacuumed, then the
+queries of each view are run through EXPLAIN. A sequential scan of a
+large table means a query lost its index.
+"""
+import json
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from core.models import Order, Product
+
+PRODUCTS = 50000
+USERS = 2000
+ORDERS = 50000
+REVIEWS = 50000
+# Smaller tables may be scanned, reading them whole is cheap.
+LARGE_TABLE_ROWS = 5000
+
+SEED = [
+    f'''
+    INSERT INTO auth_user (password, is_superuser, username, first_name, last_name, email,
+                           is_staff, is_active, date_joined)
+    SELECT '', false, 'user' || i || '@mail.com', 'User', '', 'user' || i || '@mail.com',
+           i = 1, true, now()
+    FROM generate_series(1, {USERS}) i
+    ''',
+    f'''
+    INSERT INTO core_product (user_id, name, image, "imageVariants", brand, category, description,
+                              rating, "numReviews", "ratingSum", "numStars1", "numStars2", "numStars3",
+                              "numStars4", "numStars5", price, "countInStock", "stockShards", active,
+                              "createdAt", "updatedAt")
+    SELECT (SELECT min(id) FROM auth_user), 'Product ' || i, '', '{{}}', 'Brand ' || i % 50,
+           'Category ' || i % 20, 'A product of the catalog', round((random() * 5)::numeric, 2),
+           0, 0, 0, 0, 0, 0, 0, 9.99, 10, CASE WHEN i % 100 = 0 THEN 4 ELSE 0 END, i % 50 <> 0,
+           now() - i * interval '1 minute', now() - i * interval '1 minute'
+    FROM generate_series(1, {PRODUCTS}) i
+    ''',
+    '''
+    INSERT INTO core_stockshard (product_id, shard, count)
+    SELECT p.id, shard, 3 FROM core_product p, generate_series(0, 3) shard WHERE p."stockShards" > 0
+    ''',
+    f'''
+    INSERT INTO core_review (product_id, user_id, name, rating, comment, "createdAt", "updatedAt")
+    SELECT p.id, u.id, 'User', 1 + p.id % 5, 'Fine', now(), now()
+    FROM (SELECT id, row_number() OVER (ORDER BY id) n FROM core_product) p
+    JOIN (SELECT id, row_number() OVER (ORDER BY id) n FROM auth_user) u ON u.n = 1 + p.n % {USERS}
+    WHERE p.n <= {REVIEWS}
+    ''',
+    '''
+    INSERT INTO core_useraddress (user_id, address, city, "zipCode")
+    SELECT id, 'Ocean Street', 'Key West, FL', '00001' FROM auth_user
+    ''',
+    f'''
+    INSERT INTO core_order (user_id, "paymentMethod", "shippingPrice", "totalPrice", "isPaid",
+                            "isDelivered", "createdAt", "updatedAt")
+    SELECT u.id, 'PayPal', 10, 19.99, i % 2 = 0, false,
+           now() - i * interval '1 minute', now() - i * interval '1 minute'
+    FROM generate_series(1, {ORDERS}) i
+    JOIN (SELECT id, row_number() OVER (ORDER BY id) n FROM auth_user) u ON u.n = 1 + i % {USERS}
+    ''',
+    '''
+    INSERT INTO core_shippingaddress (order_id, address, city, "zipCode")
+    SELECT id, 'Ocean Street', 'Key West, FL', '00001' FROM core_order
+    ''',
+    '''
+    INSERT INTO core_orderitem (order_id, product_id, name, qty, price, image)
+    SELECT o.id, (SELECT min(id) FROM core_product) + o.id % 1000, 'Product', 1, 9.99, ''
+    FROM core_order o
+    ''',
+]
+
+
+def get_plan_scans(plan):
+    """Yield the tables read by sequential scans in a plan."""
+    if plan.get('Node Type') == 'Seq Scan':
+        yield plan['Relation Name']
+    for child in plan.get('Plans', []):
+        yield from get_plan_scans(child)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Needs the Postgres planner.')
+class QueryPlanTests(TransactionTestCase):
+    """Test the queries of hot views use indexes on large tables."""
+
+    def seed(self):
+        with connection.cursor() as cursor:
+            for sql in SEED:
+                cursor.execute(sql)
+            # Production tables are vacuumed, so index only scans count.
+            cursor.execute('VACUUM ANALYZE')
+            cursor.execute(
+                "SELECT relname FROM pg_class WHERE relkind = 'r' AND reltuples >= %s",
+                [LARGE_TABLE_ROWS],
+            )
+            return {name for name, in cursor.fetchall()}
+
+    def get_scans(self, client, url):
+        """Return the queries of a request scanning large tables."""
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            res = client.get(url)
+        self.assertEqual(res.status_code, 200, url)
+
+        scans = []
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                if not query['sql'].startswith('SELECT'):
+                    continue
+                cursor.execute('EXPLAIN (FORMAT JSON) ' + query['sql'])
+                plan = cursor.fetchone()[0]
+                plan = json.loads(plan) if isinstance(plan, str) else plan
+                tables = set(get_plan_scans(plan[0]['Plan'])) & self.large_tables
+                if tables:
+                    scans.append(f'{", ".join(sorted(tables))}: {query["sql"]}')
+        return scans
+
+    def test_hot_views_use_indexes(self):
+        """Test no hot view scans a large table."""
+        self.large_tables = self.seed()
+        self.assertTrue({'core_product', 'core_order', 'core_review'} <= self.large_tables)
+
+        admin = User.objects.get(is_staff=True)
+        user = User.objects.exclude(id=admin.id).first()
+        product = Product.objects.filter(active=True).order_by('id').first()
+        order = Order.objects.filter(user=user).first()
+        client = APIClient()
+        client.force_authenticate(user)
+        admin_client = APIClient()
+        admin_client.force_authenticate(admin)
+
+        cursor = client.get('/api/products/user/?cursor=').data['next']
+        views = [
+            (client, '/api/products/user/'),
+            (client, '/api/products/user/?ordering=rating&page=3'),
+            (client, f'/api/products/user/?cursor={cursor}'),
+            (client, '/api/products/user/?ordering=rating&cursor='),
+            (client, f'/api/products/user/{product.id}/'),
+            (client, '/api/products/user/top/'),
+            (client, '/api/products/user/top/?category=Category%201'),
+            (admin_client, '/api/products/admin/?unactive=true'),
+            (client, '/api/orders/myorders/'),
+            (client, f'/api/orders/{order.id}/'),
+            (admin_client, '/api/orders/?page=2'),
+            (admin_client, f'/api/orders/?page=1&user={user.id}'),
+            (client, '/api/users/address/0/'),
+        ]
+        for view_client, url in views:
+            with self.subTest(url=url):
+                self.assertEqual(self.get_scans(view_client, url), [])
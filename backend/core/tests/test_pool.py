@@ -0,0 +1,149 @@
+"""
+Tests for the database connection pool.
+"""
+from threading import Thread
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.utils import load_backend
+from django.test import SimpleTestCase, TestCase
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.db.backends.postgresql_pool.base import close_pools
+from core.db.pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    """Stands in for a DB-API connection."""
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """Test handing out and taking back connections."""
+
+    def test_reuses_connections(self):
+        """Test returned connections are handed out again."""
+        pool = ConnectionPool(max_size=2)
+        first = pool.getconn(FakeConnection)
+        pool.putconn(first)
+
+        self.assertIs(pool.getconn(FakeConnection), first)
+        self.assertEqual(pool.stats()['created'], 1)
+        self.assertEqual(pool.stats()['checked_out'], 1)
+
+    def test_waits_for_connection(self):
+        """Test a full pool waits for a returned connection."""
+        pool = ConnectionPool(max_size=1, timeout=5)
+        first = pool.getconn(FakeConnection)
+        got = []
+        waiter = Thread(target=lambda: got.append(pool.getconn(FakeConnection)))
+        waiter.start()
+        while not pool.stats()['waiting']:
+            pass
+        pool.putconn(first)
+        waiter.join()
+
+        self.assertEqual(got, [first])
+        self.assertEqual(pool.stats()['waiting'], 0)
+
+    def test_timeout(self):
+        """Test a full pool raises after the timeout."""
+        pool = ConnectionPool(max_size=1, timeout=0.01)
+        pool.getconn(FakeConnection)
+
+        with self.assertRaises(PoolTimeout):
+            pool.getconn(FakeConnection)
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+    def test_discards_broken_connections(self):
+        """Test closed, unusable and failed connections free their slot."""
+        pool = ConnectionPool(max_size=1, check_after=0, check=lambda conn: False)
+        pool.putconn(pool.getconn(FakeConnection), usable=False)
+        closed = pool.getconn(FakeConnection)
+        closed.close()
+        pool.putconn(closed)
+        stale = pool.getconn(FakeConnection)
+        pool.putconn(stale)
+
+        self.assertIsNot(pool.getconn(FakeConnection), stale)
+        self.assertEqual(pool.stats()['discarded'], 3)
+        self.assertEqual(pool.stats()['size'], 1)
+
+    def test_failed_connect_frees_slot(self):
+        """Test a failing connect doesn't leak its slot."""
+        pool = ConnectionPool(max_size=1, timeout=0.01)
+
+        def connect():
+            raise OSError()
+
+        with self.assertRaises(OSError):
+            pool.getconn(connect)
+        pool.getconn(FakeConnection)
+        self.assertEqual(pool.stats()['size'], 1)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Needs PostgreSQL.')
+class PooledBackendTests(TestCase):
+    """Test the pooled backend returns connections on close."""
+
+    def setUp(self):
+        # Start from a fresh pool when the suite itself runs pooled.
+        close_pools()
+        backend = load_backend('core.db.backends.postgresql_pool')
+        settings_dict = dict(connection.settings_dict, POOL={'MAX_SIZE': 2})
+        self.database = backend.DatabaseWrapper(settings_dict)
+
+    def tearDown(self):
+        self.database.close()
+        close_pools()
+
+    def query(self, sql):
+        with self.database.cursor() as cursor:
+            cursor.execute(sql)
+            return cursor.description and cursor.fetchone()
+
+    def test_close_returns_connection(self):
+        """Test closing the wrapper keeps the connection open in the pool."""
+        pid = self.query('SELECT pg_backend_pid()')
+        self.database.close()
+        stats = self.database.pool.stats()
+
+        self.assertEqual(stats['idle'], 1)
+        self.assertEqual(stats['checked_out'], 0)
+        self.assertEqual(self.query('SELECT pg_backend_pid()'), pid)
+
+    def test_open_transaction_rolled_back(self):
+        """Test a connection closed inside a transaction is reset."""
+        self.database.set_autocommit(False)
+        self.query('CREATE TEMPORARY TABLE pooled (id int) ON COMMIT DROP')
+        self.database.close()
+
+        self.assertEqual(self.query('SELECT to_regclass(\'pooled\') IS NULL'), (True,))
+        self.assertTrue(self.database.get_autocommit())
+        self.assertEqual(self.database.pool.stats()['created'], 1)
+
+
+class DatabasePoolViewTests(TestCase):
+    """Test the pool stats endpoint."""
+
+    def test_admin_only(self):
+        """Test only admins see the connection stats."""
+        client = APIClient()
+        user = User.objects.create_user(username='test@mail.com', password='password123')
+        client.force_authenticate(user)
+
+        self.assertEqual(client.get('/api/db/pool/').status_code, status.HTTP_403_FORBIDDEN)
+
+        user.is_staff = True
+        user.save()
+        res = client.get('/api/db/pool/')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('connMaxAge', res.data['databases']['default'])
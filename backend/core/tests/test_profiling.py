@@ -0,0 +1,138 @@
+"""
+Tests for profiling requests.
+"""
+import os
+import pstats
+import shutil
+import tempfile
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APIClient
+
+PRODUCTS_URL = '/api/products/user/'
+PROFILES_URL = '/api/profiles/'
+
+
+@override_settings(PROFILE_REQUESTS=True, PROFILE_SAMPLE_RATE=1, PROFILE_SLOW_MS=0, PROFILE_KEEP=50)
+class ProfilerMiddlewareTests(TestCase):
+    """Test capturing the profiles of requests."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.profile_dir = override_settings(PROFILE_DIR=self.directory)
+        self.profile_dir.enable()
+        self.client = APIClient()
+
+    def tearDown(self):
+        self.profile_dir.disable()
+        shutil.rmtree(self.directory)
+
+    def test_sampled_request_profiled(self):
+        """Test a sampled request saves CPU stats and an allocation snapshot."""
+        self.client.get(PRODUCTS_URL)
+        files = sorted(os.listdir(self.directory))
+
+        self.assertEqual(len(files), 2)
+        self.assertRegex(files[0], r'-GET-api-products-user-\d+ms\.prof$')
+        self.assertTrue(files[1].endswith('.tracemalloc'))
+        stats = pstats.Stats(os.path.join(self.directory, files[0]))
+        self.assertTrue(any('views.py' in function[0] for function in stats.stats))
+        tracemalloc.Snapshot.load(os.path.join(self.directory, files[1]))
+
+    @override_settings(PROFILE_MEMORY=False)
+    def test_cpu_only(self):
+        """Test the allocations aren't traced when disabled."""
+        self.client.get(PRODUCTS_URL)
+
+        self.assertEqual([name[-5:] for name in os.listdir(self.directory)], ['.prof'])
+
+    @override_settings(PROFILE_SAMPLE_RATE=0, PROFILE_SLOW_MS=10 ** 6)
+    def test_fast_request_not_saved(self):
+        """Test requests under the threshold aren't saved."""
+        self.client.get(PRODUCTS_URL)
+
+        self.assertEqual(os.listdir(self.directory), [])
+
+    @override_settings(PROFILE_SAMPLE_RATE=0, PROFILE_SLOW_MS=0.001)
+    def test_slow_request_saved(self):
+        """Test requests over the threshold are saved."""
+        self.client.get(PRODUCTS_URL)
+
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+
+    @override_settings(PROFILE_KEEP=2)
+    def test_rotation(self):
+        """Test only the newest profiles are kept."""
+        for _ in range(3):
+            self.client.get(PRODUCTS_URL)
+        self.client.get(f'{PRODUCTS_URL}top/')
+
+        files = os.listdir(self.directory)
+        self.assertEqual(len(files), 4)
+        self.assertEqual(len([name for name in files if 'top' in name]), 2)
+
+    @override_settings(PROFILE_REQUESTS=False)
+    def test_disabled(self):
+        """Test nothing is profiled by default."""
+        APIClient().get(PRODUCTS_URL)
+
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+@override_settings(PROFILE_REQUESTS=True, PROFILE_SAMPLE_RATE=1, PROFILE_SLOW_MS=0)
+class ProfileViewTests(TestCase):
+    """Test listing and downloading profiles."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.profile_dir = override_settings(PROFILE_DIR=self.directory)
+        self.profile_dir.enable()
+        self.client = APIClient()
+        self.client.get(PRODUCTS_URL)
+        self.admin = User.objects.create_superuser(username='admin@mail.com', password='password123')
+        self.client.force_authenticate(self.admin)
+
+    def tearDown(self):
+        self.profile_dir.disable()
+        shutil.rmtree(self.directory)
+
+    def test_list_profiles(self):
+        """Test admins list the profiles with their files."""
+        res = self.client.get(PROFILES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1)
+        self.assertIn('-GET-api-products-user-', res.data[0]['name'])
+        self.assertEqual(set(res.data[0]['files']), {'prof', 'tracemalloc'})
+
+    def test_download_profile(self):
+        """Test admins download a profile file."""
+        filename = self.client.get(PROFILES_URL).data[-1]['files']['prof']
+        res = self.client.get(f'{PROFILES_URL}{filename}/')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('attachment', res['Content-Disposition'])
+        with open(os.path.join(self.directory, filename), 'rb') as f:
+            self.assertEqual(b''.join(res.streaming_content), f.read())
+
+    def test_download_other_file_unsuccess(self):
+        """Test only profile files are served."""
+        with open(os.path.join(self.directory, 'notes.txt'), 'w') as f:
+            f.write('secret')
+
+        res = self.client.get(f'{PROFILES_URL}notes.txt/')
+        res_missing = self.client.get(f'{PROFILES_URL}missing.prof/')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res_missing.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_profiles_by_user_unsuccess(self):
+        """Test users can't list profiles."""
+        user = User.objects.create_user(username='user@mail.com', password='password123')
+        self.client.force_authenticate(user)
+        res = self.client.get(PROFILES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,164 @@
+"""
+Tests for the per-request query metrics.
+"""
+from decimal import Decimal
+from unittest.mock import patch
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from core.middleware import QueryMetricsMiddleware
+from core.models import Product
+from core.queries import get_query_budget, query_budget, track_queries
+from order import async_views as order_async_views
+from order import views as order_views
+from product import async_views as product_async_views
+from product.views import UserProductViewSet
+from user.views import MyTokenObtainPairView, UserAddressViewSet
+
+PRODUCTS_URL = '/api/products/user/'
+STREAM_ORDERS_URL = '/api/orders/stream/'
+
+
+class QueryMetricsTests(TestCase):
+    """Test the query count and time of requests."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='test@mail.com', password='password123')
+        self.product = Product.objects.create(
+            user=self.user, name='Phone', price=Decimal('5.50'), countInStock=10, active=True,
+        )
+
+    def test_track_queries(self):
+        """Test queries are counted inside track_queries() only."""
+        with track_queries() as stats:
+            list(Product.objects.all())
+            Product.objects.count()
+        list(Product.objects.all())
+
+        self.assertEqual(stats.count, 2)
+        self.assertGreater(stats.duration, 0)
+
+    async def test_async_chain(self):
+        """Test the middleware stays async and counts the queries of async views."""
+        async def view(request):
+            await sync_to_async(Product.objects.count)()
+            return HttpResponse()
+
+        middleware = QueryMetricsMiddleware(view)
+        response = await middleware(AsyncRequestFactory().get(PRODUCTS_URL))
+
+        self.assertTrue(iscoroutinefunction(middleware))
+        self.assertEqual(response.db_queries, 1)
+
+    def test_streaming_counted(self):
+        """Test the queries of streaming bodies are counted and checked once sent."""
+        self.client.force_authenticate(User.objects.create_superuser(username='admin@mail.com', password='password123'))
+        with patch.object(order_views.streamOrders, 'query_budget', 0, create=True):
+            res = self.client.get(STREAM_ORDERS_URL)
+            with self.assertNoLogs('core.middleware', 'WARNING'):
+                self.assertEqual(res.status_code, 200)
+
+            with self.assertLogs('core.middleware', 'WARNING') as logs:
+                b''.join(res.streaming_content)
+
+        self.assertEqual(res.db_queries, 1)
+        self.assertIn(f'GET {STREAM_ORDERS_URL} ran 1 queries', logs.output[0])
+
+    async def test_async_streaming_counted(self):
+        """Test the queries of async streaming bodies are counted."""
+        async def view(request):
+            async def lines():
+                for _ in range(2):
+                    yield str(await sync_to_async(Product.objects.count)())
+            return StreamingHttpResponse(lines())
+
+        response = await QueryMetricsMiddleware(view)(AsyncRequestFactory().get(PRODUCTS_URL))
+        content = [chunk async for chunk in response.streaming_content]
+
+        self.assertEqual(content, [b'1', b'1'])
+        self.assertEqual(response.db_queries, 2)
+
+    @override_settings(QUERY_METRICS_HEADERS=True)
+    def test_headers(self):
+        """Test the query count and time are sent when enabled."""
+        res = self.client.get(f'{PRODUCTS_URL}{self.product.id}/')
+
+        self.assertEqual(int(res['X-DB-Queries']), res.db_queries)
+        self.assertGreater(res.db_queries, 0)
+        self.assertGreaterEqual(float(res['X-DB-Time']), 0)
+
+    @override_settings(QUERY_METRICS_HEADERS=False)
+    def test_no_headers(self):
+        """Test the headers are left out when disabled."""
+        res = self.client.get(f'{PRODUCTS_URL}{self.product.id}/')
+
+        self.assertNotIn('X-DB-Queries', res)
+        self.assertNotIn('X-DB-Time', res)
+
+    def test_over_budget_logged(self):
+        """Test a request over its view's budget is logged."""
+        with self.assertLogs('core.middleware', 'WARNING') as logs, \
+                patch.object(UserProductViewSet.retrieve, 'query_budget', 0):
+            res = self.client.get(f'{PRODUCTS_URL}{self.product.id}/')
+
+        self.assertEqual(res.query_budget, 0)
+        self.assertIn(f'GET {PRODUCTS_URL}{self.product.id}/ ran', logs.output[0])
+
+    def test_within_budget_not_logged(self):
+        """Test requests within their budget aren't logged."""
+        with self.assertNoLogs('core.middleware', 'WARNING'):
+            res = self.client.get(f'{PRODUCTS_URL}{self.product.id}/')
+
+        self.assertLessEqual(res.db_queries, res.query_budget)
+
+
+class QueryBudgetTests(TestCase):
+    """Test finding the budget of a resolved view."""
+
+    def test_viewset_action(self):
+        """Test viewset actions have their own budget."""
+        view = UserProductViewSet.as_view({'get': 'retrieve'})
+
+        self.assertEqual(get_query_budget(view, 'GET'), UserProductViewSet.retrieve.query_budget)
+
+    def test_partial_update(self):
+        """Test PATCH requests use the budget of update()."""
+        view = UserAddressViewSet.as_view({'patch': 'partial_update'})
+
+        self.assertEqual(get_query_budget(view, 'PATCH'), UserAddressViewSet.update.query_budget)
+
+    def test_api_view(self):
+        """Test the budget of a function view."""
+        self.assertEqual(get_query_budget(order_views.getMyOrders, 'GET'), 3)
+
+    def test_view_class(self):
+        """Test a budget declared on an APIView class."""
+        self.assertEqual(get_query_budget(MyTokenObtainPairView.as_view(), 'POST'), 3)
+
+    def test_async_views(self):
+        """Test async views keep the budget of their sync counterparts."""
+        self.assertEqual(get_query_budget(product_async_views.product_list, 'GET'), 4)
+        self.assertEqual(get_query_budget(order_async_views.getMyOrders, 'GET'), 3)
+
+    def test_no_budget(self):
+        """Test views without a budget."""
+        self.assertIsNone(get_query_budget(order_views.streamOrders, 'GET'))
+
+    def test_declared_budget(self):
+        """Test query_budget() declares the budget on the view."""
+        view = query_budget(3)(lambda request: None)
+
+        self.assertEqual(get_query_budget(view, 'POST'), 3)
+
+    def test_request_budget(self):
+        """Test budgets declared as functions grow with the request."""
+        view = query_budget(lambda request: 2 + len(request['items']))(lambda request: None)
+
+        self.assertEqual(get_query_budget(view, 'POST', {'items': [1, 2]}), 4)
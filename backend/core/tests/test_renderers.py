@@ -0,0 +1,117 @@
+"""
+Tests for the API renderers and parsers.
+"""
+import datetime
+import json
+import uuid
+from decimal import Decimal
+from io import BytesIO
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+
+from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core import renderers
+from core.models import Product
+from core.renderers import MessagePackParser, MessagePackRenderer, ORJSONParser, ORJSONRenderer
+
+PAYLOAD = {
+    'name': 'Café “Wireless” headphones',
+    'price': Decimal('199.99'),
+    'rating': None,
+    'active': True,
+    'ids': [1, 2, 3],
+    'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+    'nested': [{'qty': 1, 'price': '9.99'}],
+}
+
+
+class ORJSONRendererTests(SimpleTestCase):
+    """Test orjson rendering matches DRF's JSONRenderer."""
+
+    def test_render_same_as_json_renderer(self):
+        """Test the output is byte for byte the DRF output."""
+        self.assertEqual(
+            ORJSONRenderer().render(PAYLOAD),
+            JSONRenderer().render(PAYLOAD),
+        )
+
+    def test_render_datetime(self):
+        """Test aware datetimes are rendered in UTC with a Z suffix."""
+        value = datetime.datetime(2022, 11, 5, 10, 30, tzinfo=datetime.timezone.utc)
+
+        self.assertEqual(ORJSONRenderer().render({'at': value}), b'{"at":"2022-11-05T10:30:00Z"}')
+
+    def test_render_none(self):
+        """Test no data renders an empty body."""
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+
+    def test_render_indent(self):
+        """Test an indent in the accepted media type is honoured."""
+        content = ORJSONRenderer().render({'a': 1}, 'application/json; indent=4')
+
+        self.assertEqual(content, b'{\n  "a": 1\n}')
+
+    def test_parse(self):
+        """Test JSON bodies are parsed."""
+        data = ORJSONParser().parse(BytesIO(b'{"qty": 2, "name": "\\u00e9"}'))
+
+        self.assertEqual(data, {'qty': 2, 'name': 'é'})
+
+    def test_parse_invalid(self):
+        """Test invalid JSON raises a parse error."""
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(BytesIO(b'{"qty": '))
+
+
+@skipUnless(renderers.msgpack, 'Needs msgpack.')
+class MessagePackTests(TestCase):
+    """Test MessagePack content negotiation."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='test@mail.com', password='password123')
+        Product.objects.create(user=self.user, name='Sample', price=Decimal('5.50'), active=True)
+
+    def test_render_decimal(self):
+        """Test decimals are packed as floats like in JSON."""
+        content = MessagePackRenderer().render({'price': Decimal('5.50')})
+
+        self.assertEqual(renderers.msgpack.unpackb(content), {'price': 5.5})
+
+    def test_parse_invalid(self):
+        """Test invalid MessagePack bodies raise a parse error."""
+        bodies = [
+            b'\xc1',
+            renderers.msgpack.packb({'rating': 4}) + b'\x01',
+            b'\x81\x81\xa1a\x01\x02',
+        ]
+        for body in bodies:
+            with self.subTest(body=body), self.assertRaises(ParseError):
+                MessagePackParser().parse(BytesIO(body))
+
+    def test_msgpack_accepted(self):
+        """Test clients can ask for MessagePack."""
+        json_res = self.client.get('/api/products/user/')
+        res = self.client.get('/api/products/user/', HTTP_ACCEPT='application/msgpack')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/msgpack')
+        self.assertEqual(renderers.msgpack.unpackb(res.content), json.loads(json_res.content))
+
+    def test_msgpack_request_body(self):
+        """Test MessagePack request bodies are parsed."""
+        self.client.force_authenticate(self.user)
+        product = Product.objects.get()
+        res = self.client.patch(
+            f'/api/products/user/reviews/{product.id}/',
+            renderers.msgpack.packb({'rating': 4}),
+            content_type='application/msgpack',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
@@ -0,0 +1,115 @@
+"""
+Tests for routing reads to the read replicas.
+
+The 'replica' alias mirrors the test database on its own connection, so
+rows written inside a test's transaction are missing on the replica,
+like rows not replicated yet.
+"""
+from decimal import Decimal
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, connections
+from django.db.utils import OperationalError
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from core.db import routers
+from core.models import Order, Product
+
+PRODUCTS_URL = '/api/products/user/'
+MY_ORDERS_URL = '/api/orders/myorders/'
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTests(TestCase):
+    """Test which database reads and writes are sent to."""
+
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        routers._down_until.clear()
+        self.router = routers.ReplicaRouter()
+
+    def test_reads_primary_by_default(self):
+        """Test reads outside replica views use the primary."""
+        self.assertIsNone(self.router.db_for_read(Product))
+
+        with routers.use_replica(), routers.use_primary():
+            self.assertIsNone(self.router.db_for_read(Product))
+
+    def test_replica_reads(self):
+        """Test reads inside use_replica() go to a replica, writes don't."""
+        with routers.use_replica():
+            self.assertEqual(self.router.db_for_read(Product), 'replica')
+            self.assertEqual(self.router.db_for_write(Product), 'default')
+
+    def test_unavailable_replica(self):
+        """Test reads fall back to the primary while a replica is down."""
+        with patch.object(connections['replica'], 'ensure_connection', side_effect=OperationalError) as connect:
+            with routers.use_replica():
+                self.assertEqual(self.router.db_for_read(Product), 'default')
+            with routers.use_replica():
+                self.assertEqual(self.router.db_for_read(Product), 'default')
+
+        self.assertEqual(connect.call_count, 1)
+
+    def test_no_migrations_on_replicas(self):
+        """Test migrations only run on the primary."""
+        self.assertTrue(self.router.allow_migrate('default', 'core'))
+        self.assertFalse(self.router.allow_migrate('replica', 'core'))
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Needs concurrent connections.')
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaViewTests(TestCase):
+    """Test replica views and read-your-writes."""
+
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        routers._down_until.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='test@mail.com', password='password123')
+        self.client.force_authenticate(self.user)
+        self.product = Product.objects.create(
+            user=self.user, name='Phone', price=Decimal('5.50'), countInStock=10, active=True,
+        )
+
+    def test_catalog_from_replica(self):
+        """Test the product list reads the replica."""
+        res = self.client.get(PRODUCTS_URL)
+
+        self.assertEqual(res.data['products'], [])
+
+    def test_catalog_after_write(self):
+        """Test a user who just wrote reads the primary."""
+        self.client.patch(f'{PRODUCTS_URL}reviews/{self.product.id}/', {'rating': 5}, format='json')
+        res = self.client.get(PRODUCTS_URL)
+
+        self.assertEqual(len(res.data['products']), 1)
+
+    def test_read_own_orders(self):
+        """Test a new order is listed although the replica lags."""
+        res = self.client.post('/api/orders/add/', {
+            'orderItems': [{'product': self.product.id, 'price': '5.50', 'qty': 1}],
+            'shippingAddress': {'address': 'Ocean Street', 'city': 'Key West, FL', 'zipCode': '00001'},
+            'paymentMethod': 'PayPal',
+            'shippingPrice': '10.00',
+            'totalPrice': '15.50',
+        }, format='json')
+
+        self.assertEqual([order['id'] for order in self.client.get(MY_ORDERS_URL).data], [res.data['id']])
+
+        cache.clear()
+        self.assertEqual(self.client.get(MY_ORDERS_URL).data, [])
+
+    def test_owner_pinned_by_admin_change(self):
+        """Test changes to an order by an admin pin its owner."""
+        Order.objects.create(user=self.user)
+
+        self.assertEqual(len(self.client.get(MY_ORDERS_URL).data), 1)
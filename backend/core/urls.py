@@ -0,0 +1,15 @@
+"""
+URL mapping for core app.
+"""
+from django.urls import path
+
+from core.views import *
+
+app_name = 'core'
+
+urlpatterns = [
+    path('db/pool/', getDatabasePool, name='db-pool'),
+    path('metrics/', getMetrics, name='metrics'),
+    path('profiles/', getProfiles, name='profiles'),
+    path('profiles/<str:filename>/', getProfile, name='profile'),
+]
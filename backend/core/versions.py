@@ -0,0 +1,47 @@
+"""
+Version counters kept in the shared cache.
+
+Data cached from the database is keyed by the version of what it was
+read from. A change bumps the version instead of deleting keys, so data
+read before the change is never served after it, whichever worker
+stores it last, and stale entries simply expire.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def _start(key):
+    # Start from the clock so a lost version key never resurrects
+    # entries cached under an older version number.
+    cache.add(key, time.time_ns(), None)
+    return cache.get(key)
+
+
+def get_version(key):
+    """Return the current version of a key."""
+    version = cache.get(key)
+    return _start(key) if version is None else version
+
+
+def get_versions(keys):
+    """Return the current versions of several keys by key."""
+    versions = cache.get_many(keys)
+    return {key: versions[key] if key in versions else _start(key) for key in keys}
+
+
+def _bump(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+def bump_versions(*keys):
+    """Bump versions now and again when the transaction commits."""
+    # The second bump drops anything cached from the pre-commit state
+    # by concurrent requests.
+    _bump(keys)
+    transaction.on_commit(lambda: _bump(keys))
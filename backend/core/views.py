@@ -0,0 +1,78 @@
+"""
+Views for operating the API.
+"""
+import os
+
+from django.conf import settings
+from django.db import connections
+from django.http import FileResponse, HttpResponse
+from django.utils.crypto import constant_time_compare
+from rest_framework import status
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import BasePermission, IsAdminUser
+from rest_framework.response import Response
+
+from core import metrics
+from core.authentication import ClaimsJWTAuthentication
+from core.profiling import get_profile_path, list_profiles
+
+
+class CanReadMetrics(BasePermission):
+    """
+    Allow scrapers sending METRICS_TOKEN, when it is set, and admins. The
+    metrics show the routes and traffic of the API, nobody else sees them.
+    """
+
+    def has_permission(self, request, view):
+        token = settings.METRICS_TOKEN
+        if token and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return True
+
+        # The view doesn't authenticate, scraper tokens aren't JWTs.
+        try:
+            result = ClaimsJWTAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return False
+        return bool(result and result[0].is_staff)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def getDatabasePool(request):
+    """Connection settings and pool stats of the worker answering."""
+    databases = {}
+    for alias in connections:
+        connection = connections[alias]
+        pool = getattr(connection, 'pool', None)
+        databases[alias] = {
+            'engine': connection.settings_dict['ENGINE'],
+            'connMaxAge': connection.settings_dict['CONN_MAX_AGE'],
+            'pool': pool and pool.stats(),
+        }
+    return Response({'pid': os.getpid(), 'databases': databases})
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def getProfiles(request):
+    """Request profiles captured by the worker's machine, newest first."""
+    return Response(list_profiles(settings.PROFILE_DIR))
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def getProfile(request, filename):
+    path = get_profile_path(settings.PROFILE_DIR, filename)
+    if path is None:
+        return Response({'detail': 'Profile does not exist.'}, status=status.HTTP_400_BAD_REQUEST)
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=filename)
+
+
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([CanReadMetrics])
+def getMetrics(request):
+    """Prometheus metrics of all workers, in the text format."""
+    data, content_type = metrics.render()
+    return HttpResponse(data, content_type=content_type)
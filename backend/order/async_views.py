@@ -0,0 +1,54 @@
+"""
+Async views of a user's orders, served when ASYNC_VIEWS is enabled.
+"""
+from rest_framework import status
+
+from core.asynchronous import api_response, async_api_view
+from asgiref.sync import sync_to_async
+
+from core.conditional import aconditional, make_etag
+from core.db.routers import replica_reads
+from core.models import Order
+from core.queries import query_budget
+from order.cache import user_orders_etag
+from order.serializers import serialize_order
+
+
+# As the sync views, see order/views.py.
+@query_budget(3)
+@async_api_view(['GET'], authenticated=True)
+@replica_reads
+async def getMyOrders(request):
+    user = request.user
+    orders = user.order_set.with_details()
+
+    async def render():
+        return api_response(request, [serialize_order(order) async for order in orders])
+
+    return await aconditional(request, render, await sync_to_async(user_orders_etag)(user.id))
+
+
+# As the sync views, see order/views.py.
+@query_budget(4)
+@async_api_view(['GET'], authenticated=True)
+async def getOrderById(request, pk):
+    user = request.user
+
+    try:
+        state = await Order.objects.values('user_id', 'updatedAt').aget(id=pk)
+    except:
+        return api_response(request, {'detail': 'Order does not exists'}, status.HTTP_400_BAD_REQUEST)
+
+    if not (user.is_staff or state['user_id'] == user.id):
+        return api_response(request, {'detail': 'Not authorized to view.'}, status.HTTP_400_BAD_REQUEST)
+
+    async def render():
+        order = await Order.objects.with_details().aget(id=pk)
+        return api_response(request, serialize_order(order))
+
+    return await aconditional(
+        request,
+        render,
+        make_etag('order', pk, state['updatedAt']),
+        state['updatedAt'],
+    )
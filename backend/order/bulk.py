@@ -0,0 +1,63 @@
+"""
+Order status changes of many orders at once, for the admin.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models.functions import Now
+
+from core.db.routers import pin
+from core.models import Order
+from .cache import invalidate_orders
+
+UPDATED, UNCHANGED, NOT_FOUND = 'updated', 'unchanged', 'not found'
+
+
+class BulkOrderError(Exception):
+    """The ids can't be read, the message is shown to the admin."""
+
+
+def get_order_ids(data):
+    """Return the distinct order ids of the request, in their order."""
+    try:
+        ids = data['ids']
+        # bool is an int, true would stand for order 1.
+        if not isinstance(ids, list) or not ids or any(isinstance(pk, bool) for pk in ids):
+            raise TypeError
+        ids = [int(pk) for pk in ids]
+    except (KeyError, TypeError, ValueError):
+        raise BulkOrderError('Give the order ids as a list, e.g. {"ids": [1, 2]}.')
+
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > settings.ORDERS_BULK_MAX_SIZE:
+        raise BulkOrderError(f'At most {settings.ORDERS_BULK_MAX_SIZE} orders can be updated at once.')
+    return ids
+
+
+def mark_orders(ids, flag, timestamp):
+    """
+    Set `flag` of the orders and their `timestamp` to the database time.
+
+    Orders already flagged keep their timestamp, so repeating a request
+    changes nothing. Return the result of every id.
+    """
+    with transaction.atomic():
+        # Locked in id order, so concurrent batches can't deadlock and no
+        # order changes between reading and updating it.
+        rows = list(Order.objects.select_for_update().filter(id__in=ids).order_by('id').values_list('id', flag, 'user_id'))
+        flags = {pk: done for pk, done, _ in rows}
+        pending = [pk for pk, done, _ in rows if not done]
+        if pending:
+            Order.objects.filter(id__in=pending).update(**{flag: True, timestamp: Now(), 'updatedAt': Now()})
+            user_ids = {user_id for _, done, user_id in rows if not done}
+            invalidate_orders(*user_ids)
+            # Owners read their orders from the primary, as after any
+            # change to one (core.signals.pinOrderUser).
+            for user_id in user_ids:
+                pin(user_id)
+
+    pending = set(pending)
+    results = [
+        {'id': pk, 'result': UPDATED if pk in pending else UNCHANGED if pk in flags else NOT_FOUND}
+        for pk in ids
+    ]
+    return {'updated': len(pending), 'results': results}
@@ -0,0 +1,29 @@
+"""
+Versions validating the order lists, see core.versions.
+
+Every change to an order, or to what orders embed, bumps the version of
+the admin list and of its user's list.
+"""
+from core.conditional import versions_etag
+from core.versions import bump_versions
+
+ORDERS_VERSION_KEY = 'orders:version'
+
+
+def _user_version_key(user_id):
+    return f'orders:user:{user_id}:version'
+
+
+def invalidate_orders(*user_ids):
+    """Change the ETags of the order lists of the users and of the admin."""
+    bump_versions(ORDERS_VERSION_KEY, *[_user_version_key(user_id) for user_id in user_ids])
+
+
+def orders_etag(*parts):
+    """Return the ETag of the admin order list."""
+    return versions_etag([ORDERS_VERSION_KEY], 'orders', *parts)
+
+
+def user_orders_etag(user_id):
+    """Return the ETag of a user's order list."""
+    return versions_etag([_user_version_key(user_id)], 'myorders', user_id)
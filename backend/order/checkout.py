@@ -0,0 +1,105 @@
+"""
+Order placement.
+"""
+from decimal import InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import DataError, transaction
+from django.db.models import F
+from django.db.models.functions import Now
+
+from core.models import Product, Order, OrderItem, ShippingAddress
+from product import stock
+from product.cache import invalidate_products
+
+
+class CheckoutError(Exception):
+    """The order can't be placed, the message is shown to the user."""
+
+
+def get_quantities(orderItems):
+    """Return the total quantity ordered per product id."""
+    quantities = {}
+    try:
+        for item in orderItems:
+            product_id, qty = int(item['product']), int(item['qty'])
+            if qty < 1:
+                raise CheckoutError('Invalid quantity.')
+            quantities[product_id] = quantities.get(product_id, 0) + qty
+    except (KeyError, TypeError, ValueError):
+        raise CheckoutError('No order items')
+
+    return quantities
+
+
+def reserve_stock(products, quantities):
+    """Decrement stock for every product or raise CheckoutError."""
+    # Lock rows in id order so concurrent carts can't deadlock.
+    for product_id in sorted(quantities):
+        if products[product_id].stockShards:
+            reserved = stock.reserve(products[product_id], quantities[product_id])
+        else:
+            reserved = Product.objects \
+                .filter(id=product_id, countInStock__gte=quantities[product_id]) \
+                .update(countInStock=F('countInStock') - quantities[product_id], updatedAt=Now())
+        if not reserved:
+            raise CheckoutError(f'{products[product_id].name} is out of stock.')
+
+    invalidate_products(*quantities)
+
+
+def place_order(user, data):
+    """Create an order with its items, reserving stock atomically."""
+    try:
+        orderItems = data['orderItems']
+        if not orderItems or not len(orderItems):
+            raise CheckoutError('No order items')
+        address = data['shippingAddress']
+        quantities = get_quantities(orderItems)
+    except (KeyError, TypeError):
+        raise CheckoutError('No order items')
+
+    products = Product.objects.in_bulk(quantities)
+    if len(products) != len(quantities):
+        raise CheckoutError('Product does not exist.')
+
+    try:
+        with transaction.atomic():
+            order = Order.objects.create(
+                user=user,
+                paymentMethod=data['paymentMethod'],
+                shippingPrice=data['shippingPrice'],
+                totalPrice=data['totalPrice']
+            )
+
+            ShippingAddress.objects.create(
+                order=order,
+                address=address['address'],
+                city=address['city'],
+                zipCode=address['zipCode'],
+            )
+
+            items = []
+            for item in orderItems:
+                product = products[int(item['product'])]
+                items.append(OrderItem(
+                    product=product,
+                    order=order,
+                    name=product.name,
+                    qty=int(item['qty']),
+                    price=item['price'],
+                    image=product.image.url if product.image else '',
+                ))
+            OrderItem.objects.bulk_create(items)
+
+            # Last, so the locks of hot product rows are held only until
+            # the commit that follows.
+            reserve_stock(products, quantities)
+    except (KeyError, TypeError, ValidationError):
+        raise CheckoutError('No order items')
+    except (DataError, InvalidOperation):
+        # Prices or address fields too large for their columns, SQLite
+        # fails to quantize the prices before sending them.
+        raise CheckoutError('Invalid order data.')
+
+    return order
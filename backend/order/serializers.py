@@ -1,6 +1,9 @@
+from django.utils.functional import cached_property
+
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from rest_framework_simplejwt.tokens import RefreshToken
+from core.compiled import CompiledSerializer
 from core.models import *
 from user.serializers import *
 
@@ -26,10 +29,15 @@ class OrderSerializer(serializers.ModelSerializer):
         model = Order
         fields = '__all__'
 
+    @cached_property
+    def item_serializer(self):
+        """One item serializer reused for every order in a list."""
+        return OrderItemSerializer()
+
     def get_orderItems(self, obj):
+        # Served from the prefetch cache when the queryset used with_details().
         items = obj.orderitem_set.all()
-        serializer = OrderItemSerializer(items, many=True)
-        return serializer.data
+        return [self.item_serializer.to_representation(item) for item in items]
 
     def get_shippingAddress(self, obj):
         try:
@@ -41,4 +49,30 @@ class OrderSerializer(serializers.ModelSerializer):
     def get_user(self, obj):
         user = obj.user
         serializer = UserSerializer(user, many=False)
-        return serializer.data
\ No newline at end of file
+        return serializer.data
+
+
+def get_order_address(order):
+    try:
+        return serialize_address(order.shippingaddress)
+    except ShippingAddress.DoesNotExist:
+        return False
+
+
+def get_order_user(order):
+    if order.user is None:
+        return UserSerializer(None).data
+    return serialize_user(order.user)
+
+
+# Read-only fast paths of the serializers above for the list endpoints.
+# Nested serializers are timed as part of their parent.
+serialize_user = CompiledSerializer(UserSerializer, timed=False)
+serialize_item = CompiledSerializer(OrderItemSerializer, timed=False)
+serialize_address = CompiledSerializer(ShippingAddressSerializer, timed=False)
+serialize_order = CompiledSerializer(
+    OrderSerializer,
+    orderItems=lambda order: serialize_item.many(order.orderitem_set.all()),
+    shippingAddress=get_order_address,
+    user=get_order_user,
+)
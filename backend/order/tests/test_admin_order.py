@@ -1,21 +1,32 @@
 """
 Tests for the orderadmin API.
 """
+import json
 from decimal import Decimal
 
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
 from django.urls import reverse
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from core.db.routers import is_pinned
 from core.models import *
+from core.testing import QueryBudgetMixin
+from order.bulk import mark_orders
+from order.checkout import place_order
 
 TOKEN_URL = reverse('user:user-token')
 GET_ORDERS = reverse('order:orders')
 CREATE_ORDER_URL = reverse('order:orders-add')
 GET_USER_ORDERS = reverse('order:myorders')
+STREAM_ORDERS_URL = reverse('order:orders-stream')
+BULK_PAY_URL = reverse('order:orders-pay')
+BULK_DELIVER_URL = reverse('order:orders-deliver')
 
 def deliver_orde_url(id):
     return reverse('order:order-delivered', args=(id,))
@@ -39,7 +50,8 @@ def create_product(user):
         user=user,
         name='Sample product name',
         description='Sample product description',
-        price=Decimal('5.50')
+        price=Decimal('5.50'),
+        countInStock=10,
     )
 
     return product
@@ -49,7 +61,7 @@ def get_token(path, params):
     return path(TOKEN_URL, params)
 
 
-class OrderAPITests(TestCase):
+class OrderAPITests(QueryBudgetMixin, TestCase):
     """Test authenticated admin API requests."""
 
     def setUp(self):
@@ -103,6 +115,7 @@ class OrderAPITests(TestCase):
 
         self.assertEqual(res_admin.status_code, status.HTTP_200_OK)
         self.assertEqual(res_admin.data, res_user.data)
+        self.assertWithinQueryBudget(res_admin)
 
 
     def test_mark_order_as_delivered_by_admin_success(self):
@@ -125,6 +138,7 @@ class OrderAPITests(TestCase):
 
         self.assertEqual(res_mark_order_delivered.status_code, status.HTTP_200_OK)
         self.assertEqual(res_get_order_by_user.data['isDelivered'], True)
+        self.assertWithinQueryBudget(res_mark_order_delivered)
 
 
     def test_mark_order_as_delivered_by_user_unsuccess(self):
@@ -166,6 +180,7 @@ class OrderAPITests(TestCase):
 
         self.assertEqual(res_all_orders.status_code, status.HTTP_200_OK)
         self.assertEqual(len(res_all_orders.data), 2)
+        self.assertWithinQueryBudget(res_all_orders)
 
 
     def test_get_orders_as_user_unsuccess(self):
@@ -187,3 +202,214 @@ class OrderAPITests(TestCase):
         res_all_orders = self.client.get(GET_ORDERS, **user_token)
 
         self.assertEqual(res_all_orders.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class AdminOrderListTests(QueryBudgetMixin, TestCase):
+    """Test the admin order list and export."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = create_admin({
+            'first_name': 'Admin User',
+            'email': 'admin@mail.com',
+            'username': 'admin@mail.com',
+            'password': 'password123',
+        }, True)
+        self.client.force_authenticate(self.admin)
+        self.product = create_product(self.admin)
+        Product.objects.filter(id=self.product.id).update(countInStock=1000)
+
+    def create_orders(self, count, items=2):
+        """Place orders with several items."""
+        for _ in range(count):
+            place_order(self.admin, {
+                'orderItems': [{'product': self.product.id, 'price': '5.50', 'qty': 1}] * items,
+                'shippingAddress': {'address': 'Ocean Street', 'city': 'Key West, FL', 'zipCode': '00001'},
+                'paymentMethod': 'PayPal',
+                'shippingPrice': '10.00',
+                'totalPrice': '21.00',
+            })
+
+    def test_get_orders_constant_queries(self):
+        """Test the order list doesn't query items, address or user per order."""
+        self.create_orders(2)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(GET_ORDERS)
+
+        self.create_orders(5, items=3)
+        with self.assertNumQueries(len(queries)):
+            res = self.client.get(GET_ORDERS)
+
+        self.assertEqual(len(res.data), 7)
+        self.assertEqual(res.data[0]['shippingAddress']['city'], 'Key West, FL')
+        self.assertWithinQueryBudget(res)
+
+    def test_get_user_orders_constant_queries(self):
+        """Test the user's order history runs a constant number of queries."""
+        self.create_orders(1)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(GET_USER_ORDERS)
+
+        self.create_orders(4)
+        with self.assertNumQueries(len(queries)):
+            res = self.client.get(GET_USER_ORDERS)
+
+        self.assertEqual(len(res.data), 5)
+        self.assertWithinQueryBudget(res)
+
+    def test_get_orders_paginated(self):
+        """Test requesting a page returns the orders with the page count."""
+        self.create_orders(5)
+        res = self.client.get(GET_ORDERS, {'page': 2, 'page_size': 2})
+        ids = list(Order.objects.order_by('-createdAt', '-id').values_list('id', flat=True))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['page'], 2)
+        self.assertEqual(res.data['pages'], 3)
+        self.assertEqual([order['id'] for order in res.data['orders']], ids[2:4])
+        self.assertWithinQueryBudget(res)
+
+    def test_get_orders_filtered(self):
+        """Test filtering orders by payment and delivery status."""
+        self.create_orders(3)
+        paid = Order.objects.order_by('id').first()
+        Order.objects.filter(id=paid.id).update(isPaid=True)
+
+        res_paid = self.client.get(GET_ORDERS, {'isPaid': 'true'})
+        res_unpaid = self.client.get(GET_ORDERS, {'isPaid': 'false', 'isDelivered': 'false'})
+        res_other_user = self.client.get(GET_ORDERS, {'user': self.admin.id + 1})
+
+        self.assertEqual([order['id'] for order in res_paid.data], [paid.id])
+        self.assertEqual(len(res_unpaid.data), 2)
+        self.assertEqual(res_other_user.data, [])
+
+    def test_stream_orders(self):
+        """Test exporting orders as newline delimited JSON."""
+        self.create_orders(3)
+        with self.settings(ORDERS_STREAM_CHUNK_SIZE=2):
+            res = self.client.get(STREAM_ORDERS_URL, {'isDelivered': 'false'})
+            lines = b''.join(res.streaming_content).decode().splitlines()
+
+        orders = [json.loads(line) for line in lines]
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(len(orders), 3)
+        self.assertEqual(len(orders[0]['orderItems']), 2)
+        self.assertEqual(orders[0]['user']['id'], self.admin.id)
+
+    def test_stream_orders_by_user_unsuccess(self):
+        """Test the export requires admin privileges."""
+        user = create_admin({'email': 'user@mail.com', 'username': 'user@mail.com', 'password': 'password123'})
+        self.client.force_authenticate(user)
+        res = self.client.get(STREAM_ORDERS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class BulkOrderStatusTests(QueryBudgetMixin, TestCase):
+    """Test marking many orders paid or delivered at once."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = create_admin({
+            'first_name': 'Admin User',
+            'email': 'admin@mail.com',
+            'username': 'admin@mail.com',
+            'password': 'password123',
+        }, True)
+        res = get_token(self.client.post, {'username': 'admin@mail.com', 'password': 'password123'})
+        self.admin_token = {'HTTP_AUTHORIZATION': f'Bearer {res.data.get("token")}'}
+        self.orders = [Order.objects.create(user=self.admin, totalPrice='10.00') for _ in range(3)]
+        self.ids = [order.id for order in self.orders]
+
+    def test_bulk_pay(self):
+        """Test orders are marked paid with the result of each id."""
+        Order.objects.filter(id=self.ids[1]).update(isPaid=True, paidAt=None)
+        missing = max(self.ids) + 1
+
+        res = self.client.put(BULK_PAY_URL, {'ids': [self.ids[0], self.ids[1], missing, self.ids[2]]},
+                              format='json', **self.admin_token)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['updated'], 2)
+        self.assertEqual(res.data['results'], [
+            {'id': self.ids[0], 'result': 'updated'},
+            {'id': self.ids[1], 'result': 'unchanged'},
+            {'id': missing, 'result': 'not found'},
+            {'id': self.ids[2], 'result': 'updated'},
+        ])
+        orders = Order.objects.in_bulk(self.ids)
+        self.assertTrue(all(order.isPaid for order in orders.values()))
+        self.assertIsNotNone(orders[self.ids[0]].paidAt)
+        self.assertIsNone(orders[self.ids[1]].paidAt)
+        self.assertGreater(orders[self.ids[0]].updatedAt, self.orders[0].updatedAt)
+        self.assertWithinQueryBudget(res)
+
+    def test_bulk_pay_idempotent(self):
+        """Test repeating a request leaves the orders and their timestamps alone."""
+        self.client.put(BULK_PAY_URL, {'ids': self.ids}, format='json', **self.admin_token)
+        paid = dict(Order.objects.values_list('id', 'paidAt'))
+
+        res = self.client.put(BULK_PAY_URL, {'ids': self.ids}, format='json', **self.admin_token)
+
+        self.assertEqual(res.data['updated'], 0)
+        self.assertEqual({result['result'] for result in res.data['results']}, {'unchanged'})
+        self.assertEqual(dict(Order.objects.values_list('id', 'paidAt')), paid)
+
+    def test_bulk_deliver(self):
+        """Test orders are marked delivered, duplicate ids count once."""
+        res = self.client.put(BULK_DELIVER_URL, {'ids': [self.ids[0], self.ids[0]]}, format='json', **self.admin_token)
+        order = Order.objects.get(id=self.ids[0])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], [{'id': self.ids[0], 'result': 'updated'}])
+        self.assertTrue(order.isDelivered)
+        self.assertIsNotNone(order.deliveredAt)
+        self.assertFalse(order.isPaid)
+        self.assertEqual(Order.objects.filter(isDelivered=True).count(), 1)
+
+    def test_bulk_constant_queries(self):
+        """Test one batch runs the same queries whatever its size."""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.put(BULK_PAY_URL, {'ids': self.ids[:1]}, format='json', **self.admin_token)
+
+        with self.assertNumQueries(len(queries)):
+            self.client.put(BULK_DELIVER_URL, {'ids': self.ids}, format='json', **self.admin_token)
+
+    def test_bulk_invalid_ids(self):
+        """Test requests without a list of ids, or too many, are rejected."""
+        for data in ({}, {'ids': []}, {'ids': 'all'}, {'ids': [1, 'x']}, {'ids': [True]}):
+            res = self.client.put(BULK_PAY_URL, data, format='json', **self.admin_token)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('detail', res.data)
+
+        with self.settings(ORDERS_BULK_MAX_SIZE=2):
+            res = self.client.put(BULK_PAY_URL, {'ids': self.ids}, format='json', **self.admin_token)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Order.objects.filter(isPaid=True).exists())
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_bulk_pins_owners(self):
+        """Test the owners of updated orders read their orders from the primary."""
+        owner = User.objects.create_user(username='owner@mail.com', password='password123')
+        other = User.objects.create_user(username='other@mail.com', password='password123')
+        orders = [Order.objects.create(user=owner), Order.objects.create(user=other, isPaid=True)]
+        cache.clear()
+
+        mark_orders([order.id for order in orders], 'isPaid', 'paidAt')
+
+        self.assertTrue(is_pinned(owner))
+        self.assertFalse(is_pinned(other))
+
+    def test_bulk_by_user_unsuccess(self):
+        """Test bulk updates require admin privileges."""
+        user = create_admin({'email': 'user@mail.com', 'username': 'user@mail.com', 'password': 'password123'})
+        self.client.force_authenticate(user)
+
+        res_pay = self.client.put(BULK_PAY_URL, {'ids': self.ids}, format='json')
+        res_deliver = self.client.put(BULK_DELIVER_URL, {'ids': self.ids}, format='json')
+
+        self.assertEqual(res_pay.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(res_deliver.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(Order.objects.filter(isPaid=True).exists())
@@ -1,16 +1,27 @@
 """
 Tests for the order API.
 """
+import json
 from decimal import Decimal
+from threading import Thread
+from unittest import skipUnless
 
 from django.contrib.auth.models import User
+from django.db import connection
 from django.urls import reverse
-from django.test import TestCase
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 
 from rest_framework import status
+from asgiref.sync import sync_to_async
 from rest_framework.test import APIClient
 
 from core.models import *
+from core.testing import QueryBudgetMixin
+from order import async_views
+from order.bulk import mark_orders
+from order.checkout import CheckoutError, place_order
+from product.stock import shard_stock
 
 TOKEN_URL = reverse('user:user-token')
 CREATE_ORDER_URL = reverse('order:orders-add')
@@ -35,7 +46,8 @@ def create_product(user):
         user=user,
         name='Sample product name',
         description='Sample product description',
-        price=Decimal('5.50')
+        price=Decimal('5.50'),
+        countInStock=10,
     )
 
     return product
@@ -45,7 +57,7 @@ def get_token(path, params):
     return path(TOKEN_URL, params)
 
 
-class OrderAPITests(TestCase):
+class OrderAPITests(QueryBudgetMixin, TestCase):
     """Test authenticated API requests."""
 
     def setUp(self):
@@ -87,8 +99,84 @@ class OrderAPITests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data['user']['id'], self.user.id)
         self.assertEqual(res.data['shippingAddress']['address'], self.order['shippingAddress']['address'])
+        self.assertWithinQueryBudget(res)
 
 
+    def test_create_order_decrements_stock(self):
+        """Test placing an order reserves the ordered quantity."""
+        other_product = create_product(self.user)
+        self.order['orderItems'] = [
+            {'product': self.product.id, 'price': self.product.price, 'qty': 2},
+            {'product': other_product.id, 'price': other_product.price, 'qty': 3},
+            {'product': self.product.id, 'price': self.product.price, 'qty': 1},
+        ]
+        res = self.client.post(CREATE_ORDER_URL, self.order, **self.user_token, format='json')
+        self.product.refresh_from_db()
+        other_product.refresh_from_db()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['orderItems']), 3)
+        self.assertEqual(self.product.countInStock, 7)
+        self.assertEqual(other_product.countInStock, 7)
+        self.assertWithinQueryBudget(res)
+
+    def test_create_order_stock_visible(self):
+        """Test the cached product detail shows the stock left after an order."""
+        self.client.get(f'/api/products/user/{self.product.id}/')
+        self.client.post(CREATE_ORDER_URL, self.order, **self.user_token, format='json')
+        res = self.client.get(f'/api/products/user/{self.product.id}/')
+
+        self.assertEqual(res.data['countInStock'], 9)
+
+    def test_create_order_out_of_stock_unsuccess(self):
+        """Test an order is rejected as a whole when a product is sold out."""
+        sold_out = create_product(self.user)
+        Product.objects.filter(id=sold_out.id).update(countInStock=1)
+        self.order['orderItems'].append({'product': sold_out.id, 'price': sold_out.price, 'qty': 2})
+        res = self.client.post(CREATE_ORDER_URL, self.order, **self.user_token, format='json')
+        self.product.refresh_from_db()
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data['detail'], f'{sold_out.name} is out of stock.')
+        self.assertEqual(self.product.countInStock, 10)
+        self.assertFalse(Order.objects.exists())
+
+    def test_create_order_price_overflow_unsuccess(self):
+        """Test an order with prices too large to store is rejected."""
+        self.order['totalPrice'] = '123456789.00'
+        res = self.client.post(CREATE_ORDER_URL, self.order, **self.user_token, format='json')
+        self.product.refresh_from_db()
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data['detail'], 'Invalid order data.')
+        self.assertEqual(self.product.countInStock, 10)
+        self.assertFalse(Order.objects.exists())
+
+    def test_create_order_reserves_stock_last(self):
+        """Test the stock is reserved after the order rows are written."""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(CREATE_ORDER_URL, self.order, **self.user_token, format='json')
+        writes = [query['sql'].split()[:3] for query in queries if query['sql'].startswith(('INSERT', 'UPDATE'))]
+
+        self.assertEqual(writes[-1], ['UPDATE', '"core_product"', 'SET'])
+        self.assertEqual(len(writes), 4)
+
+    def test_create_order_unknown_product_unsuccess(self):
+        """Test an order with a product that doesn't exist is rejected."""
+        self.order['orderItems'][0]['product'] = self.product.id + 100
+        res = self.client.post(CREATE_ORDER_URL, self.order, **self.user_token, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Order.objects.exists())
+
+    def test_create_order_batched_queries(self):
+        """Test only the stock updates run once per product."""
+        products = [create_product(self.user) for _ in range(5)]
+        self.order['orderItems'] = [{'product': p.id, 'price': p.price, 'qty': 1} for p in products]
+        # Savepoint, in_bulk, order, address, bulk_create and release.
+        with self.assertNumQueries(6 + len(products)):
+            place_order(self.user, self.order)
+
     def test_create_order_unsuccess(self):
         """Test unsuccess creating a new order."""
         del self.order['orderItems']
@@ -116,6 +204,7 @@ class OrderAPITests(TestCase):
 
         self.assertEqual(res_user_orders.status_code, status.HTTP_200_OK)
         self.assertEqual(len(res_user_orders.data), 2)
+        self.assertWithinQueryBudget(res_user_orders)
 
 
     def test_get_unauthenticated_user_orders_ussuccess(self):
@@ -137,6 +226,7 @@ class OrderAPITests(TestCase):
 
         self.assertEqual(res2.status_code, status.HTTP_200_OK)
         self.assertEqual(res2.data, res1.data)
+        self.assertWithinQueryBudget(res2)
 
 
     def test_get_order_authorized_user_unsuccess(self):
@@ -177,6 +267,7 @@ class OrderAPITests(TestCase):
 
         self.assertEqual(res_pay_order.status_code, status.HTTP_200_OK)
         self.assertEqual(res_confirmed_order_was_paied.data['isPaid'], True)
+        self.assertWithinQueryBudget(res_pay_order)
 
 
     def test_pay_order_unauthenticated_user_unsuccess(self):
@@ -186,3 +277,329 @@ class OrderAPITests(TestCase):
         res_pay_order = self.client.put(pay_order_url(res_create_order.data['id']))
 
         self.assertEqual(res_pay_order.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class ShardedStockTests(QueryBudgetMixin, TestCase):
+    """Test checkouts of products whose stock is sharded."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user({'username': 'test@mail.com', 'email': 'test@mail.com', 'password': 'password123'})
+        self.client.force_authenticate(self.user)
+        self.product = create_product(self.user)
+        shard_stock(self.product.id, 4)
+
+    def order(self, qty):
+        return {
+            'orderItems': [{'product': self.product.id, 'price': '5.50', 'qty': qty}],
+            'shippingAddress': {'address': 'Ocean Street', 'city': 'Key West, FL', 'zipCode': '00001'},
+            'paymentMethod': 'PayPal',
+            'shippingPrice': '10.00',
+            'totalPrice': '15.50',
+        }
+
+    def shards(self):
+        return list(StockShard.objects.filter(product=self.product).order_by('shard').values_list('count', flat=True))
+
+    def test_stock_sharded(self):
+        """Test the stock is spread over the shards and still shown in total."""
+        res = self.client.get(f'/api/products/user/{self.product.id}/')
+        self.product.refresh_from_db()
+
+        self.assertEqual(self.shards(), [3, 3, 2, 2])
+        self.assertEqual(self.product.countInStock, 0)
+        self.assertEqual(self.product.stock, 10)
+        self.assertEqual(res.data['countInStock'], 10)
+
+    def test_order_decrements_one_shard(self):
+        """Test an order takes its quantity from a single shard."""
+        res = self.client.post(CREATE_ORDER_URL, self.order(2), format='json')
+        res_product = self.client.get(f'/api/products/user/{self.product.id}/')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        taken = [before - after for before, after in zip([3, 3, 2, 2], self.shards()) if before != after]
+        self.assertEqual(taken, [2])
+        self.assertEqual(res_product.data['countInStock'], 8)
+        self.assertWithinQueryBudget(res)
+
+    def test_order_across_shards(self):
+        """Test an order larger than any shard takes from several."""
+        res = self.client.post(CREATE_ORDER_URL, self.order(9), format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(sum(self.shards()), 1)
+        self.assertWithinQueryBudget(res)
+
+    def test_order_out_of_stock(self):
+        """Test an order larger than the stock of all shards is rejected."""
+        res = self.client.post(CREATE_ORDER_URL, self.order(11), format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data['detail'], f'{self.product.name} is out of stock.')
+        self.assertEqual(self.shards(), [3, 3, 2, 2])
+        self.assertFalse(Order.objects.exists())
+        self.assertWithinQueryBudget(res)
+
+    def test_order_modifies_product(self):
+        """Test orders change the ETags of the product and of the list along with the stock."""
+        url = f'/api/products/user/{self.product.id}/'
+        etag = self.client.get(url)['ETag']
+        list_etag = self.client.get('/api/products/user/')['ETag']
+
+        place_order(self.user, self.order(1))
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        res_list = self.client.get('/api/products/user/', HTTP_IF_NONE_MATCH=list_etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['countInStock'], 9)
+        self.assertNotIn('Last-Modified', res)
+        self.assertEqual(res_list.status_code, status.HTTP_200_OK)
+
+    def test_unshard(self):
+        """Test unsharding moves the stock left back to the product."""
+        place_order(self.user, self.order(3))
+        shard_stock(self.product.id, 0)
+        self.product.refresh_from_db()
+
+        self.assertEqual(self.product.countInStock, 7)
+        self.assertEqual(self.product.stockShards, 0)
+        self.assertEqual(self.shards(), [])
+
+
+class OrderConditionalGetTests(TestCase):
+    """Test order reads answer 304 while the orders are unchanged."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user({'username': 'test@mail.com', 'email': 'test@mail.com', 'password': 'password123'})
+        self.client.force_authenticate(self.user)
+        product = create_product(self.user)
+        self.order = place_order(self.user, {
+            'orderItems': [{'product': product.id, 'price': '5.50', 'qty': 1}],
+            'shippingAddress': {'address': 'Ocean Street', 'city': 'Key West, FL', 'zipCode': '00001'},
+            'paymentMethod': 'PayPal',
+            'shippingPrice': '10.00',
+            'totalPrice': '15.50',
+        })
+
+    def assertNotModified(self, url, etag):
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b'')
+
+    def test_order_not_modified(self):
+        """Test an unchanged order answers 304 with private headers."""
+        url = get_user_order_by_order_id(self.order.id)
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('private', res['Cache-Control'])
+        self.assertIn('no-cache', res['Cache-Control'])
+        self.assertIn('Last-Modified', res)
+        self.assertNotModified(url, res['ETag'])
+
+    def test_order_not_modified_without_serializing(self):
+        """Test a 304 only reads the validators."""
+        url = get_user_order_by_order_id(self.order.id)
+        etag = self.client.get(url)['ETag']
+
+        with self.assertNumQueries(1):
+            self.assertNotModified(url, etag)
+
+    def test_paid_order_modified(self):
+        """Test paying an order changes its ETag."""
+        url = get_user_order_by_order_id(self.order.id)
+        etag = self.client.get(url)['ETag']
+        self.client.put(pay_order_url(self.order.id))
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.data['isPaid'])
+
+    def test_user_edit_modifies_orders(self):
+        """Test orders embedding a renamed user are sent again."""
+        url = get_user_order_by_order_id(self.order.id)
+        etag = self.client.get(url)['ETag']
+        self.user.first_name = 'Renamed'
+        self.user.save()
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['user']['name'], 'Renamed')
+
+    def test_other_user_order_unauthorized(self):
+        """Test validators of someone else's order are never confirmed."""
+        url = get_user_order_by_order_id(self.order.id)
+        etag = self.client.get(url)['ETag']
+        other = create_user({'username': 'other@mail.com', 'email': 'other@mail.com', 'password': 'password123'})
+        self.client.force_authenticate(other)
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_my_orders_not_modified(self):
+        """Test the user's order list answers 304 until an order is added."""
+        etag = self.client.get(GET_USER_ORDERS)['ETag']
+        self.assertNotModified(GET_USER_ORDERS, etag)
+
+        place_order(self.user, {
+            'orderItems': [{'product': self.order.orderitem_set.get().product_id, 'price': '5.50', 'qty': 1}],
+            'shippingAddress': {'address': 'Ocean Street', 'city': 'Key West, FL', 'zipCode': '00001'},
+            'paymentMethod': 'PayPal',
+            'shippingPrice': '10.00',
+            'totalPrice': '15.50',
+        })
+        res = self.client.get(GET_USER_ORDERS, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 2)
+
+    def test_my_orders_modified_by_bulk_update(self):
+        """Test orders marked paid in bulk change the user's order list ETag."""
+        etag = self.client.get(GET_USER_ORDERS)['ETag']
+        mark_orders([self.order.id], 'isPaid', 'paidAt')
+        res = self.client.get(GET_USER_ORDERS, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.data[0]['isPaid'])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Needs concurrent connections.')
+class CheckoutStressTests(TransactionTestCase):
+    """Test concurrent checkouts of the same products."""
+
+    def test_concurrent_orders_no_overselling(self):
+        """Test more buyers than items in stock never oversell."""
+        user = User.objects.create(username='buyer@mail.com', email='buyer@mail.com')
+        product = create_product(user)
+        order = {
+            'orderItems': [{'product': product.id, 'price': '5.50', 'qty': 1}],
+            'shippingAddress': {'address': 'Ocean Street', 'city': 'Key West, FL', 'zipCode': '00001'},
+            'paymentMethod': 'PayPal',
+            'shippingPrice': '10.00',
+            'totalPrice': '15.50',
+        }
+        results = []
+
+        def checkout():
+            client = APIClient()
+            client.force_authenticate(user)
+            for _ in range(3):
+                results.append(client.post(CREATE_ORDER_URL, order, format='json').status_code)
+            connection.close()
+
+        threads = [Thread(target=checkout) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        product.refresh_from_db()
+
+        self.assertEqual(results.count(status.HTTP_200_OK), 10)
+        self.assertEqual(results.count(status.HTTP_400_BAD_REQUEST), 14)
+        self.assertEqual(product.countInStock, 0)
+        self.assertEqual(OrderItem.objects.filter(product=product).count(), 10)
+
+    def test_concurrent_orders_sharded_no_overselling(self):
+        """Test buyers of a sharded product never oversell, even as shards run out."""
+        user = User.objects.create(username='buyer@mail.com', email='buyer@mail.com')
+        product = create_product(user)
+        shard_stock(product.id, 4)
+        order = {
+            'orderItems': [{'product': product.id, 'price': '5.50', 'qty': 1}],
+            'shippingAddress': {'address': 'Ocean Street', 'city': 'Key West, FL', 'zipCode': '00001'},
+            'paymentMethod': 'PayPal',
+            'shippingPrice': '10.00',
+            'totalPrice': '15.50',
+        }
+        results = []
+
+        def checkout():
+            for _ in range(3):
+                try:
+                    place_order(user, order)
+                    results.append(True)
+                except CheckoutError:
+                    results.append(False)
+            connection.close()
+
+        threads = [Thread(target=checkout) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count(True), 10)
+        self.assertEqual(Product.objects.get(id=product.id).stock, 0)
+        self.assertEqual(OrderItem.objects.filter(product=product).count(), 10)
+
+
+class AsyncOrderTests(TestCase):
+    """Test the async order views answer like the sync ones."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.factory = AsyncRequestFactory()
+        self.user = create_user({'username': 'test@mail.com', 'email': 'test@mail.com', 'password': 'password123'})
+        self.client.force_authenticate(self.user)
+        self.other = create_user({'username': 'other@mail.com', 'email': 'other@mail.com', 'password': 'password123'})
+        product = create_product(self.user)
+        self.order = place_order(self.user, {
+            'orderItems': [{'product': product.id, 'price': '5.50', 'qty': 1}],
+            'shippingAddress': {'address': 'Ocean Street', 'city': 'Key West, FL', 'zipCode': '00001'},
+            'paymentMethod': 'PayPal',
+            'shippingPrice': '10.00',
+            'totalPrice': '15.50',
+        })
+        self.token = self.get_token('test@mail.com')
+
+    def get_token(self, username):
+        res = self.client.post(TOKEN_URL, {'username': username, 'password': 'password123'})
+        return f'Bearer {res.data["token"]}'
+
+    def get(self, path, token, **headers):
+        return self.factory.get(path, headers={'Authorization': token, **headers})
+
+    async def assertSameResponse(self, path, response):
+        expected = await sync_to_async(self.client.get)(path)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.content, expected.content)
+        self.assertEqual(response['ETag'], expected['ETag'])
+
+    async def test_my_orders(self):
+        """Test the async view lists the user's orders like the sync one."""
+        response = await async_views.getMyOrders(self.get(GET_USER_ORDERS, self.token))
+        await self.assertSameResponse(GET_USER_ORDERS, response)
+
+        not_modified = await async_views.getMyOrders(
+            self.get(GET_USER_ORDERS, self.token, **{'If-None-Match': response['ETag']}),
+        )
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    async def test_order_by_id(self):
+        """Test the async view returns the order like the sync one."""
+        path = get_user_order_by_order_id(self.order.id)
+        response = await async_views.getOrderById(self.get(path, self.token), str(self.order.id))
+        await self.assertSameResponse(path, response)
+        self.assertIn('Last-Modified', response)
+
+    async def test_order_of_other_user(self):
+        """Test the async view refuses orders of other users."""
+        token = await sync_to_async(self.get_token)('other@mail.com')
+        path = get_user_order_by_order_id(self.order.id)
+        response = await async_views.getOrderById(self.get(path, token), str(self.order.id))
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        missing = await async_views.getOrderById(self.get(path, token), '0')
+        self.assertEqual(missing.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_unauthenticated(self):
+        """Test the async views require a valid access token, with the errors of the sync views."""
+        for token in ('', 'Bearer invalid'):
+            response = await async_views.getMyOrders(self.get(GET_USER_ORDERS, token))
+            expected = await sync_to_async(APIClient().get)(GET_USER_ORDERS, HTTP_AUTHORIZATION=token)
+
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+            self.assertEqual(response['WWW-Authenticate'], 'Bearer realm="api"')
+            self.assertEqual(json.loads(response.content), expected.json())
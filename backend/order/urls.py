@@ -1,8 +1,10 @@
 """
 URL mapping for order app.
 """
+from django.conf import settings
 from django.urls import path
 
+from order import async_views
 from order.views import *
 
 app_name = 'order'
@@ -10,8 +12,11 @@ app_name = 'order'
 urlpatterns = [
     path('', getOrders, name='orders'),
     path('add/', addOrdersItems, name='orders-add'),
-    path('myorders/', getMyOrders, name='myorders'),
+    path('myorders/', async_views.getMyOrders if settings.ASYNC_VIEWS else getMyOrders, name='myorders'),
+    path('stream/', streamOrders, name='orders-stream'),
+    path('pay/', updateOrdersToPaid, name='orders-pay'),
+    path('deliver/', updateOrdersToDelivered, name='orders-deliver'),
     path('<str:pk>/deliver/', updateOrderToDelivered, name='order-delivered'),
-    path('<str:pk>/', getOrderById, name='user-order'),
+    path('<str:pk>/', async_views.getOrderById if settings.ASYNC_VIEWS else getOrderById, name='user-order'),
     path('<str:pk>/pay/', updateOrderToPaid, name='pay'),
 ]
\ No newline at end of file
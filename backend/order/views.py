@@ -9,70 +9,69 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 
+from core.conditional import conditional, make_etag
+from core.db.routers import replica_reads
 from core.models import Product, Order, OrderItem, ShippingAddress
+from core.queries import query_budget
+from core.renderers import json_dumps
 from product.serializers import ProductSerializer
 from .serializers import *
+from .cache import orders_etag, user_orders_etag
+from .bulk import BulkOrderError, get_order_ids, mark_orders
+from .checkout import CheckoutError, place_order
 
 from rest_framework import status
 from datetime import datetime
 
+from django.conf import settings
+from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.http import StreamingHttpResponse
 
+
+def checkout_budget(request):
+    """
+    The user, products, order, address, items and their serialization in
+    a savepoint, then up to 8 queries per cart line for sharded stock:
+    two attempts in savepoints and the locking fallback of
+    product.stock.reserve().
+    """
+    try:
+        lines = len(request.data['orderItems'])
+    except (KeyError, TypeError):
+        lines = 0
+    return 9 + 8 * lines
+
+
+@query_budget(checkout_budget)
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def addOrdersItems(request):
-    user = request.user
-    data = request.data
-
     try:
-        orderItems = data['orderItems']
-        if not orderItems or not len(orderItems):
-            raise
-
-        order = Order.objects.create(
-            user=user,
-            paymentMethod=data['paymentMethod'],
-            shippingPrice=data['shippingPrice'],
-            totalPrice=data['totalPrice']
-        )
-
-        ShippingAddress.objects.create(
-            order=order,
-            address=data['shippingAddress']['address'],
-            city=data['shippingAddress']['city'],
-            zipCode=data['shippingAddress']['zipCode'],
-        )
-
-        for item in orderItems:
-            product=Product.objects.get(id=item['product'])
-            image = product.image.url if product.image else ''
-
-            orderItem = OrderItem.objects.create(
-                product=product,
-                order=order,
-                name=product.name,
-                qty=item['qty'],
-                price=item['price'],
-                image=image,
-            )
-
-            product.countInStock -= orderItem.qty
-            product.save()
-
-        serializer = OrderSerializer(order, many=False)
-        return Response(serializer.data)
-    except:
-        return Response({'detail':'No order items'}, status=status.HTTP_400_BAD_REQUEST)
+        order = place_order(request.user, request.data)
+    except CheckoutError as error:
+        return Response({'detail': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+    serializer = OrderSerializer(order, many=False)
+    return Response(serializer.data)
 
 
+# The user's digest when not cached, orders and items.
+@query_budget(3)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@replica_reads
 def getMyOrders(request):
     user = request.user
-    orders = user.order_set.all()
-    serializer = OrderSerializer(orders, many=True)
-    return Response(serializer.data)
+    orders = user.order_set.with_details()
+    return conditional(
+        request,
+        lambda: Response(serialize_order.many(orders)),
+        user_orders_etag(user.id),
+    )
 
 
+# The user's digest when not cached, the validators, order and items.
+@query_budget(4)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def getOrderById(request, pk):
@@ -80,16 +79,28 @@ def getOrderById(request, pk):
     user = request.user
 
     try:
-        order = Order.objects.get(id=pk)
-        if user.is_staff or order.user == user:
-            serializer = OrderSerializer(order, many=False)
-            return Response(serializer.data)
-        else:
-            return Response({'detail': 'Not authorized to view.'}, status=status.HTTP_400_BAD_REQUEST)
+        # Only the validators are read until the client's copy is stale.
+        state = Order.objects.values('user_id', 'updatedAt').get(id=pk)
     except:
         return Response({'detail':'Order does not exists'}, status=status.HTTP_400_BAD_REQUEST)
 
+    if not (user.is_staff or state['user_id'] == user.id):
+        return Response({'detail': 'Not authorized to view.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    def render():
+        order = Order.objects.with_details().get(id=pk)
+        return Response(serialize_order(order))
 
+    return conditional(
+        request,
+        render,
+        make_etag('order', pk, state['updatedAt']),
+        state['updatedAt'],
+    )
+
+
+# The user, the order and its update.
+@query_budget(3)
 @api_view(['PUT'])
 @permission_classes([IsAuthenticated])
 def updateOrderToPaid(request, pk):
@@ -102,14 +113,89 @@ def updateOrderToPaid(request, pk):
     return Response('Order has been paid')
 
 
+def get_bool_param(request, name):
+    """Return a true/false query parameter as a bool or None."""
+    value = request.query_params.get(name, '').lower()
+    if value in ('true', '1'):
+        return True
+    if value in ('false', '0'):
+        return False
+    return None
+
+
+def filter_orders(request):
+    """Return orders filtered by the isPaid, isDelivered and user parameters."""
+    orders = Order.objects.with_details().order_by('-createdAt', '-id')
+    for field in ('isPaid', 'isDelivered'):
+        value = get_bool_param(request, field)
+        if value is not None:
+            orders = orders.filter(**{field: value})
+
+    user_id = request.query_params.get('user')
+    if user_id and user_id.isdigit():
+        orders = orders.filter(user__id=user_id)
+
+    return orders
+
+
+# The user's digest when not cached, the count of a page, orders and items.
+@query_budget(4)
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
+@replica_reads
 def getOrders(request):
-    orders = Order.objects.all()
-    serializer = OrderSerializer(orders, many=True)
-    return Response(serializer.data)
+    """List the filtered orders."""
+    orders = filter_orders(request)
+    return conditional(
+        request,
+        lambda: render_orders(request, orders),
+        orders_etag(),
+    )
+
+
+def render_orders(request, orders):
+    """Serialize the orders, paginated when a page is requested."""
+    page = request.query_params.get('page')
+    if page is None:
+        return Response(serialize_order.many(orders))
+
+    try:
+        page_size = int(request.query_params.get('page_size', settings.ORDERS_PAGE_SIZE))
+    except ValueError:
+        page_size = settings.ORDERS_PAGE_SIZE
+    page_size = max(1, min(page_size, settings.ORDERS_MAX_PAGE_SIZE))
+    paginator = Paginator(orders, page_size)
+
+    try:
+        orders = paginator.page(page)
+    except PageNotAnInteger:
+        orders = paginator.page(1)
+    except EmptyPage:
+        orders = paginator.page(paginator.num_pages)
+
+    return Response({
+            'orders': serialize_order.many(orders),
+            'page': orders.number,
+            'pages': paginator.num_pages,
+        })
+
+
+# No budget, the export reads the items of every chunk of orders.
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def streamOrders(request):
+    """Export the filtered orders as newline delimited JSON."""
+    orders = filter_orders(request)
+
+    def lines():
+        for order in orders.iterator(chunk_size=settings.ORDERS_STREAM_CHUNK_SIZE):
+            yield json_dumps(serialize_order(order)) + b'\n'
+
+    return StreamingHttpResponse(lines(), content_type='application/x-ndjson')
 
 
+# The user, the order and its update.
+@query_budget(3)
 @api_view(['PUT'])
 @permission_classes([IsAdminUser])
 def updateOrderToDelivered(request, pk):
@@ -119,4 +205,30 @@ def updateOrderToDelivered(request, pk):
     order.deliveredAt = datetime.now()
     order.save()
 
-    return Response('Order has been delivered')
\ No newline at end of file
+    return Response('Order has been delivered')
+
+def markOrders(request, flag, timestamp):
+    try:
+        ids = get_order_ids(request.data)
+    except BulkOrderError as error:
+        return Response({'detail': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(mark_orders(ids, flag, timestamp))
+
+
+# The user, then the orders locked and updated in a savepoint.
+@query_budget(5)
+@api_view(['PUT'])
+@permission_classes([IsAdminUser])
+def updateOrdersToPaid(request):
+    """Mark the orders of `ids` paid, with the result of each."""
+    return markOrders(request, 'isPaid', 'paidAt')
+
+
+# As updateOrdersToPaid().
+@query_budget(5)
+@api_view(['PUT'])
+@permission_classes([IsAdminUser])
+def updateOrdersToDelivered(request):
+    """Mark the orders of `ids` delivered, with the result of each."""
+    return markOrders(request, 'isDelivered', 'deliveredAt')
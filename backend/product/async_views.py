@@ -0,0 +1,58 @@
+"""
+Async views of the public catalog, served when ASYNC_VIEWS is enabled.
+
+Validators and payloads are built by the same helpers as the sync views.
+"""
+from asgiref.sync import sync_to_async
+from rest_framework import status
+
+from core.asynchronous import api_response, async_api_view
+from core.conditional import aconditional, versions_etag
+from core.db.routers import replica_reads
+from core.models import Product
+from core.queries import query_budget
+from product.cache import LIST_VERSION_KEY
+from product.views import get_product, get_top_products, list_products, product_etag, top_etag
+
+
+# As the sync views, see product/views.py.
+@query_budget(4)
+@async_api_view(['GET'])
+@replica_reads
+async def product_list(request):
+    etag = await sync_to_async(versions_etag)([LIST_VERSION_KEY], 'products')
+
+    async def render():
+        # Pagination and search are sync, run them in a worker thread.
+        data = await sync_to_async(list_products)(Product.objects.with_reviews(), request.GET)
+        return api_response(request, data)
+
+    return await aconditional(request, render, etag, public=True)
+
+
+# As the sync views, see product/views.py.
+@query_budget(2)
+@async_api_view(['GET'])
+async def product_detail(request, pk):
+    try:
+        data = await sync_to_async(get_product)(pk)
+    except Product.DoesNotExist:
+        message = {'detail': 'Product doesn\'t exist!'}
+        return api_response(request, message, status.HTTP_400_BAD_REQUEST)
+
+    async def render():
+        return api_response(request, data)
+
+    return await aconditional(request, render, product_etag(data), public=True)
+
+
+# As the sync views, see product/views.py.
+@query_budget(3)
+@async_api_view(['GET'])
+async def top_products(request):
+    products = await sync_to_async(get_top_products)(request.GET.get('category') or None)
+
+    async def render():
+        return api_response(request, products)
+
+    return await aconditional(request, render, top_etag(products), public=True)
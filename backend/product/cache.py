@@ -0,0 +1,80 @@
+"""
+Read-through cache for product payloads.
+
+Entries are keyed by a version stamp, invalidating a product bumps its
+version instead of deleting keys, see core.versions. It also bumps
+LIST_VERSION_KEY, which validates the product lists.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from core.metrics import count_cache
+from core.versions import bump_versions, get_version, get_versions
+
+STATS_KEYS = {True: 'products:cache:hits', False: 'products:cache:misses'}
+LIST_VERSION_KEY = 'products:version'
+
+
+def _version_key(pk):
+    return f'product:{pk}:version'
+
+
+def _record(hit, count=1):
+    count_cache('products', hit, count)
+    key = STATS_KEYS[hit]
+    if count and not cache.add(key, count, None):
+        try:
+            cache.incr(key, count)
+        except ValueError:
+            cache.set(key, count, None)
+
+
+def get_product(pk, loader):
+    """Return the cached payload of one product, loading it on a miss."""
+    key = f'product:{pk}:v{get_version(_version_key(pk))}'
+    data = cache.get(key)
+    _record(data is not None)
+    if data is None:
+        data = loader()
+        cache.set(key, data, settings.PRODUCT_CACHE_TIMEOUT)
+    return data
+
+
+def get_products(pks, loader):
+    """
+    Return the cached payloads of several products in order.
+
+    `loader` receives the ids missing from the cache and returns their
+    payloads, products that no longer exist are left out.
+    """
+    version_keys = {pk: _version_key(pk) for pk in pks}
+    versions = get_versions(list(version_keys.values()))
+    keys = {pk: f'product:{pk}:v{versions[key]}' for pk, key in version_keys.items()}
+
+    found = cache.get_many(keys.values())
+    missing = [pk for pk in pks if keys[pk] not in found]
+    _record(True, len(pks) - len(missing))
+    _record(False, len(missing))
+    if missing:
+        loaded = {keys[item['id']]: item for item in loader(missing)}
+        cache.set_many(loaded, settings.PRODUCT_CACHE_TIMEOUT)
+        found.update(loaded)
+
+    return [found[keys[pk]] for pk in pks if keys[pk] in found]
+
+
+def invalidate_products(*pks):
+    """Invalidate products now and again when the transaction commits."""
+    bump_versions(LIST_VERSION_KEY, *[_version_key(pk) for pk in pks])
+
+
+def stats():
+    """Return the cache hit and miss counters."""
+    hits = cache.get(STATS_KEYS[True], 0)
+    misses = cache.get(STATS_KEYS[False], 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'ratio': hits / total if total else 0,
+    }
@@ -0,0 +1,263 @@
+"""
+Stream the catalog, products and their reviews, in and out as JSON Lines
+or CSV.
+
+Rows are read, validated and written in batches of upserts, so memory
+stays bounded whatever the size of the file. Products are matched by
+`id`, rows without one are created. Reviews are matched by product and
+user, the user given by username. The rating aggregates of the products
+are recomputed from their reviews, they aren't imported.
+"""
+import csv
+import json
+from itertools import islice
+
+import orjson
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from core.models import REVIEW_STARS, Product, Review
+from product import leaderboard, stock
+from product.cache import invalidate_products
+
+FORMATS = ('jsonl', 'csv')
+PRODUCT_FIELDS = ['id', 'name', 'image', 'brand', 'category', 'description', 'price', 'countInStock', 'active']
+REVIEW_FIELDS = ['product', 'user', 'name', 'rating', 'comment']
+
+
+def get_format(path, format=None):
+    """Return the format given or the one of the file extension."""
+    if format:
+        return format
+    return 'csv' if str(path).lower().endswith('.csv') else 'jsonl'
+
+
+def read_rows(file, format):
+    """
+    Yield (line, row) pairs of a file, row is the ValueError of lines
+    that can't be parsed. Empty CSV cells are read as None.
+    """
+    if format == 'csv':
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, {name: value if value != '' else None for name, value in row.items()}
+        return
+
+    for number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            yield number, error
+            continue
+        yield number, row if isinstance(row, dict) else ValueError('Expected an object.')
+
+
+def write_rows(file, format, fields, rows):
+    """Write dict rows with `fields`, return the number written."""
+    written = 0
+    if format == 'csv':
+        writer = csv.DictWriter(file, fields, lineterminator='\n')
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            written += 1
+        return written
+
+    for row in rows:
+        # Decimals as strings, like the fixtures, keep prices exact.
+        file.write(orjson.dumps(row, default=str).decode() + '\n')
+        written += 1
+    return written
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def describe(error):
+    """Return a one line message of a validation error."""
+    if isinstance(error, ValidationError) and hasattr(error, 'error_dict'):
+        return '; '.join(f'{field}: {" ".join(messages)}' for field, messages in error.message_dict.items())
+    if isinstance(error, ValidationError):
+        return ' '.join(error.messages)
+    return str(error)
+
+
+def check_fields(row, fields):
+    if isinstance(row, Exception):
+        raise row
+    unknown = set(row) - set(fields)
+    if unknown:
+        raise ValueError(f'Unknown fields: {", ".join(sorted(unknown))}.')
+
+
+def build_product(row, user):
+    check_fields(row, PRODUCT_FIELDS)
+    product = Product(user=user, **row)
+    product.clean_fields(exclude=[field.name for field in Product._meta.fields if field.name not in row])
+    return product
+
+
+def import_products(rows, batch_size, on_error, user=None):
+    """
+    Upsert products from (line, row) pairs, return the number written.
+
+    Existing products only get the fields of their row updated. Invalid
+    rows are passed to on_error(line, message) and skipped.
+    """
+    written = 0
+    for batch in batches(rows, batch_size):
+        # Rows with the same fields are written together, a row
+        # repeating an id replaces the earlier one.
+        upserts, creates = {}, []
+        for number, row in batch:
+            try:
+                product = build_product(row, user)
+            except (ValidationError, ValueError, TypeError) as error:
+                on_error(number, describe(error))
+                continue
+            if product.id is None:
+                creates.append(product)
+            else:
+                upserts.setdefault(frozenset(row) - {'id'}, {})[product.id] = product
+
+        for fields, products in upserts.items():
+            write_products(list(products.values()), [name for name in PRODUCT_FIELDS if name in fields])
+            written += len(products)
+        if creates:
+            # Past the ids just written, or a new row could take one of
+            # them and its upsert would overwrite that product.
+            reset_sequences(Product)
+            Product.objects.bulk_create(creates)
+            written += len(creates)
+    reset_sequences(Product)
+    return written
+
+
+def write_products(products, fields):
+    pks = [product.id for product in products if product.id is not None]
+    with transaction.atomic():
+        Product.objects.bulk_create(
+            products,
+            update_conflicts=True,
+            unique_fields=['id'],
+            # The owner of existing products is kept.
+            update_fields=fields + ['updatedAt'],
+        )
+        if 'countInStock' in fields:
+            # Sharded products keep their stock in the shards.
+            counts = {product.id: product.countInStock for product in products}
+            sharded = list(Product.objects.filter(id__in=pks, stockShards__gt=0).values_list('id', flat=True))
+            for pk in sharded:
+                stock.set_stock(pk, counts[pk])
+            Product.objects.filter(id__in=sharded).update(countInStock=0)
+        invalidate_products(*pks)
+        leaderboard.invalidate()
+
+
+def build_review(row, products, users):
+    check_fields(row, REVIEW_FIELDS)
+    row = dict(row)
+    product, username = row.pop('product', None), row.pop('user', None)
+    try:
+        product_id = int(product)
+    except (TypeError, ValueError):
+        raise ValueError(f'Invalid product {product}.')
+    if product_id not in products:
+        raise ValueError(f'Product {product} doesn\'t exist.')
+    if username not in users:
+        raise ValueError(f'User {username} doesn\'t exist.')
+
+    review = Review(product_id=product_id, user_id=users[username], **row)
+    review.clean_fields(exclude=[field.name for field in Review._meta.fields if field.name not in row])
+    if review.rating not in REVIEW_STARS:
+        raise ValidationError({'rating': [f'Must be one of {REVIEW_STARS.start}-{REVIEW_STARS.stop - 1}.']})
+    return review
+
+
+def import_reviews(rows, batch_size, on_error):
+    """
+    Upsert reviews from (line, row) pairs, return the number written.
+
+    Invalid rows are passed to on_error(line, message) and skipped.
+    """
+    written = 0
+    for batch in batches(rows, batch_size):
+        fields = [row for _, row in batch if isinstance(row, dict)]
+        products = set(Product.objects.filter(
+            id__in=[row['product'] for row in fields if str(row.get('product')).isdigit()],
+        ).values_list('id', flat=True))
+        users = dict(User.objects.filter(
+            username__in=[row['user'] for row in fields if isinstance(row.get('user'), str)],
+        ).values_list('username', 'id'))
+
+        reviews = {}
+        for number, row in batch:
+            try:
+                review = build_review(row, products, users)
+            except (ValidationError, ValueError, TypeError) as error:
+                on_error(number, describe(error))
+                continue
+            reviews[review.product_id, review.user_id] = review
+
+        if reviews:
+            write_reviews(list(reviews.values()))
+            written += len(reviews)
+    reset_sequences(Review)
+    return written
+
+
+def write_reviews(reviews):
+    pks = list({review.product_id for review in reviews})
+    with transaction.atomic():
+        Review.objects.bulk_create(
+            reviews,
+            update_conflicts=True,
+            unique_fields=['product', 'user'],
+            update_fields=['name', 'rating', 'comment', 'updatedAt'],
+        )
+        Product.objects.filter(id__in=pks).recount_ratings()
+        invalidate_products(*pks)
+        leaderboard.invalidate()
+
+
+def reset_sequences(model):
+    """Move the id sequence past ids inserted explicitly."""
+    statements = connection.ops.sequence_reset_sql(no_style(), [model])
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def export_products(file, format, batch_size):
+    """Write all products, return the number written."""
+    rows = Product.objects.with_stock().order_by('id') \
+        .values(*PRODUCT_FIELDS, 'shardedStock').iterator(chunk_size=batch_size)
+    return write_rows(file, format, PRODUCT_FIELDS, with_sharded_stock(rows))
+
+
+def with_sharded_stock(rows):
+    """Replace the stock of sharded products with the sum of their shards."""
+    for row in rows:
+        sharded = row.pop('shardedStock')
+        if sharded is not None:
+            row['countInStock'] = sharded
+        yield row
+
+
+def export_reviews(file, format, batch_size):
+    """Write the reviews of products by users, return the number written."""
+    rows = (
+        Review.objects.filter(product__isnull=False, user__isnull=False)
+        .order_by('id')
+        .values_list('product_id', 'user__username', 'name', 'rating', 'comment')
+        .iterator(chunk_size=batch_size)
+    )
+    return write_rows(file, format, REVIEW_FIELDS, (dict(zip(REVIEW_FIELDS, row)) for row in rows))
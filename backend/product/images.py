@@ -0,0 +1,119 @@
+"""
+Resized variants of the product images.
+
+Uploads are stored as-is and a worker pool then writes a fixed-size
+thumbnail plus WebP and JPEG copies at PRODUCT_IMAGE_WIDTHS next to the
+original. Product.imageVariants holds the storage names.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models.functions import Now
+
+from core.models import Product
+from .cache import invalidate_products
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+
+_executor = None
+
+
+def get_executor():
+    """Return the worker pool, created on first use in each process."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.PRODUCT_IMAGE_WORKERS,
+            thread_name_prefix='product-images',
+        )
+    return _executor
+
+
+def _save(image, name, kind):
+    buffer = BytesIO()
+    image.save(buffer, FORMATS[kind], quality=settings.PRODUCT_IMAGE_QUALITY, optimize=True)
+    return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def get_widths(width):
+    """Return the variant widths of an image, never upscaling it."""
+    return [w for w in settings.PRODUCT_IMAGE_WIDTHS if w < width] or [width]
+
+
+def create_variants(name):
+    """Write the variants of a stored image and return their names."""
+    stem = os.path.splitext(name)[0]
+    with default_storage.open(name) as image_file:
+        image = Image.open(image_file)
+        image = ImageOps.exif_transpose(image).convert('RGB')
+
+    thumbnail = ImageOps.fit(image, settings.PRODUCT_THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+    variants = {'thumbnail': {}}
+    for kind in FORMATS:
+        variants['thumbnail'][kind] = _save(thumbnail, f'{stem}/thumbnail.{kind}', kind)
+        variants[kind] = {}
+
+    for width in get_widths(image.width):
+        height = round(image.height * width / image.width)
+        resized = image.resize((width, height), Image.Resampling.LANCZOS)
+        for kind in FORMATS:
+            variants[kind][str(width)] = _save(resized, f'{stem}/{width}w.{kind}', kind)
+
+    return variants
+
+
+def variant_names(variants):
+    """Return every storage name of a variants dict."""
+    return [name for sizes in (variants or {}).values() for name in sizes.values()]
+
+
+def delete_variants(variants):
+    """Delete the stored files of a variants dict."""
+    for name in variant_names(variants):
+        default_storage.delete(name)
+
+
+def process_product_image(pk):
+    """Replace the variants of a product with ones of its current image."""
+    product = Product.objects.filter(id=pk).values('image', 'imageVariants').first()
+    if product is None:
+        return
+
+    variants = create_variants(product['image']) if product['image'] else {}
+    # Only store them if the image wasn't replaced in the meantime.
+    updated = Product.objects \
+        .filter(id=pk, image=product['image']) \
+        .update(imageVariants=variants, updatedAt=Now())
+    if not updated:
+        delete_variants(variants)
+        return
+
+    delete_variants(product['imageVariants'])
+    invalidate_products(pk)
+
+
+def _run(pk):
+    try:
+        process_product_image(pk)
+    except Exception:
+        logger.exception('Creating image variants of product %s failed.', pk)
+    finally:
+        connection.close()
+
+
+def schedule_variants(pk):
+    """Create the image variants of a product once the upload commits."""
+    if settings.PRODUCT_IMAGE_ASYNC:
+        transaction.on_commit(lambda: get_executor().submit(_run, pk))
+    else:
+        transaction.on_commit(lambda: process_product_image(pk))
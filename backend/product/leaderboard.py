@@ -0,0 +1,70 @@
+"""
+Top rated products, rebuilt as ratings and active flags change.
+
+Every board caches the ids of the best TOP_PRODUCTS_COUNT products of the
+catalog or of one category. Changes bump the version of the boards
+instead of editing them in place, so workers updating the boards at once
+can't lose each other's changes and a board built from rows read before
+a change is never served after it (core.versions).
+
+A missing board is rebuilt by one worker at a time, holding a lock in
+the cache. The others serve the previous board meanwhile, or read the
+database when there is none.
+"""
+import hashlib
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+
+from core.metrics import count_cache
+from core.models import Product
+from core.versions import bump_versions, get_version
+
+VERSION_KEY = 'products:top:version'
+
+
+def _board_key(category):
+    if category is None:
+        return 'products:top:*'
+    return 'products:top:c:' + hashlib.md5(category.encode()).hexdigest()
+
+
+def _build(category):
+    # Sorted by the expression of the (active, rating, id) index, the
+    # minimum rating already leaves out products without one.
+    products = Product.objects.filter(active=True) \
+        .annotate(score=Coalesce('rating', Value(Decimal('0')))) \
+        .filter(score__gte=settings.TOP_PRODUCTS_MIN_RATING)
+    if category is not None:
+        products = products.filter(category=category)
+    return list(products.order_by('-score', '-id').values_list('id', flat=True)[:settings.TOP_PRODUCTS_COUNT])
+
+
+def top(category=None):
+    """Return the ids of the top rated products, best first."""
+    key = _board_key(category)
+    version = f'{key}:v{get_version(VERSION_KEY)}'
+    pks = cache.get(version)
+    count_cache('leaderboard', pks is not None)
+    if pks is not None:
+        return pks
+
+    lock = f'{version}:lock'
+    if not cache.add(lock, True, settings.LEADERBOARD_LOCK_TIMEOUT):
+        previous = cache.get(key)
+        return previous if previous is not None else _build(category)
+
+    try:
+        pks = _build(category)
+        cache.set_many({version: pks, key: pks}, settings.LEADERBOARD_TIMEOUT)
+    finally:
+        cache.delete(lock)
+    return pks
+
+
+def invalidate():
+    """Rebuild the boards on their next read, now and when the transaction commits."""
+    bump_versions(VERSION_KEY)
@@ -0,0 +1,180 @@
+"""
+Pagination for the public product list.
+"""
+import base64
+import binascii
+import hashlib
+import json
+import math
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+# Orderings usable for keyset pagination, newest or best rated first.
+# Every key is backed by an (active, key, id) index on core_product.
+KEYSET_ORDERINGS = {
+    'createdAt': (F('createdAt'), parse_datetime),
+    'rating': (
+        Coalesce('rating', Value(Decimal('0'))),
+        Decimal,
+    ),
+}
+# Keyset pages without an ordering, the page numbered list keeps the
+# order of ids unless one is given.
+DEFAULT_ORDERING = 'createdAt'
+
+
+def get_page_size(params):
+    """Return the requested page size, capped by the settings."""
+    try:
+        page_size = int(params.get('page_size', settings.PRODUCTS_PAGE_SIZE))
+    except ValueError:
+        page_size = settings.PRODUCTS_PAGE_SIZE
+
+    return max(1, min(page_size, settings.PRODUCTS_MAX_PAGE_SIZE))
+
+
+def get_ordering(params, default=None):
+    """Return the requested keyset ordering, else `default`."""
+    ordering = params.get('ordering')
+    return ordering if ordering in KEYSET_ORDERINGS else default
+
+
+def order_products(queryset, ordering):
+    """Order products by a keyset ordering, ties broken by id, or by id."""
+    if ordering is None:
+        return queryset.order_by('id')
+    expression, _ = KEYSET_ORDERINGS[ordering]
+    return queryset.annotate(sort_key=expression).order_by('-sort_key', '-id')
+
+
+def estimated_count(queryset):
+    """Return the number of rows, estimated by the planner on large tables."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+
+    queryset = queryset.order_by()
+    key = 'products:count:' + hashlib.md5(str(queryset.query).encode()).hexdigest()
+    count = cache.get(key)
+    if count is not None:
+        return count
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+            [queryset.model._meta.db_table],
+        )
+        table_rows = cursor.fetchone()[0]
+
+    # Small or never analyzed tables are cheap to count exactly.
+    if table_rows < settings.PRODUCTS_EXACT_COUNT_LIMIT:
+        return queryset.count()
+
+    plan = json.loads(queryset.explain(format='json'))
+    count = int(plan[0]['Plan']['Plan Rows'])
+    cache.set(key, count, settings.PRODUCTS_COUNT_CACHE_TIMEOUT)
+    return count
+
+
+def capped_count(queryset, limit):
+    """Return the exact number of rows, counting at most `limit` of them."""
+    return queryset.order_by()[:limit].count()
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that avoids COUNT(*) on large tables."""
+
+    @cached_property
+    def count(self):
+        return estimated_count(self.object_list)
+
+
+class CappedCountPaginator(Paginator):
+    """
+    Paginator of filtered lists, such as search results.
+
+    The planner misjudges the rows matching a filter, an estimate too low
+    would hide the last pages, so they are counted up to
+    PRODUCTS_SEARCH_COUNT_LIMIT rows.
+    """
+
+    @cached_property
+    def count(self):
+        return capped_count(self.object_list, settings.PRODUCTS_SEARCH_COUNT_LIMIT)
+
+
+def encode_cursor(value, pk, page, direction):
+    """Return an opaque cursor pointing at a row."""
+    payload = json.dumps([str(value), pk, page, direction])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(token, parse):
+    """Return (value, pk, page, direction) or None for invalid cursors."""
+    try:
+        value, pk, page, direction = json.loads(base64.urlsafe_b64decode(token.encode()))
+        value, pk, page = parse(value), int(pk), int(page)
+    except (binascii.Error, InvalidOperation, TypeError, ValueError):
+        return None
+
+    if value is None or page < 1 or direction not in ('next', 'prev'):
+        return None
+    return value, pk, page, direction
+
+
+class KeysetPage:
+    """A page of products located by a cursor instead of an offset."""
+
+    def __init__(self, queryset, cursor, ordering, page_size):
+        expression, parse = KEYSET_ORDERINGS[ordering]
+        self.queryset = queryset
+        self.page_size = page_size
+        queryset = queryset.annotate(sort_key=expression)
+
+        position = decode_cursor(cursor, parse) if cursor else None
+        if position is None:
+            self.number, direction = 1, 'next'
+            queryset = queryset.order_by('-sort_key', '-id')
+        else:
+            value, pk, self.number, direction = position
+            # The range condition on sort_key lets the index seek to the
+            # cursor, the OR only breaks ties between equal keys.
+            if direction == 'next':
+                queryset = queryset.filter(sort_key__lte=value) \
+                    .filter(Q(sort_key__lt=value) | Q(id__lt=pk)) \
+                    .order_by('-sort_key', '-id')
+            else:
+                queryset = queryset.filter(sort_key__gte=value) \
+                    .filter(Q(sort_key__gt=value) | Q(id__gt=pk)) \
+                    .order_by('sort_key', 'id')
+
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        self.object_list = rows[:page_size]
+        if direction == 'prev':
+            self.object_list.reverse()
+
+        self.next = None
+        self.previous = None
+        if self.object_list:
+            first, last = self.object_list[0], self.object_list[-1]
+            if direction == 'prev' or has_more:
+                self.next = encode_cursor(last.sort_key, last.id, self.number + 1, 'next')
+            if self.number > 1:
+                self.previous = encode_cursor(first.sort_key, first.id, self.number - 1, 'prev')
+
+    @cached_property
+    def count(self):
+        return estimated_count(self.queryset)
+
+    @property
+    def pages(self):
+        return max(1, math.ceil(self.count / self.page_size))
@@ -0,0 +1,83 @@
+"""
+Full-text product search.
+"""
+import re
+from functools import reduce
+from operator import and_, or_
+
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramWordSimilarity,
+)
+from django.db import connections
+from django.db.models import Case, F, FloatField, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest
+
+SEARCH_CONFIG = 'english'
+SEARCH_FIELDS = ('name', 'brand', 'category', 'description')
+
+_TERM_RE = re.compile(r'[^\W_]+')
+_trigram_databases = {}
+
+
+def search_terms(keyword):
+    """Split a search keyword into lowercase terms."""
+    return _TERM_RE.findall(keyword.lower())
+
+
+def trigram_enabled(connection):
+    """Return True if pg_trgm is installed in the connection's database."""
+    if connection.vendor != 'postgresql':
+        return False
+
+    name = connection.settings_dict['NAME']
+    if name not in _trigram_databases:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _trigram_databases[name] = cursor.fetchone() is not None
+
+    return _trigram_databases[name]
+
+
+def search_products(queryset, keyword):
+    """Filter products matching the keyword, most relevant first."""
+    terms = search_terms(keyword)
+    if not terms:
+        return queryset.none()
+
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return _search_fallback(queryset, keyword, terms)
+
+    # Every term is a prefix match so results show up while typing.
+    query = SearchQuery(
+        ' & '.join(f'{term}:*' for term in terms),
+        search_type='raw',
+        config=SEARCH_CONFIG,
+    )
+    rank = SearchRank(F('search_vector'), query)
+    match = Q(search_vector=query)
+
+    if trigram_enabled(connection):
+        # Typo tolerance on the product name, served by the trigram index.
+        similarity = TrigramWordSimilarity(keyword, 'name')
+        rank = Greatest(rank, similarity, output_field=FloatField())
+        match |= Q(name__trigram_word_similar=keyword)
+
+    return queryset.filter(match).annotate(rank=rank).order_by('-rank', '-id')
+
+
+def _search_fallback(queryset, keyword, terms):
+    """Case-insensitive search for databases without full-text support."""
+    match = reduce(and_, [
+        reduce(or_, [Q(**{f'{field}__icontains': term}) for field in SEARCH_FIELDS])
+        for term in terms
+    ])
+    rank = Case(
+        When(name__icontains=keyword, then=Value(1)),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+    return queryset.filter(match).annotate(rank=rank).order_by('-rank', '-id')
@@ -1,10 +1,13 @@
 """
 Product serializer for the API View.
 """
+from django.core.files.storage import default_storage
+from django.utils.functional import cached_property
 from django.utils.translation import gettext as _
 
 from rest_framework import serializers
 
+from core.compiled import CompiledSerializer
 from core.models import Product, Review
 
 
@@ -16,14 +19,42 @@ class ReviewSerializer(serializers.ModelSerializer):
 
 class ProductSerializer(serializers.ModelSerializer):
     reviews = serializers.SerializerMethodField(read_only=True)
+    ratingHistogram = serializers.ReadOnlyField()
+    imageVariants = serializers.SerializerMethodField(read_only=True)
+    # Summed over the shards of sharded products, see Product.stock.
+    countInStock = serializers.IntegerField(source='stock', read_only=True)
     class Meta:
         model = Product
-        fields = '__all__'
+        exclude = [
+            'search_vector', 'ratingSum', 'stockShards',
+            'numStars1', 'numStars2', 'numStars3', 'numStars4', 'numStars5',
+        ]
+
+    @cached_property
+    def review_serializer(self):
+        """One review serializer reused for every product in a list."""
+        return ReviewSerializer()
 
     def get_reviews(self, obj):
+        # Served from the prefetch cache when the queryset used with_reviews().
         reviews = obj.review_set.all()
-        serializer = ReviewSerializer(reviews, many=True)
-        return serializer.data
+        return [self.review_serializer.to_representation(review) for review in reviews]
+
+    def get_imageVariants(self, obj):
+        """Variant URLs by format and width, the thumbnail by format."""
+        return {
+            kind: {size: default_storage.url(name) for size, name in sizes.items()}
+            for kind, sizes in obj.imageVariants.items()
+        }
+
+
+# Read-only fast paths of the serializers above for the list endpoints.
+# Nested serializers are timed as part of their parent.
+serialize_review = CompiledSerializer(ReviewSerializer, timed=False)
+serialize_product = CompiledSerializer(
+    ProductSerializer,
+    reviews=lambda product: serialize_review.many(product.review_set.all()),
+)
 
 
 class ProductImageSerializer(serializers.ModelSerializer):
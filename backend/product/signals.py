@@ -0,0 +1,19 @@
+from django.db.models.signals import post_save, post_delete
+
+from core.models import Product, Review
+from product import leaderboard
+from product.cache import invalidate_products
+
+def invalidateProduct(sender, instance, **kwargs):
+    invalidate_products(instance.id)
+    leaderboard.invalidate()
+
+def invalidateReviewedProduct(sender, instance, **kwargs):
+    if instance.product_id:
+        invalidate_products(instance.product_id)
+        leaderboard.invalidate()
+
+post_save.connect(invalidateProduct, sender=Product)
+post_delete.connect(invalidateProduct, sender=Product)
+post_save.connect(invalidateReviewedProduct, sender=Review)
+post_delete.connect(invalidateReviewedProduct, sender=Review)
@@ -0,0 +1,87 @@
+"""
+Stock of hot products spread over several counter rows.
+
+Every order of a product updates the product row, so checkouts of a
+product selling fast wait for each other's row lock until they commit.
+A sharded product keeps its stock in `stockShards` StockShard rows
+instead and orders decrement a random one, so that many checkouts of it
+can proceed at once. Reads sum the shards, see ProductQuerySet.with_stock.
+Orders leave updatedAt of a sharded product alone, its ETag includes the
+stock instead.
+"""
+from django.db import transaction
+from django.db.models import F
+
+from core.models import Product, StockShard
+from .cache import invalidate_products
+
+
+def split(count, shards):
+    """Return `count` spread evenly over `shards` counters."""
+    base, extra = divmod(count, shards)
+    return [base + (shard < extra) for shard in range(shards)]
+
+
+def shard_stock(pk, shards):
+    """
+    Spread the stock of a product over `shards` rows, 0 moves it back to
+    the product row. Return the units in stock.
+    """
+    with transaction.atomic():
+        product = Product.objects.select_for_update().get(id=pk)
+        # Locking the shards waits for the orders in flight.
+        counts = StockShard.objects.select_for_update().filter(product=product).values_list('count', flat=True)
+        total = sum(counts) if product.stockShards else product.countInStock or 0
+
+        StockShard.objects.filter(product=product).delete()
+        if shards:
+            StockShard.objects.bulk_create([
+                StockShard(product=product, shard=shard, count=count)
+                for shard, count in enumerate(split(total, shards))
+            ])
+        product.stockShards = shards
+        product.countInStock = 0 if shards else total
+        product.save(update_fields=['stockShards', 'countInStock', 'updatedAt'])
+        invalidate_products(pk)
+    return total
+
+
+def set_stock(pk, count):
+    """Replace the stock of a sharded product."""
+    with transaction.atomic():
+        shards = list(StockShard.objects.select_for_update().filter(product_id=pk).order_by('shard'))
+        for shard, shard_count in zip(shards, split(int(count or 0), len(shards) or 1)):
+            shard.count = shard_count
+        StockShard.objects.bulk_update(shards, ['count'])
+        invalidate_products(pk)
+
+
+def reserve(product, qty):
+    """
+    Take `qty` units of a sharded product, return whether it had enough.
+    Must run in the checkout transaction.
+    """
+    shards = StockShard.objects.filter(product=product, count__gte=qty).order_by('?').values('id')
+    # A random shard with enough stock that no other checkout holds, else
+    # wait for one that has enough.
+    for shard in (shards.select_for_update(skip_locked=True)[:1], shards[:1]):
+        savepoint = transaction.savepoint()
+        if StockShard.objects.filter(id__in=shard, count__gte=qty).update(count=F('count') - qty):
+            transaction.savepoint_commit(savepoint)
+            return True
+        # Postgres keeps the lock of a row changed by a concurrent checkout
+        # even when it no longer has enough stock, the savepoint drops it.
+        transaction.savepoint_rollback(savepoint)
+
+    # No shard holds enough alone, wait for all of them and take from
+    # several. They are locked in order, so concurrent carts can't deadlock.
+    locked = list(StockShard.objects.select_for_update().filter(product=product).order_by('shard'))
+    if sum(shard.count for shard in locked) < qty:
+        return False
+    for shard in locked:
+        taken = min(shard.count, qty)
+        shard.count -= taken
+        qty -= taken
+    StockShard.objects.bulk_update(locked, ['count'])
+    return True
+
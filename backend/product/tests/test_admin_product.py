@@ -7,16 +7,22 @@ import os
 
 from PIL import Image
 
+from django.core.files.storage import default_storage
+from django.db import connection
 from django.urls import reverse
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
 from django.contrib.auth.models import User
-from core.models import Product
+from core.models import Product, Review, StockShard
+from core.testing import QueryBudgetMixin
 
+from product.images import delete_variants, variant_names
 from product.serializers import ProductSerializer
+from product.stock import shard_stock
 
 TOKEN_URL = reverse('user:user-token')
 HTTP_PRODUCTS = '/api/products/admin/'
@@ -58,7 +64,7 @@ def create_product(user, active=False):
     return product
 
 
-class AdminProductAPITests(TestCase):
+class AdminProductAPITests(QueryBudgetMixin, TestCase):
     """Test API requests."""
 
     def setUp(self):
@@ -87,6 +93,25 @@ class AdminProductAPITests(TestCase):
 
         self.assertEqual(res_product.status_code, status.HTTP_200_OK)
         self.assertEqual(len(res_product.data), 1)
+        self.assertWithinQueryBudget(res_product)
+
+    def test_get_products_by_admin_constant_queries(self):
+        """Test the admin product list doesn't query reviews per product."""
+        Review.objects.create(product=self.product, user=self.user, name='User', rating=4)
+        # The first request also looks up the admin's token version.
+        self.client.get(HTTP_PRODUCTS, **self.token_admin)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(HTTP_PRODUCTS, **self.token_admin)
+
+        for _ in range(5):
+            product = create_product(self.admin)
+            Review.objects.create(product=product, user=self.user, name='User', rating=4)
+            Review.objects.create(product=product, user=self.admin, name='Admin', rating=5)
+        with self.assertNumQueries(len(queries)):
+            res_product = self.client.get(HTTP_PRODUCTS, **self.token_admin)
+
+        self.assertEqual(len(res_product.data), 6)
+        self.assertWithinQueryBudget(res_product)
 
     def test_get_admin_products_by_user_unsuccess(self):
         """Test get all products without admin authentication."""
@@ -112,6 +137,7 @@ class AdminProductAPITests(TestCase):
 
         self.assertEqual(res_product.status_code, status.HTTP_200_OK)
         self.assertTrue(product_exists)
+        self.assertWithinQueryBudget(res_product)
 
     def test_user_create_product_unsuccess(self):
         """Test creates product without valid token."""
@@ -133,6 +159,35 @@ class AdminProductAPITests(TestCase):
         self.assertEqual(res_product.status_code, status.HTTP_200_OK)
         self.assertEqual(product_serializer.data['name'], updated_payload['name'])
         self.assertEqual(product_serializer.data['active'], updated_payload['active'])
+        self.assertWithinQueryBudget(res_product)
+
+    def test_admin_update_product_keeps_rating_aggregates(self):
+        """Test updating a product doesn't write the rating aggregates of concurrent reviews."""
+        payload = ProductSerializer(self.product).data
+        payload['name'] = 'Updated Name'
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.put(f'{HTTP_PRODUCTS}{self.product.id}/', payload, **self.token_admin, format='json')
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "core_product"')]
+
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"name"', updates[0])
+        self.assertNotIn('"ratingSum"', updates[0])
+        self.assertNotIn('"numReviews"', updates[0])
+
+    def test_admin_update_sharded_stock(self):
+        """Test updating the stock of a sharded product spreads it over the shards."""
+        shard_stock(self.product.id, 2)
+        payload = ProductSerializer(self.product).data
+        payload['countInStock'] = 7
+
+        res = self.client.put(f'{HTTP_PRODUCTS}{self.product.id}/', payload, **self.token_admin, format='json')
+        shards = StockShard.objects.filter(product=self.product).order_by('shard').values_list('count', flat=True)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['countInStock'], 7)
+        self.assertEqual(list(shards), [4, 3])
+        self.assertWithinQueryBudget(res)
 
     def test_user_update_product_unsuccess(self):
         """Test user updates product without valid token."""
@@ -151,6 +206,20 @@ class AdminProductAPITests(TestCase):
 
         self.assertEqual(res_product_deleted.status_code, status.HTTP_200_OK)
         self.assertFalse(product_exists)
+        self.assertWithinQueryBudget(res_product_deleted)
+
+    def test_admin_delete_product_with_reviews(self):
+        """Test deleting a product deletes its reviews in constant queries."""
+        Review.objects.create(product=self.product, user=self.user, name='User', rating=4)
+        Review.objects.create(product=self.product, user=self.admin, name='Admin', rating=5)
+        other = create_product(self.admin)
+        Review.objects.create(product=other, user=self.user, name='User', rating=3)
+
+        res = self.client.delete(f'{HTTP_PRODUCTS}{self.product.id}/', **self.token_admin)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(Review.objects.values_list('product', flat=True)), [other.id])
+        self.assertWithinQueryBudget(res)
 
     def test_user_delete_product_unsuccess(self):
         """Test user ubsuccessful deletes product."""
@@ -159,7 +228,7 @@ class AdminProductAPITests(TestCase):
         self.assertEqual(res_product_deleted.status_code, status.HTTP_403_FORBIDDEN)
 
 
-class ImageUploadTests(TestCase):
+class ImageUploadTests(QueryBudgetMixin, TestCase):
     """Tests for the image upload API."""
 
     def setUp(self):
@@ -198,6 +267,7 @@ class ImageUploadTests(TestCase):
         self.assertEqual(res_image.status_code, status.HTTP_200_OK)
         self.assertIn('Image was uploaded', res_image.data)
         self.assertTrue(os.path.exists(self.product.image.path))
+        self.assertWithinQueryBudget(res_image)
 
     def test_update_image(self):
         """Test updating image to a product."""
@@ -223,6 +293,7 @@ class ImageUploadTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertFalse(os.path.exists(old_path))
         self.assertTrue(os.path.exists(self.product.image.path))
+        self.assertWithinQueryBudget(res)
 
     def test_upload_image_bad_request(self):
         """Test uploading invalid image."""
@@ -240,4 +311,91 @@ class ImageUploadTests(TestCase):
             payload = {'image': image_file, 'product_id': self.product.id}
             res = self.client.post(f'{HTTP_PRODUCTS}image/', payload, **self.token_user, fromat='multipart')
 
-        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
\ No newline at end of file
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+
+def upload_image(client, product, token, size=(800, 600)):
+    """Upload a generated JPEG image to a product."""
+    with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+        Image.new('RGB', size).save(image_file, format='JPEG')
+        image_file.seek(0)
+        payload = {'image': image_file, 'product_id': product.id}
+        return client.post(f'{HTTP_PRODUCTS}image/', payload, **token, format='multipart')
+
+
+@override_settings(PRODUCT_IMAGE_ASYNC=False, PRODUCT_IMAGE_WIDTHS=[320, 640, 1024])
+class ImageVariantTests(TestCase):
+    """Tests for the product image variants."""
+
+    def setUp(self):
+        self.admin_defaults = {
+            'username': 'admin@mail.com',
+            'email': 'admin@mail.com',
+            'password': 'password123',
+        }
+        self.client = APIClient()
+        self.admin = create_admin(self.admin_defaults)
+        self.token_admin = get_token(self.client.post, self.admin_defaults)
+        self.product = create_product(self.admin)
+
+    def tearDown(self):
+        product = Product.objects.filter(id=self.product.id).first()
+        if product:
+            delete_variants(product.imageVariants)
+            product.image.delete()
+
+    def upload(self, size=(800, 600)):
+        with self.captureOnCommitCallbacks(execute=True):
+            res = upload_image(self.client, self.product, self.token_admin, size)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.product.refresh_from_db()
+
+    def test_upload_creates_variants(self):
+        """Test uploading an image creates the thumbnail and widths."""
+        self.upload()
+        variants = self.product.imageVariants
+
+        self.assertEqual(sorted(variants), ['jpeg', 'thumbnail', 'webp'])
+        self.assertEqual(sorted(variants['webp']), ['320', '640'])
+        self.assertEqual(sorted(variants['jpeg']), ['320', '640'])
+        for name in variant_names(variants):
+            self.assertTrue(default_storage.exists(name))
+        with default_storage.open(variants['webp']['320']) as image_file:
+            self.assertEqual(Image.open(image_file).size, (320, 240))
+        with default_storage.open(variants['thumbnail']['jpeg']) as image_file:
+            self.assertEqual(Image.open(image_file).size, (300, 300))
+
+    def test_small_image_not_upscaled(self):
+        """Test an image narrower than every width keeps its size."""
+        self.upload(size=(100, 50))
+
+        self.assertEqual(list(self.product.imageVariants['webp']), ['100'])
+
+    def test_variant_urls_serialized(self):
+        """Test the product payload exposes the variant URLs."""
+        self.upload()
+        res = self.client.get(f'/api/products/user/{self.product.id}/')
+
+        self.assertEqual(
+            res.data['imageVariants']['webp']['320'],
+            default_storage.url(self.product.imageVariants['webp']['320']),
+        )
+
+    def test_replace_image_deletes_variants(self):
+        """Test uploading a new image removes the old variants."""
+        self.upload()
+        old_names = variant_names(self.product.imageVariants)
+        self.upload()
+
+        for name in old_names:
+            self.assertFalse(default_storage.exists(name))
+        self.assertEqual(len(variant_names(self.product.imageVariants)), len(old_names))
+
+    def test_delete_product_deletes_variants(self):
+        """Test deleting a product removes its variants."""
+        self.upload()
+        names = variant_names(self.product.imageVariants)
+        self.client.delete(f'{HTTP_PRODUCTS}{self.product.id}/', **self.token_admin)
+
+        for name in names:
+            self.assertFalse(default_storage.exists(name))
@@ -1,17 +1,32 @@
 """
 Tests for the product API.
 """
+import json
+from datetime import timedelta
 from decimal import Decimal
 
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
 from django.urls import reverse
-from django.test import TestCase
+from threading import Thread
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
 from rest_framework import status
+from asgiref.sync import async_to_sync, sync_to_async
 from rest_framework.test import APIClient
 
-from core.models import Product
+from core.models import Product, Review
+from core.renderers import msgpack
+from core.testing import QueryBudgetMixin
+from core.versions import get_version
 
+from product import async_views, leaderboard
+from product import cache as product_cache
 from product.serializers import ProductSerializer
 
 HTTP_PRODUCTS = '/api/products/user/'
@@ -40,8 +55,15 @@ def create_product(user, params=False):
 
     return product
 
+def create_reviews(product, count):
+    """Create reviews for a product by new users."""
+    for _ in range(count):
+        n = User.objects.count()
+        reviewer = User.objects.create(username=f'reviewer{n}@mail.com', email=f'reviewer{n}@mail.com')
+        Review.objects.create(product=product, user=reviewer, name='Reviewer', rating=5)
+
 
-class ProductAPITests(TestCase):
+class ProductAPITests(QueryBudgetMixin, TestCase):
     """Test API requests."""
 
     def setUp(self):
@@ -76,6 +98,121 @@ class ProductAPITests(TestCase):
         self.assertEqual(res_products_by_serch.status_code, status.HTTP_200_OK)
         self.assertNotEqual(res_products_by_serch.data, serializer.data)
 
+    def test_search_products_by_brand_success(self):
+        """Test search matches the product brand."""
+        product = create_product(user=self.user, params={'name': 'Mouse', 'brand': 'Logitech'})
+        res_products = self.client.get(HTTP_PRODUCTS, {'keyword': 'logitech'})
+
+        self.assertEqual(res_products.status_code, status.HTTP_200_OK)
+        self.assertEqual([p['id'] for p in res_products.data['products']], [product.id])
+
+    def test_search_products_prefix_success(self):
+        """Test search matches partially typed words."""
+        product = create_product(user=self.user, params={'name': 'Wireless Headphones'})
+        res_products = self.client.get(HTTP_PRODUCTS, {'keyword': 'wireless headph'})
+
+        self.assertEqual([p['id'] for p in res_products.data['products']], [product.id])
+
+    def test_search_products_ranked_by_relevance(self):
+        """Test products matching by name come before description matches."""
+        by_description = create_product(user=self.user, params={
+            'name': 'Tripod',
+            'description': 'Fits any camera',
+        })
+        by_name = create_product(user=self.user, params={'name': 'Camera'})
+        res_products = self.client.get(HTTP_PRODUCTS, {'keyword': 'camera'})
+
+        self.assertEqual([p['id'] for p in res_products.data['products']], [by_name.id, by_description.id])
+
+    def test_search_products_unactive_excluded(self):
+        """Test search doesn't return unactive products."""
+        create_product(user=self.user, params={'name': 'Hidden Camera', 'active': False})
+        res_products = self.client.get(HTTP_PRODUCTS, {'keyword': 'camera'})
+
+        self.assertEqual(res_products.data['products'], [])
+
+    def test_list_products_page_size_capped(self):
+        """Test the requested page size is capped by the settings."""
+        for i in range(5):
+            create_product(user=self.user, params={'name': f'Product {i}'})
+        res_products = self.client.get(HTTP_PRODUCTS, {'page_size': 2})
+
+        self.assertEqual(len(res_products.data['products']), 2)
+        self.assertEqual(res_products.data['pages'], 3)
+
+        with self.settings(PRODUCTS_MAX_PAGE_SIZE=3):
+            res_products = self.client.get(HTTP_PRODUCTS, {'page_size': 100})
+
+        self.assertEqual(len(res_products.data['products']), 3)
+
+    def test_list_products_ordering(self):
+        """Test products are listed by id unless newest first is asked for."""
+        for i in range(2):
+            create_product(user=self.user, params={'name': f'Product {i}'})
+        ids = list(Product.objects.order_by('id').values_list('id', flat=True))
+
+        res_default = self.client.get(HTTP_PRODUCTS)
+        res_newest = self.client.get(HTTP_PRODUCTS, {'ordering': 'createdAt'})
+
+        self.assertEqual([p['id'] for p in res_default.data['products']], ids)
+        self.assertEqual([p['id'] for p in res_newest.data['products']], ids[::-1])
+
+    @override_settings(PRODUCTS_EXACT_COUNT_LIMIT=0)
+    def test_search_products_pages_counted(self):
+        """Test search results are counted exactly, up to the limit, not estimated."""
+        for i in range(5):
+            create_product(user=self.user, params={'name': f'Camera {i}'})
+        res_products = self.client.get(HTTP_PRODUCTS, {'keyword': 'camera', 'page_size': 2})
+
+        self.assertEqual(res_products.data['pages'], 3)
+
+        with self.settings(PRODUCTS_SEARCH_COUNT_LIMIT=3):
+            res_products = self.client.get(HTTP_PRODUCTS, {'keyword': 'camera', 'page_size': 2})
+
+        self.assertEqual(res_products.data['pages'], 2)
+
+    def test_list_products_cursor_success(self):
+        """Test walking the product list with cursors."""
+        for i in range(4):
+            create_product(user=self.user, params={'name': f'Product {i}'})
+        expected = list(Product.objects.order_by('-createdAt', '-id').values_list('id', flat=True))
+
+        res_first = self.client.get(HTTP_PRODUCTS, {'cursor': '', 'page_size': 2})
+        res_second = self.client.get(HTTP_PRODUCTS, {'cursor': res_first.data['next'], 'page_size': 2})
+        res_third = self.client.get(HTTP_PRODUCTS, {'cursor': res_second.data['next'], 'page_size': 2})
+        res_back = self.client.get(HTTP_PRODUCTS, {'cursor': res_third.data['previous'], 'page_size': 2})
+
+        self.assertEqual(res_first.status_code, status.HTTP_200_OK)
+        self.assertEqual(res_first.data['page'], 1)
+        self.assertEqual(res_first.data['pages'], 3)
+        self.assertIsNone(res_first.data['previous'])
+        ids = [p['id'] for res in (res_first, res_second, res_third) for p in res.data['products']]
+        self.assertEqual(ids, expected)
+        self.assertEqual(res_third.data['page'], 3)
+        self.assertIsNone(res_third.data['next'])
+        self.assertEqual(res_back.data['page'], 2)
+        self.assertEqual(res_back.data['products'], res_second.data['products'])
+
+    def test_list_products_cursor_by_rating(self):
+        """Test cursor pagination ordered by rating, unrated products last."""
+        unrated = create_product(user=self.user, params={'name': 'Unrated'})
+        best = create_product(user=self.user, params={'rating': Decimal('4.50')})
+        worst = create_product(user=self.user, params={'rating': Decimal('1.00')})
+
+        res_first = self.client.get(HTTP_PRODUCTS, {'cursor': '', 'ordering': 'rating', 'page_size': 2})
+        res_second = self.client.get(HTTP_PRODUCTS, {'cursor': res_first.data['next'], 'ordering': 'rating', 'page_size': 2})
+
+        ids = [p['id'] for res in (res_first, res_second) for p in res.data['products']]
+        self.assertEqual(ids, [best.id, worst.id, unrated.id, self.product.id])
+
+    def test_list_products_invalid_cursor(self):
+        """Test an invalid cursor returns the first page."""
+        res_products = self.client.get(HTTP_PRODUCTS, {'cursor': 'invalid'})
+
+        self.assertEqual(res_products.status_code, status.HTTP_200_OK)
+        self.assertEqual(res_products.data['page'], 1)
+        self.assertEqual(res_products.data['products'][0]['id'], self.product.id)
+
     def test_get_product_success(self):
         """Testing get product by id."""
         res_product_details = self.client.get(f'{HTTP_PRODUCTS}{self.product.id}/')
@@ -99,6 +236,33 @@ class ProductAPITests(TestCase):
 
         self.assertEqual(res_product_reveiw.status_code, status.HTTP_200_OK)
         self.assertEqual(Decimal(reveiw['rating']), Decimal(serializer.data['rating']))
+        self.assertWithinQueryBudget(res_product_reveiw)
+
+    def test_create_product_reveiws_aggregated(self):
+        """Test reviews from several users update the rating aggregates."""
+        other = {
+            'first_name': 'other',
+            'username': 'other@mail.com',
+            'email': 'other@mail.com',
+            'password': 'password123',
+        }
+        create_user(other)
+        other_token = get_token(self.client.post, other)
+        self.client.patch(f'{HTTP_PRODUCTS}reviews/{self.product.id}/', {'rating': 5}, **self.token, format='json')
+        self.client.patch(f'{HTTP_PRODUCTS}reviews/{self.product.id}/', {'rating': '2'}, **other_token, format='json')
+        res_product = self.client.get(f'{HTTP_PRODUCTS}{self.product.id}/')
+
+        self.assertEqual(res_product.data['numReviews'], 2)
+        self.assertEqual(Decimal(res_product.data['rating']), Decimal('3.5'))
+        self.assertEqual(res_product.data['ratingHistogram'], {'1': 0, '2': 1, '3': 0, '4': 0, '5': 1})
+        self.assertNotIn('ratingSum', res_product.data)
+
+    def test_create_product_reveiw_invalid_rating_unsuccess(self):
+        """Test a rating outside of 1-5 stars is rejected."""
+        res_product_reveiw = self.client.patch(f'{HTTP_PRODUCTS}reviews/{self.product.id}/', {'rating': 6}, **self.token, format='json')
+
+        self.assertEqual(res_product_reveiw.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Review.objects.filter(product=self.product).exists())
 
     def test_create_product_reveiw_unsuccess(self):
         """Test try to create the second review to the same product."""
@@ -122,3 +286,526 @@ class ProductAPITests(TestCase):
         res_product_reveiw = self.client.patch(f'{HTTP_PRODUCTS}reviews/{self.product.id}/', reveiw, format='json')
 
         self.assertEqual(res_product_reveiw.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class ProductQueryCountTests(QueryBudgetMixin, TestCase):
+    """Test product reads run a constant number of queries."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user({
+            'first_name': 'testname',
+            'username': 'test@mail.com',
+            'email': 'test@mail.com',
+            'password': 'password123',
+        })
+
+    def create_products(self, count):
+        """Create rated products with reviews."""
+        for _ in range(count):
+            product = create_product(self.user, {'rating': Decimal('4.50')})
+            create_reviews(product, 3)
+
+    def assertConstantQueries(self, url, params=None):
+        """Assert a request runs as many queries after adding products."""
+        self.create_products(2)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, params)
+
+        self.create_products(5)
+        with self.assertNumQueries(len(queries)):
+            res = self.client.get(url, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertWithinQueryBudget(res)
+        return res
+
+    def test_list_products_constant_queries(self):
+        """Test the product list doesn't query reviews per product."""
+        res = self.assertConstantQueries(HTTP_PRODUCTS, {'page_size': 10})
+
+        self.assertEqual(len(res.data['products']), 7)
+
+    def test_async_list_products_constant_queries(self):
+        """Test the async product list doesn't query reviews per product either."""
+        self.create_products(7)
+        factory = AsyncRequestFactory()
+        # Table size (estimated on Postgres only), count, page and its
+        # reviews.
+        queries = 4 if connection.vendor == 'postgresql' else 3
+        for page_size in (2, 10):
+            request = factory.get(HTTP_PRODUCTS, {'page_size': page_size})
+            with self.subTest(page_size=page_size), self.assertNumQueries(queries):
+                response = async_to_sync(async_views.product_list)(request)
+
+            self.assertEqual(len(json.loads(response.content)['products']), min(page_size, 7))
+
+    def test_list_products_cursor_constant_queries(self):
+        """Test the keyset paginated list doesn't query reviews per product."""
+        self.assertConstantQueries(HTTP_PRODUCTS, {'cursor': '', 'page_size': 10})
+
+    def test_top_products_constant_queries(self):
+        """Test cold top products don't query reviews per product."""
+        self.create_products(2)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(f'{HTTP_PRODUCTS}top/')
+
+        self.create_products(5)
+        cache.clear()
+        with self.assertNumQueries(len(queries)):
+            res = self.client.get(f'{HTTP_PRODUCTS}top/')
+
+        self.assertEqual(len(res.data), 5)
+        self.assertWithinQueryBudget(res)
+
+    def test_get_product_constant_queries(self):
+        """Test a product detail runs the same queries for any number of reviews."""
+        product = create_product(self.user)
+        create_reviews(product, 1)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(f'{HTTP_PRODUCTS}{product.id}/')
+
+        create_reviews(product, 5)
+        with self.assertNumQueries(len(queries)):
+            res = self.client.get(f'{HTTP_PRODUCTS}{product.id}/')
+
+        self.assertEqual(len(res.data['reviews']), 6)
+        self.assertWithinQueryBudget(res)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Needs concurrent connections.')
+class ConcurrentReviewTests(TransactionTestCase):
+    """Test concurrent reviews of the same product."""
+
+    def test_concurrent_reviews_aggregated(self):
+        """Test concurrent reviews don't overwrite each other's aggregates."""
+        owner = User.objects.create(username='owner@mail.com', email='owner@mail.com')
+        product = create_product(owner)
+        ratings = [1, 2, 3, 4, 5, 5, 4, 3]
+        clients = []
+        for i, rating in enumerate(ratings):
+            reviewer = User.objects.create(username=f'reviewer{i}@mail.com', email=f'reviewer{i}@mail.com')
+            client = APIClient()
+            client.force_authenticate(reviewer)
+            clients.append((client, rating))
+
+        def review(client, rating):
+            client.patch(f'{HTTP_PRODUCTS}reviews/{product.id}/', {'rating': rating}, format='json')
+            connection.close()
+
+        threads = [Thread(target=review, args=args) for args in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        product.refresh_from_db()
+
+        self.assertEqual(product.numReviews, len(ratings))
+        self.assertEqual(product.ratingSum, sum(ratings))
+        self.assertEqual(product.ratingHistogram, {'1': 1, '2': 1, '3': 2, '4': 2, '5': 2})
+
+
+class ProductCacheTests(TestCase):
+    """Test cached product reads see every change."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(
+            username='admin@mail.com', email='admin@mail.com', password='password123',
+        )
+        self.product = create_product(self.admin, {'rating': Decimal('4.50')})
+
+    def admin_update(self, **params):
+        """Update the product through the admin API."""
+        payload = {
+            'name': self.product.name,
+            'price': '5.50',
+            'countInStock': 3,
+            'active': True,
+        }
+        payload.update(params)
+        self.client.force_authenticate(self.admin)
+        res = self.client.put(f'/api/products/admin/{self.product.id}/', payload, format='json')
+        self.client.force_authenticate(None)
+        return res
+
+    def test_get_product_cached(self):
+        """Test a repeated product detail doesn't query the database."""
+        self.client.get(f'{HTTP_PRODUCTS}{self.product.id}/')
+        with self.assertNumQueries(0):
+            res = self.client.get(f'{HTTP_PRODUCTS}{self.product.id}/')
+
+        self.assertEqual(res.data['id'], self.product.id)
+
+    def test_admin_update_visible(self):
+        """Test an admin edit is visible right after it's saved."""
+        self.client.get(f'{HTTP_PRODUCTS}{self.product.id}/')
+        self.client.get(f'{HTTP_PRODUCTS}top/')
+        self.admin_update(name='Updated Name')
+
+        res_product = self.client.get(f'{HTTP_PRODUCTS}{self.product.id}/')
+        res_top = self.client.get(f'{HTTP_PRODUCTS}top/')
+
+        self.assertEqual(res_product.data['name'], 'Updated Name')
+        self.assertEqual(res_top.data[0]['name'], 'Updated Name')
+
+    def test_admin_deactivate_removes_from_top(self):
+        """Test deactivating a product removes it from the cached top list."""
+        self.assertEqual(len(self.client.get(f'{HTTP_PRODUCTS}top/').data), 1)
+        self.admin_update(active=False)
+
+        self.assertEqual(self.client.get(f'{HTTP_PRODUCTS}top/').data, [])
+
+    def test_new_review_visible(self):
+        """Test a new review is visible in the cached product detail."""
+        self.client.get(f'{HTTP_PRODUCTS}{self.product.id}/')
+        self.client.force_authenticate(self.admin)
+        self.client.patch(f'{HTTP_PRODUCTS}reviews/{self.product.id}/', {'rating': 3}, format='json')
+        res = self.client.get(f'{HTTP_PRODUCTS}{self.product.id}/')
+
+        self.assertEqual(len(res.data['reviews']), 1)
+        self.assertEqual(res.data['numReviews'], 1)
+
+    def test_deleted_product_not_served(self):
+        """Test a deleted product isn't served from the cache."""
+        self.client.get(f'{HTTP_PRODUCTS}{self.product.id}/')
+        self.client.force_authenticate(self.admin)
+        self.client.delete(f'/api/products/admin/{self.product.id}/')
+        res = self.client.get(f'{HTTP_PRODUCTS}{self.product.id}/')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_cache_stats(self):
+        """Test the admin can read the hit and miss counters."""
+        self.client.force_authenticate(self.admin)
+        before = self.client.get('/api/products/admin/cache/').data
+        self.client.get(f'{HTTP_PRODUCTS}{self.product.id}/')
+        self.client.get(f'{HTTP_PRODUCTS}{self.product.id}/')
+        after = self.client.get('/api/products/admin/cache/').data
+
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertEqual(after['hits'] - before['hits'], 1)
+
+    def test_cache_stats_by_user_unsuccess(self):
+        """Test the cache counters are admin only."""
+        res = self.client.get('/api/products/admin/cache/')
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class ProductLeaderboardTests(TestCase):
+    """Test the top rated products leaderboards."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = create_user({
+            'username': 'test@mail.com',
+            'email': 'test@mail.com',
+            'password': 'password123',
+        })
+
+    def create_rated(self, rating, **params):
+        """Create an active product with the given rating."""
+        return create_product(self.user, {'rating': Decimal(rating), **params})
+
+    def get_top_names(self, **params):
+        res = self.client.get(f'{HTTP_PRODUCTS}top/', params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [product['name'] for product in res.data]
+
+    def test_top_products_ordered(self):
+        """Test the best rated active products are listed first."""
+        for rating in ['4.20', '4.90', '3.90', '4.50']:
+            self.create_rated(rating, name=rating)
+        self.create_rated('5.00', name='inactive', active=False)
+
+        self.assertEqual(self.get_top_names(), ['4.90', '4.50', '4.20'])
+
+    def test_top_products_limited(self):
+        """Test only TOP_PRODUCTS_COUNT products are listed."""
+        for _ in range(7):
+            self.create_rated('4.50')
+
+        self.assertEqual(len(self.get_top_names()), 5)
+
+    def test_top_products_cached(self):
+        """Test repeated top products don't query the database."""
+        self.create_rated('4.50')
+        self.client.get(f'{HTTP_PRODUCTS}top/')
+        with self.assertNumQueries(0):
+            names = self.get_top_names()
+
+        self.assertEqual(len(names), 1)
+
+    def test_top_products_by_category(self):
+        """Test top products of one category."""
+        self.create_rated('4.90', name='Phone', category='Electronics')
+        self.create_rated('4.50', name='Shirt', category='Clothes')
+        self.create_rated('4.20', name='Laptop', category='Electronics')
+
+        self.assertEqual(self.get_top_names(category='Electronics'), ['Phone', 'Laptop'])
+        self.assertEqual(self.get_top_names(), ['Phone', 'Shirt', 'Laptop'])
+
+    def test_category_change_moves_product(self):
+        """Test a product changing category leaves the old board."""
+        product = self.create_rated('4.90', name='Phone', category='Electronics')
+        self.get_top_names(category='Electronics')
+        self.get_top_names(category='Phones')
+        product.category = 'Phones'
+        product.save()
+
+        self.assertEqual(self.get_top_names(category='Electronics'), [])
+        self.assertEqual(self.get_top_names(category='Phones'), ['Phone'])
+
+    def test_deactivated_product_leaves_top(self):
+        """Test deactivating a product removes it from the boards at once."""
+        product = self.create_rated('4.90', name='Phone', category='Electronics')
+        self.create_rated('4.50', name='Laptop', category='Electronics')
+        self.get_top_names()
+        self.get_top_names(category='Electronics')
+        product.active = False
+        product.save()
+
+        self.assertEqual(self.get_top_names(), ['Laptop'])
+        self.assertEqual(self.get_top_names(category='Electronics'), ['Laptop'])
+
+    def test_top_products_skip_inactive(self):
+        """Test a product deactivated without updating the boards isn't listed."""
+        product = self.create_rated('4.90', name='Phone')
+        self.create_rated('4.50', name='Laptop')
+        self.get_top_names()
+        Product.objects.filter(id=product.id).update(active=False)
+        product_cache.invalidate_products(product.id)
+
+        self.assertEqual(self.get_top_names(), ['Laptop'])
+
+    def test_review_updates_top(self):
+        """Test a review moving a product over the minimum rating lists it."""
+        product = self.create_rated('0', name='Reviewed')
+        self.assertEqual(self.get_top_names(), [])
+
+        self.client.force_authenticate(self.user)
+        self.client.patch(f'{HTTP_PRODUCTS}reviews/{product.id}/', {'rating': 5}, format='json')
+
+        self.assertEqual(self.get_top_names(), ['Reviewed'])
+
+    def test_deleted_review_updates_top(self):
+        """Test deleting the only review removes the product from the top."""
+        product = self.create_rated('0')
+        self.client.force_authenticate(self.user)
+        self.client.patch(f'{HTTP_PRODUCTS}reviews/{product.id}/', {'rating': 5}, format='json')
+        self.assertEqual(len(self.get_top_names()), 1)
+
+        Review.objects.get(product=product).delete()
+
+        self.assertEqual(self.get_top_names(), [])
+
+    @override_settings(TOP_PRODUCTS_COUNT=1)
+    def test_board_beyond_size(self):
+        """Test products outside the board are found when the top leaves."""
+        products = {rating: self.create_rated(rating) for rating in ['5.00', '4.80', '4.60', '4.40']}
+        self.assertEqual(leaderboard.top(), [products['5.00'].id])
+
+        products['4.40'].rating = Decimal('4.90')
+        products['4.40'].save()
+        self.assertEqual(leaderboard.top(), [products['5.00'].id])
+
+        for rating in ['5.00', '4.40', '4.80']:
+            products[rating].active = False
+            products[rating].save()
+
+        self.assertEqual(leaderboard.top(), [products['4.60'].id])
+
+    def test_board_built_across_change(self):
+        """Test a board built from rows read before a change isn't served after it."""
+        self.create_rated('4.90', name='Phone')
+        product = self.create_rated('4.50', name='Laptop')
+        build = leaderboard._build
+
+        def build_during_change(category):
+            pks = build(category)
+            # Another worker rates the product meanwhile.
+            Product.objects.filter(id=product.id).update(rating=Decimal('5.00'))
+            leaderboard.invalidate()
+            return pks
+
+        with patch.object(leaderboard, '_build', build_during_change):
+            leaderboard.top()
+
+        self.assertEqual(self.get_top_names(), ['Laptop', 'Phone'])
+
+    def test_board_rebuilt_by_one_worker(self):
+        """Test the previous board is served while another worker rebuilds it."""
+        product = self.create_rated('4.90', name='Phone')
+        leaderboard.top()
+        self.create_rated('4.50', name='Laptop')
+        # Taken by a worker rebuilding the board.
+        version = get_version(leaderboard.VERSION_KEY)
+        cache.add(f'{leaderboard._board_key(None)}:v{version}:lock', True)
+
+        with self.assertNumQueries(0):
+            pks = leaderboard.top()
+
+        self.assertEqual(pks, [product.id])
+
+
+class ProductConditionalGetTests(TestCase):
+    """Test catalog reads answer 304 while the products are unchanged."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = create_user({
+            'username': 'test@mail.com',
+            'email': 'test@mail.com',
+            'password': 'password123',
+        })
+        self.product = create_product(self.user, {'rating': Decimal('4.50')})
+
+    def assertNotModified(self, url, **headers):
+        res = self.client.get(url, **headers)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b'')
+        return res
+
+    def test_product_not_modified(self):
+        """Test an unchanged product answers 304 with public headers."""
+        url = f'{HTTP_PRODUCTS}{self.product.id}/'
+        res = self.client.get(url)
+
+        self.assertIn('public', res['Cache-Control'])
+        self.assertIn('must-revalidate', res['Cache-Control'])
+        self.assertIn('Accept', res['Vary'])
+        not_modified = self.assertNotModified(url, HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(not_modified['ETag'], res['ETag'])
+        self.assertNotIn('Last-Modified', res)
+
+    def test_reviewed_product_modified(self):
+        """Test a new review changes the product ETag."""
+        url = f'{HTTP_PRODUCTS}{self.product.id}/'
+        etag = self.client.get(url)['ETag']
+        self.client.force_authenticate(self.user)
+        self.client.patch(f'{HTTP_PRODUCTS}reviews/{self.product.id}/', {'rating': 5}, format='json')
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['reviews']), 1)
+
+    def test_list_modified_by_commit(self):
+        """Test a list read before an edit commits gets a new ETag once it does."""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Renamed'
+            self.product.save()
+            etag = self.client.get(HTTP_PRODUCTS)['ETag']
+        res = self.client.get(HTTP_PRODUCTS, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_list_not_modified(self):
+        """Test the product list answers 304 without queries."""
+        etag = self.client.get(HTTP_PRODUCTS)['ETag']
+
+        with self.assertNumQueries(0):
+            self.assertNotModified(HTTP_PRODUCTS, HTTP_IF_NONE_MATCH=etag)
+
+    def test_list_modified(self):
+        """Test edits, reviews, new and deleted products change the list ETag."""
+        etag = self.client.get(HTTP_PRODUCTS)['ETag']
+
+        def edit():
+            self.product.price = Decimal('7.00')
+            self.product.save()
+
+        changes = [
+            edit,
+            lambda: Review.objects.create(product=self.product, user=self.user, rating=3),
+            lambda: create_product(self.user),
+            lambda: Product.objects.filter(id=self.product.id).delete(),
+        ]
+        for change in changes:
+            change()
+            res = self.client.get(HTTP_PRODUCTS, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            etag = res['ETag']
+
+    def test_top_not_modified(self):
+        """Test unchanged top products answer 304 without queries."""
+        etag = self.client.get(f'{HTTP_PRODUCTS}top/')['ETag']
+
+        with self.assertNumQueries(0):
+            self.assertNotModified(f'{HTTP_PRODUCTS}top/', HTTP_IF_NONE_MATCH=etag)
+
+
+class AsyncCatalogTests(TestCase):
+    """Test the async catalog views answer like the sync ones."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.factory = AsyncRequestFactory()
+        self.user = create_user({
+            'username': 'test@mail.com',
+            'email': 'test@mail.com',
+            'password': 'password123',
+        })
+        self.product = create_product(self.user, {'rating': Decimal('4.50')})
+        create_product(self.user, {'name': 'Other', 'rating': Decimal('4.00')})
+        create_reviews(self.product, 2)
+
+    def assertSameResponse(self, path, response):
+        expected = self.client.get(path)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.content, expected.content)
+        self.assertEqual(response['ETag'], expected['ETag'])
+        self.assertEqual(response['Cache-Control'], expected['Cache-Control'])
+
+    async def test_list(self):
+        """Test the async list pages and searches like the sync list."""
+        for query in ('', '?page_size=1&page=2', '?cursor=', '?keyword=Other'):
+            path = HTTP_PRODUCTS + query
+            response = await async_views.product_list(self.factory.get(path))
+            await sync_to_async(self.assertSameResponse)(path, response)
+
+    async def test_detail(self):
+        """Test the async detail returns the product with its reviews."""
+        path = f'{HTTP_PRODUCTS}{self.product.id}/'
+        response = await async_views.product_detail(self.factory.get(path), self.product.id)
+        await sync_to_async(self.assertSameResponse)(path, response)
+
+        missing = await async_views.product_detail(self.factory.get(path), 0)
+        self.assertEqual(missing.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_top(self):
+        """Test the async top products match the sync ones."""
+        path = f'{HTTP_PRODUCTS}top/'
+        response = await async_views.top_products(self.factory.get(path))
+        await sync_to_async(self.assertSameResponse)(path, response)
+
+    async def test_not_modified(self):
+        """Test the async views answer 304 for an unchanged catalog."""
+        request = self.factory.get(HTTP_PRODUCTS)
+        etag = (await async_views.product_list(request))['ETag']
+        response = await async_views.product_list(self.factory.get(HTTP_PRODUCTS, headers={'If-None-Match': etag}))
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+    @skipUnless(msgpack, 'Needs msgpack.')
+    async def test_msgpack(self):
+        """Test the async views render MessagePack when asked for it."""
+        path = f'{HTTP_PRODUCTS}{self.product.id}/'
+        request = self.factory.get(path, headers={'Accept': 'application/msgpack'})
+        response = await async_views.product_detail(request, self.product.id)
+
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content)['name'], self.product.name)
+
+    async def test_write_not_allowed(self):
+        """Test the async views only answer reads."""
+        response = await async_views.product_list(self.factory.post(HTTP_PRODUCTS))
+
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+        self.assertEqual(response['Allow'], 'GET')
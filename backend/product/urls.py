@@ -1,9 +1,11 @@
 """
 URL mapping for product app.
 """
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
+from product import async_views
 from product.views import *
 
 app_name = 'product'
@@ -13,4 +15,12 @@ router.register("user", UserProductViewSet, basename="user-products")
 router.register("user/reviews", UserReveiwProductSet, basename="user-reveiws-product")
 router.register("admin", AdminProductViewSet, basename="admin-products")
 
-urlpatterns = [path('', include(router.urls))]
\ No newline at end of file
+urlpatterns = [path('', include(router.urls))]
+
+if settings.ASYNC_VIEWS:
+    # Matched before the router, writes and reviews stay on the viewsets.
+    urlpatterns = [
+        path('user/', async_views.product_list),
+        path('user/top/', async_views.top_products),
+        path('user/<int:pk>/', async_views.product_detail),
+    ] + urlpatterns
@@ -7,57 +7,158 @@ from rest_framework.decorators import action
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 
-from core.models import Product, Review
-from .serializers import ProductSerializer, ProductImageSerializer
-
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.db import IntegrityError, transaction
+
+from core.conditional import conditional, make_etag, versions_etag
+from core.db.routers import replica_reads
+from core.models import REVIEW_STARS, Product, Review
+from core.queries import query_budget
+from .serializers import ProductSerializer, ProductImageSerializer, serialize_product
+from .search import search_products
+from . import cache, leaderboard
+from .images import delete_variants, schedule_variants
+from .stock import set_stock
+from .pagination import (
+    DEFAULT_ORDERING,
+    CappedCountPaginator,
+    EstimatedCountPaginator,
+    KeysetPage,
+    get_ordering,
+    get_page_size,
+    order_products,
+)
+
+from django.core.paginator import EmptyPage, PageNotAnInteger
 
 class UserProductViewSet(ModelViewSet):
     """User access to the products."""
 
-    queryset = Product.objects.all()
+    queryset = Product.objects.with_reviews()
     serializer_class = ProductSerializer
     http_method_names = ['get', ]
 
+    # The table size, the count or its estimate, products and reviews.
+    @query_budget(4)
+    @replica_reads
     def list(self, request):
-        query = request.query_params.get('keyword', False)
-        products = self.queryset.filter(active=True, name__icontains=query) if query else Product.objects.filter(active=True)
-        page = request.query_params.get('page')
-        paginator = Paginator(products, 4)
-
-        try:
-            products = paginator.page(page)
-        except PageNotAnInteger:
-            products = paginator.page(1)
-        except EmptyPage:
-            products = paginator.page(paginator.num_pages)
-
-        try:
-            page = int(page)
-        except:
-            page = 1
-
-        serializer = self.serializer_class(products, many=True)
-        return Response({
-                'products': serializer.data,
-                'page': page,
-                'pages': paginator.num_pages,
-            })
-
+        """
+        List active products.
+
+        Passing `cursor` (empty for the first page) switches to keyset
+        pagination, search results are always paginated by page number.
+        """
+        # Any product change may move products between pages.
+        etag = versions_etag([cache.LIST_VERSION_KEY], 'products')
+        return conditional(
+            request,
+            lambda: Response(list_products(self.queryset, request.query_params)),
+            etag,
+            public=True,
+        )
+
+    # The product and its reviews when their payload isn't cached.
+    @query_budget(2)
     def retrieve(self, request, pk=None):
         try:
-            product = self.queryset.get(id=pk)
-            serializer =self.serializer_class(product, many=False)
-            return Response(serializer.data)
+            data = get_product(int(pk))
         except:
             message = {'detail': 'Product doesn\'t exist!'}
             return Response(message, status=status.HTTP_400_BAD_REQUEST)
 
+        return conditional(request, lambda: Response(data), product_etag(data), public=True)
+
+    # The board, then products and reviews missing from the cache.
+    @query_budget(3)
     @action(detail=False, methods=["get"], url_path=r'top')
     def top(self, request):
-        products = self.queryset.filter(rating__gte=4, active=True).order_by('-rating')[0:5]
-        serializer = self.serializer_class(products,many=True)
-        return Response(serializer.data)
+        """Top rated products, of one category when `category` is given."""
+        products = get_top_products(request.query_params.get('category') or None)
+        return conditional(request, lambda: Response(products), top_etag(products), public=True)
+
+
+# Payloads of the public catalog, shared with the async views.
+
+def list_products(queryset, params):
+    """Return a page of active products for the list query parameters."""
+    query = params.get('keyword', False)
+    products = queryset.with_stock().filter(active=True)
+    page_size = get_page_size(params)
+
+    paginator_class = EstimatedCountPaginator
+    if query:
+        products = search_products(products, query)
+        paginator_class = CappedCountPaginator
+    elif 'cursor' in params:
+        page = KeysetPage(products, params.get('cursor'), get_ordering(params, DEFAULT_ORDERING), page_size)
+        return {
+            'products': serialize_product.many(page.object_list),
+            'page': page.number,
+            'pages': page.pages,
+            'count': page.count,
+            'next': page.next,
+            'previous': page.previous,
+        }
+    else:
+        products = order_products(products, get_ordering(params))
+
+    page = params.get('page')
+    paginator = paginator_class(products, page_size)
+
+    try:
+        products = paginator.page(page)
+    except PageNotAnInteger:
+        products = paginator.page(1)
+    except EmptyPage:
+        products = paginator.page(paginator.num_pages)
+
+    try:
+        page = int(page)
+    except:
+        page = 1
+
+    return {
+        'products': serialize_product.many(products),
+        'page': page,
+        'pages': paginator.num_pages,
+    }
+
+
+def get_product(pk):
+    """Return the cached payload of a product."""
+    return cache.get_product(pk, lambda: serialize_product(Product.objects.with_reviews().with_stock().get(id=pk)))
+
+
+def product_etag(data):
+    """Return the ETag of a product payload."""
+    # The cached payload carries its own validator, so warm requests
+    # stay free of queries. Orders of sharded products change the stock
+    # but not updatedAt, so it is part of the ETag and no Last-Modified
+    # is sent.
+    return make_etag('product', data['id'], data['updatedAt'], data['countInStock'])
+
+
+def get_top_products(category):
+    """Return the cached payloads of the top rated products."""
+    def load(pks):
+        products = Product.objects.with_reviews().with_stock().filter(id__in=pks, active=True)
+        return serialize_product.many(products)
+
+    # Boards may still list a product deactivated meanwhile.
+    products = cache.get_products(leaderboard.top(category), load)
+    return [product for product in products if product['active']]
+
+
+def top_etag(products):
+    return make_etag('top', *[(product['id'], product['updatedAt'], product['countInStock']) for product in products])
+
+
+def get_rating(value):
+    """Return the review rating as a number of stars or None."""
+    try:
+        rating = int(value)
+    except (TypeError, ValueError):
+        return None
+    return rating if rating in REVIEW_STARS else None
 
 
 class UserReveiwProductSet(ModelViewSet):
@@ -68,58 +169,62 @@ class UserReveiwProductSet(ModelViewSet):
     permission_classes = (IsAuthenticated,)
     http_method_names = ['patch', ]
 
+    # The user and product, then the rating and review in a savepoint.
+    @query_budget(6)
     def update(self, request, pk=None, *args, **kwargs):
         user = request.user
         product = self.queryset.get(id=pk)
         data = request.data
+        rating = get_rating(data.get('rating'))
 
-        # 1 - Review already exists
-        if product.review_set.filter(user=user).exists():
-            content = {'detail': 'Product already reviewed!'}
-            return Response(content, status=status.HTTP_400_BAD_REQUEST)
-
-        # 2- No rating
-        elif not data.get('rating', False):
+        # 1- No rating
+        if rating is None:
             content = {'detail': 'Please select rating!'}
             return Response(content, status=status.HTTP_400_BAD_REQUEST)
 
-        # 3 - Create review
-        else:
-            Review.objects.create(
-                user=user,
-                product=product,
-                name=user.first_name,
-                rating=data.get('rating'),
-                comment=data.get('comment', None),
-            )
-
-            reviews = product.review_set.all()
-            product.numReviews = len(reviews)
-
-            total = 0
-            for i in reviews:
-                total += i.rating
-
-            product.rating = total / len(reviews)
-            product.save()
+        # 2 - Update the product aggregates and create the review together,
+        # the unique (product, user) constraint rejects a second review.
+        # Aggregates go first so the review signals see the new rating.
+        try:
+            with transaction.atomic():
+                self.queryset.filter(id=product.id).add_rating(rating)
+                Review.objects.create(
+                    user=user,
+                    product=product,
+                    name=user.first_name,
+                    rating=rating,
+                    comment=data.get('comment', None),
+                )
+        except IntegrityError:
+            content = {'detail': 'Product already reviewed!'}
+            return Response(content, status=status.HTTP_400_BAD_REQUEST)
 
-            return Response('Reviewed.')
+        return Response('Reviewed.')
 
 
 class AdminProductViewSet(ModelViewSet):
     """Admin products class."""
 
+    # Writes don't serialize lists, only list() prefetches the reviews.
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = (IsAdminUser,)
     http_method_names = ['get', 'post', 'put', 'delete' ]
 
+    # The user's digest when not cached, products and reviews.
+    @query_budget(3)
+    @replica_reads
     def list(self, request):
-        self.queryset = self.queryset.all()
+        self.queryset = self.queryset.with_reviews()
         products = self.queryset.filter(active=False) if request.query_params.get('unactive', False) else self.queryset
-        serializer = self.serializer_class(products, many=True)
-        return Response(serializer.data)
-
+        return conditional(
+            request,
+            lambda: Response(serialize_product.many(products.with_stock())),
+            versions_etag([cache.LIST_VERSION_KEY], 'admin-products'),
+        )
+
+    # The user, the product and the reviews its serializer reads.
+    @query_budget(3)
     def create(self, request):
         try:
             user = request.user
@@ -140,6 +245,9 @@ class AdminProductViewSet(ModelViewSet):
             message = {'detail': 'Product cannot be created.'}
             return Response(message, status=status.HTTP_400_BAD_REQUEST)
 
+    # The user and product, the shards locked and updated in a savepoint,
+    # the product in another, then its reviews and summed shards.
+    @query_budget(11)
     def update(self, request, pk=None, *args, **kwargs):
         data = request.data
         product = self.queryset.get(id=pk)
@@ -147,16 +255,26 @@ class AdminProductViewSet(ModelViewSet):
         product.name = data.get('name')
         product.price = data.get('price')
         product.brand = data.get('brand')
-        product.countInStock = data.get('countInStock')
         product.category = data.get('category')
         product.description = data.get('description')
         product.active = data.get('active') or False
-
-        product.save()
+        # Only the edited fields, a full save would overwrite the rating
+        # aggregates of reviews posted meanwhile.
+        fields = ['name', 'price', 'brand', 'category', 'description', 'active', 'updatedAt']
+        with transaction.atomic():
+            if product.stockShards:
+                set_stock(product.id, data.get('countInStock'))
+            else:
+                product.countInStock = data.get('countInStock')
+                fields.append('countInStock')
+
+            product.save(update_fields=fields)
 
         serializer = self.get_serializer(product, many=False)
         return Response(serializer.data)
 
+    # The user, the product and its new image.
+    @query_budget(3)
     @action(detail=False, methods=["post"], url_path=r'image')
     def upload_image(self, request):
 
@@ -166,20 +284,36 @@ class AdminProductViewSet(ModelViewSet):
         serializer = ProductImageSerializer(product, data=request.data)
 
         if serializer.is_valid():
-            product.image.delete()
+            product.image.delete(save=False)
+            delete_variants(product.imageVariants)
+            product.imageVariants = {}
             product.image = request.FILES.get('image')
-            product.save()
+            product.save(update_fields=['image', 'imageVariants', 'updatedAt'])
+            schedule_variants(product.id)
             return Response('Image was uploaded', status=status.HTTP_200_OK)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    # The user's digest when not cached.
+    @query_budget(1)
+    @action(detail=False, methods=["get"], url_path=r'cache')
+    def cache_stats(self, request):
+        return Response(cache.stats())
+
+    # The user, product and review ids, then in a savepoint the product
+    # with the users and updates of its orders, its shards, the reviews
+    # and order items it leaves, and last the reviews, loaded and deleted.
+    @query_budget(13)
     def destroy(self, request, pk=None):
         product = self.queryset.get(id=pk)
-        reviews = Review.objects.filter(product=product)
-        if bool(len(reviews)):
-            for review in reviews:
-                review.delete()
-        product.image.delete()
-        product.delete()
+        product.image.delete(save=False)
+        delete_variants(product.imageVariants)
+        with transaction.atomic():
+            # Deleted after the product, their signals don't update the
+            # rating of a product going away one review at a time.
+            reviews = list(Review.objects.filter(product=product).values_list('id', flat=True))
+            product.delete()
+            if reviews:
+                Review.objects.filter(id__in=reviews).delete()
 
         return Response('Product Deleted')
@@ -3,7 +3,8 @@ User serializer for the API View.
 """
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.authentication import get_token
 from core.models import *
 
 class UserSerializer(serializers.ModelSerializer):
@@ -32,8 +33,7 @@ class UserSerializerWithToken(UserSerializer):
         fields = ['id', 'username', 'email', 'name', 'isAdmin', 'token']
 
     def get_token(self, obj):
-        token = RefreshToken.for_user(obj)
-        return str(token.access_token)
+        return str(get_token(obj).access_token)
 
 
 class UserAddressSerializer(serializers.ModelSerializer):
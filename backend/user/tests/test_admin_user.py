@@ -9,6 +9,7 @@ from django.test import TestCase
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from core.testing import QueryBudgetMixin
 from user.serializers import *
 
 
@@ -34,7 +35,7 @@ def create_user(params, admin=False):
         return User.objects.create_superuser(**params)
 
 
-class AdminUserAPITests(TestCase):
+class AdminUserAPITests(QueryBudgetMixin, TestCase):
     """Test authenticated API requests."""
 
     def setUp(self):
@@ -78,6 +79,7 @@ class AdminUserAPITests(TestCase):
 
         self.assertEqual(list_users_res.status_code, status.HTTP_200_OK)
         self.assertEqual(len(list_users_res.data), len(users))
+        self.assertWithinQueryBudget(list_users_res)
 
     def test_unathorized_retrieve_all_users_unsuccess(self):
         """Test returns error if credentials invalid for admin."""
@@ -108,6 +110,7 @@ class AdminUserAPITests(TestCase):
         user_profile_res = self.client.get(f'{ADMIN_URL}{user.id}/', **token)
 
         self.assertEqual(user_profile_res.status_code, status.HTTP_200_OK)
+        self.assertWithinQueryBudget(user_profile_res)
 
     def test_retrieve_user_profile_unsuccess(self):
         """Test retrieving profile for id user using user token."""
@@ -140,6 +143,7 @@ class AdminUserAPITests(TestCase):
 
         self.assertEqual(user_updated_profile_res.status_code, status.HTTP_200_OK)
         self.assertNotEqual(user_updated_profile_res.data['email'], payload['email'])
+        self.assertWithinQueryBudget(user_updated_profile_res)
 
     def test_update_user_profile_unsuccess(self):
         """Test update profile for id user using invalid admin token."""
@@ -173,6 +177,7 @@ class AdminUserAPITests(TestCase):
 
         self.assertEqual(delete_users_res.status_code, status.HTTP_200_OK)
         self.assertFalse(user_exists)
+        self.assertWithinQueryBudget(delete_users_res)
 
     def test_delete_user_not_exist_unsuccess(self):
         """Test delete user does not exist using a valid admin token."""
@@ -9,6 +9,7 @@ from django.test import TestCase
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from core.testing import QueryBudgetMixin
 from user.serializers import *
 
 TOKEN_URL = reverse('user:user-token')
@@ -28,7 +29,7 @@ def get_token(path, params):
     return path(TOKEN_URL, params)
 
 
-class UserAPITests(TestCase):
+class UserAPITests(QueryBudgetMixin, TestCase):
     """Test authenticated API requests."""
 
     def setUp(self):
@@ -53,6 +54,7 @@ class UserAPITests(TestCase):
 
         self.assertEqual(res_user.status_code, status.HTTP_200_OK)
         self.assertTrue(user_exists)
+        self.assertWithinQueryBudget(res_user)
 
     def test_create_user_invalid_email(self):
         """Test creating a new user with an invalid email."""
@@ -91,6 +93,7 @@ class UserAPITests(TestCase):
 
         self.assertIn('token', res_token.data)
         self.assertEqual(res_token.status_code, status.HTTP_200_OK)
+        self.assertWithinQueryBudget(res_token)
 
     def test_create_token_invalid_credentials(self):
         """Test returns error if credentials invalid."""
@@ -111,6 +114,7 @@ class UserAPITests(TestCase):
 
         self.assertEqual(res_user.status_code, status.HTTP_200_OK)
         self.assertEqual(res_user.data['email'], self.payload['email'])
+        self.assertWithinQueryBudget(res_user)
 
     def test_retrieve_user_profile_unathorized(self):
         """Test authentication is required for user."""
@@ -135,6 +139,7 @@ class UserAPITests(TestCase):
         self.assertEqual(res_user.status_code, status.HTTP_200_OK)
         self.assertEqual(res_user.data['id'], serializer.data['id'])
         self.assertNotEqual(res_user.data['email'], self.payload['email'])
+        self.assertWithinQueryBudget(res_user)
 
     def test_update_user_profile_password_success(self):
         """Test update user profile and password."""
@@ -207,6 +212,7 @@ class UserAPITests(TestCase):
 
         self.assertEqual(user_address_res.status_code, status.HTTP_200_OK)
         self.assertEqual(user_address_res.data['address'], user_address.address)
+        self.assertWithinQueryBudget(user_address_res)
 
 
     def test_get_user_address_unsuccess(self):
@@ -256,3 +262,4 @@ class UserAPITests(TestCase):
         self.assertEqual(user_updated_address_res.status_code, status.HTTP_200_OK)
         self.assertNotEqual(old_user_address.address, updated_user_address['address'])
         self.assertEqual(user_updated_address_res.data['address'], updated_user_address['address'])
+        self.assertWithinQueryBudget(user_updated_address_res)
@@ -11,6 +11,11 @@ from django.contrib.auth.hashers import make_password
 from django.core.validators import validate_email
 # from django.contrib.auth.password_validation import validate_password
 
+from core.authentication import get_token
+from core.db.routers import replica_reads
+from core.passwords import PasswordHashingBusy
+from core.queries import query_budget
+
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework_simplejwt.views import TokenObtainPairView
 from user.serializers import *
@@ -26,14 +31,9 @@ def validate_password(password):
 
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
 
-    # @classmethod
-    # def get_token(cls, user):
-    #     token = super().get_token(user)
-
-    #     # Add custom claims
-    #     token['username'] = user.username
-
-    #     return token
+    @classmethod
+    def get_token(cls, user):
+        return get_token(user)
 
     def validate(self, attrs):
         data = super().validate(attrs)
@@ -46,6 +46,8 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
 
 class MyTokenObtainPairView(TokenObtainPairView):
     serializer_class = MyTokenObtainPairSerializer
+    # The user, and saving a password rehashed for new iterations.
+    query_budget = 3
 
 
 class UserRegisterViewSet(ModelViewSet):
@@ -55,6 +57,8 @@ class UserRegisterViewSet(ModelViewSet):
     queryset = User.objects.none()
     http_method_names = ['post', ]
 
+    # The new user.
+    @query_budget(1)
     def create(self, request):
         data = request.data
         try:
@@ -75,6 +79,8 @@ class UserRegisterViewSet(ModelViewSet):
             )
             serializer = self.serializer_class(user, many=False)
             return Response(serializer.data)
+        except PasswordHashingBusy:
+            raise
         except:
             message = {'detail': 'User with this eamil already exists'}
             return Response(message, status=status.HTTP_400_BAD_REQUEST)
@@ -88,11 +94,15 @@ class UserViewSet(ModelViewSet):
     permission_classes = (IsAuthenticated,)
     http_method_names = ['get', 'put',]
 
+    # The user's digest when not cached.
+    @query_budget(1)
     def retrieve(self, request, pk=None):
         user = request.user
         serializer = self.serializer_class(user, many=False)
         return Response(serializer.data)
 
+    # The user, its update and the orders embedding it.
+    @query_budget(3)
     def update(self, request, pk=None):
         self.serializer_class = UserSerializerWithToken
         user = request.user
@@ -124,6 +134,8 @@ class UserAddressViewSet(ModelViewSet):
     permission_classes = (IsAuthenticated,)
     http_method_names = ['get', 'patch']
 
+    # The user's digest when not cached and the address.
+    @query_budget(2)
     def retrieve(self, request, pk=None):
         user = request.user
         try:
@@ -134,6 +146,9 @@ class UserAddressViewSet(ModelViewSet):
             message = {'detail': 'The user doesn\'t have an address.'}
             return Response(message, status=status.HTTP_400_BAD_REQUEST)
 
+    # The user, whether it has an address, then the address loaded,
+    # updated and reloaded.
+    @query_budget(5)
     def update(self, request, *args, **kwargs):
         user = request.user
         data = request.data
@@ -165,11 +180,16 @@ class AdminUserViewSet(ModelViewSet):
     permission_classes = (IsAdminUser,)
     http_method_names = ['get', 'put', 'delete',]
 
+    # The user's digest when not cached and the users.
+    @query_budget(2)
+    @replica_reads
     def list(self, request):
         users = self.queryset.all()
         serializer = self.serializer_class(users, many=True)
         return Response(serializer.data)
 
+    # The user's digest when not cached and the user asked for.
+    @query_budget(2)
     def retrieve(self, request, pk=None):
         try:
             user = self.queryset.get(id=pk)
@@ -178,6 +198,8 @@ class AdminUserViewSet(ModelViewSet):
         except:
             return Response({'detail': f'User with id {pk} does not exists.'}, status=status.HTTP_400_BAD_REQUEST)
 
+    # The admin, the user, its update and the orders embedding it.
+    @query_budget(4)
     def update(self, request, pk=None, *args, **kwargs):
         user = self.queryset.get(id=pk)
         data  = request.data
@@ -203,6 +225,10 @@ class AdminUserViewSet(ModelViewSet):
         serializer = self.serializer_class(user, many=False)
         return Response(serializer.data)
 
+    # The admin and the user, its orders touched, then its admin log,
+    # groups, permissions and address deleted, its products, reviews and
+    # orders released, and the user.
+    @query_budget(11)
     def destroy(self, request, pk=None, *args, **kwargs):
         user = request.user
         if str(user.id) != str(pk):
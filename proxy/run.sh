@@ -2,5 +2,12 @@
 
 set -e
 
-envsubst < /etc/nginx/default.conf.tpl > /etc/nginx/conf.d/default.conf
-nginx -g 'daemon off;'
\ No newline at end of file
+# uvicorn speaks HTTP, uWSGI its own protocol.
+if [ "$SERVER" = "uvicorn" ]; then
+    TEMPLATE=/etc/nginx/default-asgi.conf.tpl
+else
+    TEMPLATE=/etc/nginx/default.conf.tpl
+fi
+
+envsubst '${LISTEN_PORT} ${BACKEND_HOST} ${BACKEND_PORT}' < $TEMPLATE > /etc/nginx/conf.d/default.conf
+nginx -g 'daemon off;'
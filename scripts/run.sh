@@ -2,8 +2,23 @@
 
 set -e
 
+# The checks run by migrate refuse a per process cache with several workers.
+export WEB_WORKERS=${WEB_WORKERS:-4}
+
 python manage.py wait_for_db
 python manage.py collectstatic --noinput
 python manage.py migrate
 
-uwsgi --socket :9000 --workers 4 --master --enable-threads --module backend.wsgi
\ No newline at end of file
+# Workers share their metrics through files, cleared on start.
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/metrics}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+# SERVER=uvicorn serves ASGI with the async catalog and order views.
+# Its sync code runs in worker threads, which share a connection pool.
+if [ "$SERVER" = "uvicorn" ]; then
+    export DB_POOL_SIZE=${DB_POOL_SIZE:-10}
+    ASYNC_VIEWS=1 uvicorn backend.asgi:application --host 0.0.0.0 --port 9000 --workers "$WEB_WORKERS" --no-access-log
+else
+    uwsgi --socket :9000 --workers "$WEB_WORKERS" --master --enable-threads --module backend.wsgi
+fi